@@ -0,0 +1,155 @@
+# Class for solving large sets of puzzles from a file with a process pool
+
+from concurrent.futures import ProcessPoolExecutor
+from collections import deque
+from itertools import islice
+from timeit import default_timer as timer
+import argparse
+import json
+import sys
+import os
+
+from Solver import Solver
+from Geometry import cell_key
+
+# One char per value in the line format: '1'-'9', then 'A' = 10, 'B' = 11, ...; '0' or '.' for an empty cell
+DIGITS = '0123456789ABCDEFGHIJKLMNOPQRSTUVWXYZ'
+
+
+def parse_line(line, info):
+    # A JSON object is the game data itself, anything else a sudoku in the line format
+    if line.startswith('{'):
+        return json.loads(line)
+    grid_len = info['GRID_LEN']
+    if len(line) != grid_len * grid_len:
+        raise ValueError('expected ' + str(grid_len * grid_len) + ' cells, got ' + str(len(line)))
+    variables_found = {}
+    for k, c in enumerate(line):
+        if c not in '0.':
+            variables_found[cell_key(k // grid_len, k % grid_len, grid_len)] = str(int(c, 36))
+    return {'variables_found': variables_found, 'line': True}
+
+
+def format_result(solver, game_data):
+    if not isinstance(solver.result, dict):
+        return None
+    if game_data.get('line'):
+        return ''.join([DIGITS[int(v)] if v is not None else '.' for v in solver.result.values()])
+    return solver.result
+
+
+def solve_chunk(info, chunk):
+    # Runs in the worker processes: chunk is a list of (index, game data)
+    results = []
+    for index, game_data in chunk:
+        solver = Solver(info)
+        start = timer()
+        status = solver.solveGame(game_data)
+        results.append({
+            'index': index,
+            'status': status,
+            'iterations': solver.iterations,
+            'backtracks': solver.stats.backtracks,
+            'seconds': timer() - start,
+            'solution': format_result(solver, game_data)
+        })
+    return results
+
+
+def game_info(args):
+    info = {
+        'game': args.game,
+        'GRID_LEN': args.grid_len,
+        'SQUARE_LEN': args.square_len,
+        'NUM_STARS': args.num_stars
+    }
+    # Without --engine the solver picks the game's default engine
+    if args.engine is not None:
+        info['engine'] = args.engine
+    return info
+
+
+class BatchSolver:
+    def __init__(self, info, workers=None, chunksize=32):
+        self.info = info
+        self.workers = workers or os.cpu_count() or 1
+        self.chunksize = chunksize
+        self.stats = {'puzzles': 0, 'solved': 0, 'iterations': 0, 'seconds': 0.0}
+
+    def read_puzzles(self, path):
+        with open(path) as f:
+            index = 0
+            for line in f:
+                line = line.strip()
+                if not line or line.startswith('#'):
+                    continue
+                yield index, parse_line(line, self.info)
+                index += 1
+
+    def chunks(self, puzzles):
+        puzzles = iter(puzzles)
+        while True:
+            chunk = list(islice(puzzles, self.chunksize))
+            if not chunk:
+                return
+            yield chunk
+
+    def solve(self, puzzles):
+        # Generator of the results in input order; at most 2 chunks per worker are in flight
+        start = timer()
+        if self.workers == 1:
+            for chunk in self.chunks(puzzles):
+                for result in solve_chunk(self.info, chunk):
+                    self.count(result)
+                    yield result
+        else:
+            with ProcessPoolExecutor(max_workers=self.workers) as executor:
+                pending = deque()
+                for chunk in self.chunks(puzzles):
+                    pending.append(executor.submit(solve_chunk, self.info, chunk))
+                    if len(pending) >= 2 * self.workers:
+                        for result in pending.popleft().result():
+                            self.count(result)
+                            yield result
+                while pending:
+                    for result in pending.popleft().result():
+                        self.count(result)
+                        yield result
+        self.stats['seconds'] = timer() - start
+
+    def solve_file(self, path):
+        return self.solve(self.read_puzzles(path))
+
+    def count(self, result):
+        self.stats['puzzles'] += 1
+        self.stats['iterations'] += result['iterations']
+        if result['status'] == 'SOLVED':
+            self.stats['solved'] += 1
+
+    def throughput(self):
+        if self.stats['seconds'] == 0:
+            return 0.0
+        return self.stats['puzzles'] / self.stats['seconds']
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Solve every puzzle of a text (one sudoku per line) or JSONL file')
+    parser.add_argument('path')
+    parser.add_argument('--game', default='sudoku', choices=['sudoku', 'stars', 'skyscrapers'])
+    parser.add_argument('--grid-len', type=int, default=9)
+    parser.add_argument('--square-len', type=int, default=3)
+    parser.add_argument('--num-stars', type=int, default=1)
+    parser.add_argument('--engine', default=None, choices=['backtracking', 'dlx', 'counting', 'tables'])
+    parser.add_argument('--workers', type=int, default=None)
+    parser.add_argument('--chunksize', type=int, default=32)
+    args = parser.parse_args()
+
+    info = game_info(args)
+    batch = BatchSolver(info, args.workers, args.chunksize)
+    for result in batch.solve_file(args.path):
+        print(json.dumps(result))
+
+    stats = batch.stats
+    print(str(stats['puzzles']) + ' puzzles, ' + str(stats['solved']) + ' solved in ' + '%.2f' % stats['seconds'] +
+          ' seconds: ' + '%.1f' % batch.throughput() + ' puzzles/sec, ' +
+          '%.1f' % (stats['iterations'] / max(stats['puzzles'], 1)) + ' iterations per puzzle', file=sys.stderr)
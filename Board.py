@@ -0,0 +1,73 @@
+# Class for the integer-indexed board model behind the solver
+from array import array
+from Geometry import get_geometry
+
+EMPTY = -1
+
+
+class Board:
+    def __init__(self, game, grid_len, square_len=None):
+        # Shape tables are shared through the geometry cache, only the values and areas are per board
+        self.geometry = get_geometry(game, grid_len, square_len)
+        self.game = game
+        self.GRID_LEN = grid_len
+        self.size = self.geometry.size
+
+        self.keys = self.geometry.keys
+        self.index = self.geometry.index
+        self.row_of = self.geometry.row_of
+        self.col_of = self.geometry.col_of
+        self.box_of = self.geometry.box_of
+        self.rows = self.geometry.rows
+        self.cols = self.geometry.cols
+        self.lines = self.geometry.lines
+        self.boxes = self.geometry.boxes
+        self.neighbours = self.geometry.neighbours
+        self.diagonals = self.geometry.diagonals
+        self.sight_lines = self.geometry.sight_lines
+        self.sight_lines_of = self.geometry.sight_lines_of
+
+        self.areas = ()
+        self.area_of = array('b', [EMPTY] * self.size)
+
+        # Current value of every cell as a small int, EMPTY when unassigned
+        self.values = array('b', [EMPTY] * self.size)
+
+    def set_areas(self, areas):
+        # Star Battle sectors, given as lists of keys
+        self.areas = tuple(tuple(self.index[key] for key in area) for area in areas)
+        self.area_of = array('b', [EMPTY] * self.size)
+        for k, area in enumerate(self.areas):
+            for idx in area:
+                self.area_of[idx] = k
+
+    def units(self):
+        # Rows, columns and game specific areas (sudoku boxes, stars sectors)
+        if self.game == 'sudoku':
+            return self.rows, self.cols, self.boxes
+        return self.rows, self.cols, self.areas
+
+    def peers(self):
+        if not self.areas:
+            return self.geometry.peers
+        peers = [dict.fromkeys(p) for p in self.geometry.peers]
+        for area in self.areas:
+            for idx in area:
+                for p in area:
+                    if p != idx:
+                        peers[idx][p] = None
+        return [tuple(p) for p in peers]
+
+    # Translation layer between the dict-based assignments and the int board
+
+    def load(self, assignment):
+        for idx, key in enumerate(self.keys):
+            value = assignment[key]
+            self.values[idx] = EMPTY if value is None else int(value)
+
+    def set(self, idx, value):
+        self.values[idx] = EMPTY if value is None else int(value)
+
+    def to_assignment(self):
+        return {key: None if self.values[idx] == EMPTY else str(self.values[idx])
+                for idx, key in enumerate(self.keys)}
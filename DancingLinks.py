@@ -0,0 +1,116 @@
+# Class for exact cover search (Knuth's Algorithm X with dancing links)
+
+class DancingLinks:
+    def __init__(self, num_columns):
+        # Nodes live in flat int lists: node 0 is the root, nodes 1..num_columns the column headers,
+        # the following ones the 1s of the rows
+        n = num_columns + 1
+        self.L = [k - 1 for k in range(n)]
+        self.R = [k + 1 for k in range(n)]
+        self.L[0] = num_columns
+        self.R[num_columns] = 0
+        self.U = list(range(n))
+        self.D = list(range(n))
+        self.C = list(range(n))
+        self.row_of = [-1] * n
+        self.S = [0] * n
+        self.iterations = 0
+
+    def add_row(self, row_id, columns):
+        # columns are 0-based; the row's nodes form a circular list
+        first = None
+        for col in columns:
+            c = col + 1
+            node = len(self.C)
+            self.C.append(c)
+            self.row_of.append(row_id)
+            self.U.append(self.U[c])
+            self.D.append(c)
+            self.D[self.U[c]] = node
+            self.U[c] = node
+            self.S[c] += 1
+            if first is None:
+                first = node
+                self.L.append(node)
+                self.R.append(node)
+            else:
+                self.L.append(self.L[first])
+                self.R.append(first)
+                self.R[self.L[first]] = node
+                self.L[first] = node
+
+    def cover(self, c):
+        L, R, U, D, C, S = self.L, self.R, self.U, self.D, self.C, self.S
+        R[L[c]] = R[c]
+        L[R[c]] = L[c]
+        i = D[c]
+        while i != c:
+            j = R[i]
+            while j != i:
+                D[U[j]] = D[j]
+                U[D[j]] = U[j]
+                S[C[j]] -= 1
+                j = R[j]
+            i = D[i]
+
+    def uncover(self, c):
+        L, R, U, D, C, S = self.L, self.R, self.U, self.D, self.C, self.S
+        i = U[c]
+        while i != c:
+            j = L[i]
+            while j != i:
+                S[C[j]] += 1
+                D[U[j]] = j
+                U[D[j]] = j
+                j = L[j]
+            i = U[i]
+        R[L[c]] = c
+        L[R[c]] = c
+
+    def choose_column(self):
+        # Column with the fewest rows left
+        R, S = self.R, self.S
+        best = R[0]
+        c = R[best]
+        while c != 0 and S[best] > 1:
+            if S[c] < S[best]:
+                best = c
+            c = R[c]
+        return best
+
+    def solve(self):
+        # Iterative search, so large boards don't hit the recursion limit.
+        # Returns the ids of the chosen rows, None if there is no exact cover
+        R, L, D, C = self.R, self.L, self.D, self.C
+        chosen = []
+        forward = True
+        while True:
+            if forward:
+                if R[0] == 0:
+                    return [self.row_of[r] for r in chosen]
+                c = self.choose_column()
+                self.cover(c)
+                r = D[c]
+            else:
+                # Backtrack: undo the last chosen row and try the next one in its column
+                if not chosen:
+                    return None
+                r = chosen.pop()
+                c = C[r]
+                j = L[r]
+                while j != r:
+                    self.uncover(C[j])
+                    j = L[j]
+                r = D[r]
+
+            if r == c:
+                self.uncover(c)
+                forward = False
+                continue
+            self.iterations += 1
+            chosen.append(r)
+            j = R[r]
+            while j != r:
+                self.cover(C[j])
+                j = R[j]
+            forward = True
@@ -0,0 +1,64 @@
+# Class for the LRU cache of digit predictions, keyed on a perceptual hash of the 28x28 cell images
+from collections import OrderedDict
+import numpy as np
+
+
+class DigitCache:
+    def __init__(self, max_size=4096, hash_size=14, levels=4):
+        # The hash is the image averaged down to hash_size x hash_size blocks, each quantized to levels
+        # grey levels: the same cell in consecutive frames maps to the same key despite small noise
+        self.max_size = max_size
+        self.hash_size = hash_size
+        self.levels = levels
+        self.entries = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def keys(self, images):
+        # images: (n, h, w) with values in [0, 255]
+        n, h, w = images.shape
+        size = self.hash_size
+        bh, bw = h // size, w // size
+        means = images[:, :bh * size, :bw * size].reshape(n, size, bh, size, bw).mean(axis=(2, 4))
+        quantized = np.minimum(means * (self.levels / 256.0), self.levels - 1).astype(np.uint8)
+        return [q.tobytes() for q in quantized]
+
+    def lookup(self, keys):
+        # Returns the cached values by position and the keys to compute, each with the positions it fills.
+        # Repeated keys inside the same batch count as hits: they are computed only once
+        found = {}
+        missing = OrderedDict()
+        for k, key in enumerate(keys):
+            if key in self.entries:
+                self.entries.move_to_end(key)
+                found[k] = self.entries[key]
+                self.hits += 1
+            elif key in missing:
+                missing[key].append(k)
+                self.hits += 1
+            else:
+                missing[key] = [k]
+                self.misses += 1
+        return found, missing
+
+    def store(self, key, value):
+        self.entries[key] = value
+        self.entries.move_to_end(key)
+        if len(self.entries) > self.max_size:
+            self.entries.popitem(last=False)
+            self.evictions += 1
+
+    def clear(self):
+        self.entries.clear()
+
+    def hit_rate(self):
+        lookups = self.hits + self.misses
+        return self.hits / lookups if lookups else 0.0
+
+    def as_dict(self):
+        return {'hits': self.hits, 'misses': self.misses, 'evictions': self.evictions, 'size': len(self.entries),
+                'max_size': self.max_size, 'hit_rate': self.hit_rate()}
+
+    def __repr__(self):
+        return 'DigitCache(' + ', '.join([k + '=' + str(v) for k, v in self.as_dict().items()]) + ')'
@@ -1,43 +1,69 @@
 # Class for digit classifier using MNIST CNN
-
-import tensorflow as tf
-from tensorflow.keras.models import Sequential
-from tensorflow.keras.layers import Conv2D
-from tensorflow.keras.layers import MaxPooling2D
-from tensorflow.keras.layers import Activation
-from tensorflow.keras.layers import Flatten
-from tensorflow.keras.layers import Dense
-from tensorflow.keras.layers import Dropout
-
-from tensorflow.keras.optimizers import Adam
-from tensorflow.keras.datasets import mnist
-from tensorflow.keras.preprocessing.image import img_to_array
-from sklearn.preprocessing import LabelBinarizer
-from sklearn.metrics import classification_report
+# TensorFlow and sklearn are imported only by the keras backend and by training
 
 import os
 import numpy as np
 import cv2
 
+from Geometry import cell_key
+from NumpyCNN import NumpyCNN
+from QuantizedCNN import QuantizedCNN
+from DigitCache import DigitCache
+from DigitVotes import DigitVotes
+
 
 class DigitClassifier:
-    def __init__(self, weights_file='model_weights.h5', epochs=10, batch_size=128):
+    def __init__(self, weights_file='model_weights.h5', epochs=10, batch_size=128, backend='keras',
+                 precision='float32', cache_size=4096):
+        # backend: 'keras' (TensorFlow) or 'numpy' (NumpyCNN, reads .h5 or the converted .npz weights)
+        # precision: 'float32' or 'int8', the post-training quantized copy of the network (TensorFlow Lite),
+        # built from the Keras weights and calibrated on MNIST the first time it is needed
+        # cache_size: predictions kept for cells already seen (same image hash), 0 to always run the CNN
         self.weights_file = weights_file
         self.epochs = epochs
         self.batch_size = batch_size
+        self.backend = backend
+        self.precision = precision
+        self.quantized_file = os.path.splitext(weights_file)[0] + '_int8.tflite'
+        self.calibration_size = 1000
+        self.infer = None
+        self.infer_model = None
+        self.cache = DigitCache(cache_size) if cache_size else None
         if not os.path.isfile(self.weights_file):
             self.model_built = False
             self.train_model()
         else:
             self.model_built = True
-            self.model = tf.keras.models.load_model(self.weights_file)
+            self.model = self.load_model()
+        self.compile_inference()
 
         self.puzzles = []
         self.puzzles_seen = 0
+        # Running votes of the saved boards, see stream_votes
+        self.votes = None
+        self.votes_cells = None
 
         self.exclude_classes = [0]
 
+    def load_model(self):
+        if self.precision == 'int8':
+            if not os.path.isfile(self.quantized_file):
+                self.quantize_model()
+            return QuantizedCNN(self.quantized_file)
+        if self.backend == 'numpy':
+            return NumpyCNN.load(self.weights_file)
+        import tensorflow as tf
+        return tf.keras.models.load_model(self.weights_file)
+
     def get_model_structure(self, width, height, depth, classes):
+        from tensorflow.keras.models import Sequential
+        from tensorflow.keras.layers import Conv2D
+        from tensorflow.keras.layers import MaxPooling2D
+        from tensorflow.keras.layers import Activation
+        from tensorflow.keras.layers import Flatten
+        from tensorflow.keras.layers import Dense
+        from tensorflow.keras.layers import Dropout
+
         model = Sequential()
 
         model.add(Conv2D(32, (5, 5), padding="same",
@@ -63,7 +89,9 @@ class DigitClassifier:
 
         return model
 
-    def train_model(self):
+    def load_mnist(self):
+        from tensorflow.keras.datasets import mnist
+
         print("Downloading MNIST...")
         ((trainData, trainLabels), (testData, testLabels)) = mnist.load_data()
 
@@ -71,11 +99,40 @@ class DigitClassifier:
         testData = testData.reshape((testData.shape[0], 28, 28, 1))
         trainData = trainData.astype("float32") / 255.0  # Now values in [0, 1]
         testData = testData.astype("float32") / 255.0
+        return (trainData, trainLabels), (testData, testLabels)
+
+    def evaluate(self, testData, testLabels, predict=None):
+        # classification_report of the predictions against the int labels, printed and returned as a dict
+        from sklearn.metrics import classification_report
+
+        print("Evaluating CNN...")
+        predictions = (predict or self.predict)(testData)
+        target_names = [str(x) for x in range(10)]
+        print(classification_report(testLabels, predictions.argmax(axis=1), target_names=target_names))
+        return classification_report(testLabels, predictions.argmax(axis=1), target_names=target_names,
+                                     output_dict=True)
+
+    def quantize_model(self):
+        # Post-training int8 quantization of the Keras network, calibrated on MNIST training images
+        import tensorflow as tf
+
+        h5_file = os.path.splitext(self.weights_file)[0] + '.h5'
+        model = tf.keras.models.load_model(h5_file)
+        (trainData, _), _ = self.load_mnist()
+        calibration = trainData[np.random.default_rng(0).permutation(len(trainData))[:self.calibration_size]]
+        print("Quantizing CNN in ", self.quantized_file, " file")
+        QuantizedCNN.convert(model, calibration, self.quantized_file)
+
+    def train_model(self):
+        from tensorflow.keras.optimizers import Adam
+        from sklearn.preprocessing import LabelBinarizer
+
+        ((trainData, trainLabels), (testData, testLabels)) = self.load_mnist()
 
         le = LabelBinarizer()
         trainLabels = le.fit_transform(trainLabels)
         testLabels = le.transform(testLabels)
-        opt = Adam(lr=1e-3)
+        opt = Adam(learning_rate=1e-3)
         model_trained = self.get_model_structure(28, 28, 1, 10)  # 10 classes=0...9 values
         model_trained.compile(loss="categorical_crossentropy", optimizer=opt, metrics=["accuracy"])
         print("Training CNN...")
@@ -86,43 +143,119 @@ class DigitClassifier:
             epochs=self.epochs,
             verbose=1)
 
-        print("Evaluating CNN...")
-        predictions = model_trained.predict(testData)
-        print(classification_report(
-            testLabels.argmax(axis=1),
-            predictions.argmax(axis=1),
-            target_names=[str(x) for x in le.classes_]))
-
-        print("Saving model in ", self.weights_file, " file")
-        model_trained.save(self.weights_file, save_format="h5")
+        self.evaluate(testData, testLabels.argmax(axis=1), model_trained.predict)
+
+        # The numpy backend keeps a Keras h5 copy next to the .npz weights
+        h5_file = os.path.splitext(self.weights_file)[0] + '.h5'
+        print("Saving model in ", h5_file, " file")
+        model_trained.save(h5_file)
+        if self.weights_file != h5_file:
+            NumpyCNN.from_h5(h5_file).save_npz(self.weights_file)
+        self.model = model_trained if self.backend == 'keras' and self.precision == 'float32' else self.load_model()
         self.model_built = True
 
+    def compile_inference(self):
+        # Forward pass compiled once with a fixed input signature and warmed up, then reused for every
+        # frame: model.predict sets up a dataset and callbacks on each call
+        model = self.model
+        if self.backend == 'numpy' or self.precision == 'int8':
+            self.infer = model.predict
+            self.infer_model = model
+            return
+        import tensorflow as tf
+        if isinstance(model, tf.keras.Model):
+            @tf.function(input_signature=[tf.TensorSpec([None, 28, 28, 1], tf.float32)])
+            def infer(batch):
+                return model(batch, training=False)
+
+            infer(tf.zeros((1, 28, 28, 1), tf.float32))
+            self.infer = lambda batch: infer(tf.convert_to_tensor(batch, tf.float32)).numpy()
+        else:
+            self.infer = lambda batch: model.predict(batch, verbose=0)
+        self.infer_model = model
+
+    def predict(self, batch):
+        if self.infer_model is not self.model:
+            self.compile_inference()
+        return self.infer(batch)
+
     def predictDigitImage(self, digit_image, showRoi=False):
         if self.model_built:
             roi = cv2.resize(digit_image, (28, 28))
             if showRoi:
                 cv2.imshow('Prediction image', roi)
-            roi = roi.astype("float") / 255.0
-            roi = img_to_array(roi)
-            roi = np.expand_dims(roi, axis=0)
-            preds = self.model.predict(roi)
+            roi = roi.astype("float32") / 255.0
+            roi = np.expand_dims(roi, axis=(0, -1))
+            preds = self.predict(roi)
             for c in self.exclude_classes:
                 preds[0][c] = 0
             return preds.argmax(axis=1)[0]
         else:
             return False
 
-    def analyze_boards(self, digit_images, info):
-        board_structure = {}
+    def predict_digit_images(self, digit_images):
+        if len(digit_images) == 0:
+            return np.zeros(0, dtype=int)
+        return self.predict_digit_probabilities(digit_images).argmax(axis=1)
+
+    def predict_digit_probabilities(self, digit_images):
+        # All the images in a single forward pass: (n, 28, 28, 1) float32 in [0, 1].
+        # The excluded classes are zeroed and every row scaled back to a sum of 1
+        if len(digit_images) == 0:
+            return np.zeros((0, 10))
+        batch = np.empty((len(digit_images), 28, 28, 1), dtype=np.float32)
+        for k, digit in enumerate(digit_images):
+            batch[k, :, :, 0] = cv2.resize(digit, (28, 28))
+        if self.cache is None:
+            batch /= 255.0
+            preds = np.array(self.predict(batch))
+        else:
+            preds = self.predict_cached(batch)
+        preds = np.array(preds, dtype=float)
+        preds[:, self.exclude_classes] = 0
+        return preds / np.maximum(preds.sum(axis=1, keepdims=True), 1e-12)
+
+    def predict_cached(self, batch):
+        # Only the cells whose hash is not in the cache go through the CNN
+        found, missing = self.cache.lookup(self.cache.keys(batch[:, :, :, 0]))
+        if missing:
+            rows = [positions[0] for positions in missing.values()]
+            computed = np.array(self.predict(batch[rows] / 255.0))
+            for (key, positions), probabilities in zip(missing.items(), computed):
+                self.cache.store(key, probabilities)
+                for k in positions:
+                    found[k] = probabilities
+        return np.array([found[k] for k in range(len(batch))])
+
+    def analyze_puzzles(self, puzzles, cells, probabilities=False):
+        # Stacks the cells of every puzzle, then scatters the predictions back to the cell ids.
+        # With probabilities, each cell gets its class probabilities instead of the predicted digit
+        rois = []
+        owners = []
+        for p, digit_images in enumerate(puzzles):
+            for idx, digit in enumerate(digit_images):
+                if digit is not None:
+                    rois.append(digit)
+                    owners.append((p, cells[idx]))
+
+        boards = [{} for _ in puzzles]
+        if not self.model_built:
+            return boards
+        if probabilities:
+            for (p, cell), prediction in zip(owners, self.predict_digit_probabilities(rois)):
+                boards[p][cell] = prediction
+            return boards
+        for (p, cell), prediction in zip(owners, self.predict_digit_images(rois)):
+            boards[p][cell] = str(prediction)
+        return boards
+
+    def board_cells(self, info):
         cells = []
-        [[cells.append(str(i) + str(j)) for j in range(info['GRID_LEN'])] for i in range(info['GRID_LEN'])]
-
-        for idx, digit in enumerate(digit_images):
-            if digit is not None:
-                prediction = self.predictDigitImage(digit)
-                board_structure[cells[idx]] = str(prediction)
+        [[cells.append(cell_key(i, j, info['GRID_LEN'])) for j in range(info['GRID_LEN'])] for i in range(info['GRID_LEN'])]
+        return cells
 
-        return board_structure
+    def analyze_boards(self, digit_images, info):
+        return self.analyze_puzzles([digit_images], self.board_cells(info))[0]
 
     def save_puzzle(self, puzzle):
         if self.puzzles_seen < 7:
@@ -130,88 +263,66 @@ class DigitClassifier:
         else:
             self.puzzles[self.puzzles_seen % 7] = puzzle
         self.puzzles_seen += 1
+        if self.votes is not None:
+            self.votes.add(self.analyze_puzzles([puzzle], self.votes_cells, probabilities=True)[0])
+
+    def saved_puzzles(self):
+        # The ring of saved boards, oldest first
+        start = self.puzzles_seen % 7 if self.puzzles_seen > 7 else 0
+        return self.puzzles[start:] + self.puzzles[:start]
+
+    def stream_votes(self, info, cells=None):
+        # From now on each saved board is classified once, when saved, and its class probabilities added
+        # to running per-cell votes; the boards already saved are classified here, in a single pass
+        if cells is None:
+            cells = self.skyscrapers_cells(info) if info.get('game') == 'skyscrapers' else self.board_cells(info)
+        self.exclude_classes = [x for x in range(10) if x not in [n for n in range(1, info['GRID_LEN'] + 1)]]
+        self.votes = DigitVotes(size=7)
+        self.votes_cells = cells
+        for digits in self.analyze_puzzles(self.saved_puzzles(), cells, probabilities=True):
+            self.votes.add(digits)
 
     def get_sudoku_digits(self, info):
-        digits_found = {}
-        predictions = []
-        self.exclude_classes = [x for x in range(10) if x not in [n for n in range(1, info['GRID_LEN'] + 1)]]
-        for board in self.puzzles:
-            digits = self.analyze_boards(board, info)
-            print(digits)
-            predictions.append(digits)
-
-        print("len predictions ", len(predictions))
-        for pos in predictions[len(predictions) - 1]:
-            predicted_in_pos = [pred[pos] for pred in predictions if pos in pred]
-            predicted_value_count = max(np.bincount(predicted_in_pos))
-            predicted_value = np.bincount(predicted_in_pos).argmax()
-            # 4 => 9 heuristic: it happens that 4 is predicted as 9 cause the font
-            if 4 in predicted_in_pos and 9 in predicted_in_pos:
-                predicted_value = 4
-            if len(set(predicted_in_pos)) > 1:
-                second_predicting = [x for x in predicted_in_pos if x is not predicted_value]
-                second_predicted = np.bincount(second_predicting).argmax()
-                if len(second_predicting) == predicted_value_count:
-                    print("Strange prediction for ", pos, " => ", predicted_value, " or ", second_predicted, "? <= ",
-                          predicted_in_pos)
-                    continue
-            #print(pos, " => ", predicted_in_pos, " ==> ", predicted_value)
-            digits_found[pos] = str(predicted_value)
-        return digits_found
+        return self.voted_digits(info, self.board_cells(info))
 
     def get_skyscrapers_digits(self, info):
-        digits_found = {}
-        predictions = []
-        for board in self.puzzles:
-            digits = self.analyze_skyscrapers_boards(board, info)
-            print(digits)
-            predictions.append(digits)
-
-        print("len predictions ", len(predictions))
-
-        for pos in predictions[len(predictions) - 1]:
-            predicted_in_pos = [pred[pos] for pred in predictions if pos in pred]
-            predicted_value_count = max(np.bincount(predicted_in_pos))
-            predicted_value = np.bincount(predicted_in_pos).argmax()
-            # 4 => 9 heuristic: it happens that 4 is predicted as 9 cause the font
-            if 4 in predicted_in_pos and 9 in predicted_in_pos:
-                predicted_value = 4
-            # if len(set(predicted_in_pos)) > 1:
-            #     second_predicting = [x for x in predicted_in_pos if x is not predicted_value]
-            #     second_predicted = np.bincount(second_predicting).argmax()
-            #     if len(second_predicting) == predicted_value_count:
-            #         print("Strange prediction for ", pos, " => ", predicted_value, " or ", second_predicted, "? <= ",
-            #               predicted_in_pos)
-            #         continue
-            # print(pos, " => ", predicted_in_pos, " ==> ", predicted_value)
-            digits_found[pos] = str(predicted_value)
-        return digits_found
-
-    def analyze_skyscrapers_boards(self, digit_images, info):
-        if info['game'] == 'skyscrapers':
-            self.exclude_classes = [x for x in range(10) if x not in [ n for n in range(1, info['GRID_LEN'] + 1)]]
-
-        board_structure = {}
-
+        return self.voted_digits(info, self.skyscrapers_cells(info))
+
+    def get_sudoku_candidates(self, info, top_k=3, min_confidence=0.9):
+        # Cells read with less than min_confidence, with their top_k digits: soft givens for the solver
+        cells = self.board_cells(info)
+        if self.votes is None or self.votes_cells != cells:
+            self.stream_votes(info, cells)
+        return self.votes.candidates(top_k, min_confidence)
+
+    def voted_digits(self, info, cells):
+        # Most voted digit of every cell read in the newest board
+        if self.votes is None or self.votes_cells != cells:
+            self.stream_votes(info, cells)
+        print(self.votes.consensus())
+        print("len predictions ", len(self.votes))
+        return self.votes.consensus()
+
+    def skyscrapers_cells(self, info):
+        # Clue cells on the frame around the grid, row by row
         cells = []
         grid_len = info['GRID_LEN']  # Ex. 4
-        exclude = ['00', '0' + str(grid_len + 1), str(grid_len + 1) + '0', str(grid_len + 1) + str(grid_len + 1)]
+        frame = grid_len + 2
+        exclude = [cell_key(0, 0, frame), cell_key(0, grid_len + 1, frame), cell_key(grid_len + 1, 0, frame),
+                   cell_key(grid_len + 1, grid_len + 1, frame)]
         for i in range(1, grid_len + 1):
-            [exclude.append(str(i) + str(j)) for j in range(1, grid_len + 1)]
+            [exclude.append(cell_key(i, j, frame)) for j in range(1, grid_len + 1)]
         for j in range(grid_len+2):
             for i in range(grid_len+2):
-                if not str(j) + str(i) in exclude:
-                    cells.append(str(j) + str(i))
-
-        for idx, digit in enumerate(digit_images):
-            if digit is not None:
-                imshow = False if cells[idx] != '51' else True
-                prediction = self.predictDigitImage(digit, imshow)
-                if cells[idx] == '51':
-                    cv2.imshow('digit ', digit)
-                board_structure[cells[idx]] = str(prediction)
-
-        return board_structure
+                if not cell_key(j, i, frame) in exclude:
+                    cells.append(cell_key(j, i, frame))
+        return cells
+
+    def analyze_skyscrapers_boards(self, digit_images, info):
+        if info['game'] == 'skyscrapers':
+            self.exclude_classes = [x for x in range(10) if x not in [ n for n in range(1, info['GRID_LEN'] + 1)]]
+
+        return self.analyze_puzzles([digit_images], self.skyscrapers_cells(info))[0]
 
 # 01
 # 02
@@ -0,0 +1,76 @@
+# Class for the running per-cell votes over the last boards read by the classifier
+from collections import deque
+import numpy as np
+
+
+class DigitVotes:
+    def __init__(self, size=7, classes=10):
+        # Votes of the last size boards; adding a board to a full ring takes the oldest one's votes back.
+        # A board gives each cell either a digit (one vote) or the class probabilities of its image
+        self.size = size
+        self.classes = classes
+        self.boards = deque()
+        self.weights = {}  # cell -> summed votes per digit
+        self.reads = {}  # cell -> boards that read the cell
+
+    def add(self, board):
+        if len(self.boards) == self.size:
+            for cell, weights in self.boards.popleft().items():
+                self.reads[cell] -= 1
+                if self.reads[cell] == 0:
+                    del self.reads[cell]
+                    del self.weights[cell]
+                else:
+                    self.weights[cell] -= weights
+        board = {cell: self.as_weights(value) for cell, value in board.items()}
+        for cell, weights in board.items():
+            if cell in self.weights:
+                self.weights[cell] += weights
+                self.reads[cell] += 1
+            else:
+                self.weights[cell] = weights.copy()
+                self.reads[cell] = 1
+        self.boards.append(board)
+
+    def as_weights(self, value):
+        if np.ndim(value) == 0:
+            weights = np.zeros(self.classes)
+            weights[int(value)] = 1.0
+            return weights
+        return np.asarray(value, dtype=float)
+
+    def vote(self, cell):
+        # Most voted digit (the smallest one on ties) and its mean share of the votes
+        weights = self.weights[cell]
+        value = int(weights.argmax())
+        return value, float(weights[value]) / self.reads[cell]
+
+    def top(self, cell, k=3):
+        # The k most voted digits of the cell with their shares, best first
+        weights = self.weights[cell]
+        order = np.argsort(-weights, kind='stable')[:k]
+        return [(int(value), float(weights[value]) / self.reads[cell]) for value in order if weights[value] > 0]
+
+    def consensus(self):
+        # Digits of the cells read in the newest board
+        if not self.boards:
+            return {}
+        return {cell: str(self.vote(cell)[0]) for cell in self.boards[-1]}
+
+    def confidence(self):
+        if not self.boards:
+            return {}
+        return {cell: self.vote(cell)[1] for cell in self.boards[-1]}
+
+    def candidates(self, k=3, min_confidence=0.9):
+        # Top k digits of the cells of the newest board whose vote is below min_confidence
+        if not self.boards:
+            return {}
+        candidates = {}
+        for cell in self.boards[-1]:
+            if self.vote(cell)[1] < min_confidence:
+                candidates[cell] = [(str(value), share) for value, share in self.top(cell, k)]
+        return candidates
+
+    def __len__(self):
+        return len(self.boards)
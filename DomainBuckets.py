@@ -0,0 +1,89 @@
+# Class for minimum-remaining-values variable ordering
+
+class DomainBuckets:
+    def __init__(self, max_size):
+        # buckets[k][d] holds the unassigned variables with k values left and d unassigned peers (dicts keep the
+        # order deterministic); top[k] is at least the largest d in use for k, lowered lazily by select
+        self.buckets = [{} for _ in range(max_size + 1)]
+        self.counts = [0] * (max_size + 1)
+        self.top = [0] * (max_size + 1)
+        self.sizes = {}
+        self.degrees = {}
+
+    def __len__(self):
+        return len(self.sizes)
+
+    def __contains__(self, var):
+        return var in self.sizes
+
+    def insert(self, var):
+        size = self.sizes[var]
+        degree = self.degrees.get(var, 0)
+        level = self.buckets[size]
+        if degree in level:
+            level[degree][var] = None
+        else:
+            level[degree] = {var: None}
+        self.counts[size] += 1
+        if degree > self.top[size]:
+            self.top[size] = degree
+
+    def discard(self, var):
+        size = self.sizes[var]
+        degree = self.degrees.get(var, 0)
+        level = self.buckets[size]
+        del level[degree][var]
+        if not level[degree]:
+            del level[degree]
+        self.counts[size] -= 1
+
+    def push(self, var, size, degree=None):
+        self.sizes[var] = size
+        if degree is not None:
+            self.degrees[var] = degree
+        self.insert(var)
+
+    def remove(self, var):
+        self.discard(var)
+        del self.sizes[var]
+
+    def update(self, var, size, delta=0):
+        # New domain size, and the degree moved by delta, in a single move between buckets. Called for every
+        # peer of every assignment: discard and insert are inlined
+        old_size = self.sizes.get(var)
+        if old_size is None or (old_size == size and delta == 0):
+            return
+        degrees = self.degrees
+        degree = degrees.get(var, 0)
+        level = self.buckets[old_size]
+        bucket = level[degree]
+        del bucket[var]
+        if not bucket:
+            del level[degree]
+        self.counts[old_size] -= 1
+
+        degree += delta
+        degrees[var] = degree
+        self.sizes[var] = size
+        level = self.buckets[size]
+        bucket = level.get(degree)
+        if bucket is None:
+            level[degree] = {var: None}
+        else:
+            bucket[var] = None
+        self.counts[size] += 1
+        if degree > self.top[size]:
+            self.top[size] = degree
+
+    def select(self):
+        # Smallest domain first, ties broken by the number of unassigned peers: only the empty degrees above
+        # the largest one in use are skipped, never the variables of the bucket
+        for size, count in enumerate(self.counts):
+            if count:
+                level = self.buckets[size]
+                degree = self.top[size]
+                while degree not in level:
+                    degree -= 1
+                self.top[size] = degree
+                return next(iter(level[degree]))
+        return None
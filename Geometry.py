@@ -0,0 +1,82 @@
+# Class for the index tables of a board shape, computed once and shared by every solver
+from functools import lru_cache
+
+
+def cell_key(i, j, size):
+    # Key of cell (i, j) in the dict-based API: '34' on boards up to 10x10, '0304' on larger ones
+    if size <= 10:
+        return str(i) + str(j)
+    return '%02d%02d' % (i, j)
+
+
+@lru_cache(maxsize=32)
+def get_geometry(game, grid_len, square_len=None):
+    return Geometry(game, grid_len, square_len)
+
+
+class Geometry:
+    def __init__(self, game, grid_len, square_len=None):
+        # Cells are flat indices idx = i * grid_len + j; every table is a tuple, the instances are shared
+        self.game = game
+        self.GRID_LEN = grid_len
+        self.SQUARE_LEN = square_len
+        self.size = grid_len * grid_len
+
+        self.keys = tuple(cell_key(i, j, grid_len) for i in range(grid_len) for j in range(grid_len))
+        self.index = {key: idx for idx, key in enumerate(self.keys)}
+
+        self.row_of = tuple(idx // grid_len for idx in range(self.size))
+        self.col_of = tuple(idx % grid_len for idx in range(self.size))
+        self.rows = tuple(tuple(range(i * grid_len, (i + 1) * grid_len)) for i in range(grid_len))
+        self.cols = tuple(tuple(range(j, self.size, grid_len)) for j in range(grid_len))
+        self.lines = self.rows + self.cols
+
+        # Sudoku boxes; the other games keep every cell in box 0, which stays empty
+        box_of = [0] * self.size
+        boxes = []
+        if game == 'sudoku':
+            for b in range(grid_len):
+                top = (b // square_len) * square_len
+                left = (b % square_len) * square_len
+                box = tuple((top + k) * grid_len + left + s for k in range(square_len) for s in range(square_len))
+                for idx in box:
+                    box_of[idx] = b
+                boxes.append(box)
+        self.box_of = tuple(box_of)
+        self.boxes = tuple(boxes)
+
+        # The up to 8 cells touching each cell, and the diagonal ones among them
+        neighbours = []
+        diagonals = []
+        for idx in range(self.size):
+            i = idx // grid_len
+            j = idx % grid_len
+            cells = [v * grid_len + u for v in range(max(i - 1, 0), min(i + 2, grid_len))
+                     for u in range(max(j - 1, 0), min(j + 2, grid_len)) if v != i or u != j]
+            neighbours.append(tuple(cells))
+            diagonals.append(tuple(c for c in cells if c // grid_len != i and c % grid_len != j))
+        self.neighbours = tuple(neighbours)
+        self.diagonals = tuple(diagonals)
+
+        # Skyscrapers lines of sight: the cells seen from each clue, nearest first
+        self.sight_lines = {
+            'left': self.rows,
+            'right': tuple(row[::-1] for row in self.rows),
+            'top': self.cols,
+            'bottom': tuple(col[::-1] for col in self.cols)
+        }
+        self.sight_lines_of = tuple((('left', i), ('right', i), ('top', j), ('bottom', j))
+                                    for i, j in zip(self.row_of, self.col_of))
+
+        # Cells sharing a row, column, box or (stars) touching each cell; stars areas come with the puzzle
+        peers = [{} for _ in range(self.size)]
+        for unit in self.rows + self.cols + self.boxes:
+            for idx in unit:
+                for p in unit:
+                    if p != idx:
+                        peers[idx][p] = None
+        if game == 'stars':
+            for idx in range(self.size):
+                for d in self.neighbours[idx]:
+                    peers[idx][d] = None
+        self.peers = tuple(tuple(p) for p in peers)
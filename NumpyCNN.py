@@ -0,0 +1,135 @@
+# Class for running the digit CNN with NumPy only, without TensorFlow
+import json
+import sys
+import numpy as np
+
+
+class NumpyCNN:
+    def __init__(self, layers, weights):
+        # layers: list of dicts with a 'type' (conv, pool, flatten, dense, relu, softmax);
+        # weights: the (kernel, bias) pairs of the conv and dense layers, in order
+        self.layers = layers
+        self.weights = [(np.asarray(kernel, dtype=np.float32), np.asarray(bias, dtype=np.float32))
+                        for kernel, bias in weights]
+
+    @classmethod
+    def load(cls, path):
+        if path.endswith('.npz'):
+            return cls.from_npz(path)
+        return cls.from_h5(path)
+
+    @classmethod
+    def from_h5(cls, path):
+        # Reads the Sequential config and the weights of a Keras h5 file (h5py only, no TensorFlow)
+        import h5py
+        layers = []
+        weights = []
+        with h5py.File(path, 'r') as f:
+            config = f.attrs['model_config']
+            if isinstance(config, bytes):
+                config = config.decode('utf-8')
+            config = json.loads(config)['config']
+            if isinstance(config, dict):
+                config = config['layers']
+            group = f['model_weights'] if 'model_weights' in f else f
+            for layer in config:
+                kind = layer['class_name']
+                cfg = layer['config']
+                if kind in ('Conv2D', 'Dense'):
+                    params = {}
+
+                    def collect(name, obj):
+                        # 'conv2d/kernel:0' -> 'kernel'
+                        if isinstance(obj, h5py.Dataset):
+                            params[name.split('/')[-1].split(':')[0]] = obj[()]
+
+                    group[cfg['name']].visititems(collect)
+                    weights.append((params['kernel'], params['bias']))
+                    if kind == 'Conv2D':
+                        if tuple(cfg.get('strides', (1, 1))) != (1, 1):
+                            raise ValueError('only stride 1 convolutions are supported')
+                        layers.append({'type': 'conv', 'padding': cfg.get('padding', 'valid')})
+                    else:
+                        layers.append({'type': 'dense'})
+                    layers += cls.activation(cfg.get('activation', 'linear'))
+                elif kind == 'Activation':
+                    layers += cls.activation(cfg['activation'])
+                elif kind == 'MaxPooling2D':
+                    layers.append({'type': 'pool', 'size': list(cfg.get('pool_size', (2, 2)))})
+                elif kind == 'Flatten':
+                    layers.append({'type': 'flatten'})
+                elif kind not in ('InputLayer', 'Dropout'):
+                    raise ValueError('unsupported layer ' + kind)
+        return cls(layers, weights)
+
+    @staticmethod
+    def activation(name):
+        if name == 'linear':
+            return []
+        if name not in ('relu', 'softmax'):
+            raise ValueError('unsupported activation ' + name)
+        return [{'type': name}]
+
+    @classmethod
+    def from_npz(cls, path):
+        data = np.load(path)
+        layers = json.loads(str(data['layers']))
+        count = len([name for name in data.files if name.startswith('kernel_')])
+        weights = [(data['kernel_' + str(k)], data['bias_' + str(k)]) for k in range(count)]
+        return cls(layers, weights)
+
+    def save_npz(self, path):
+        # Compact copy of the weights (no optimizer state), loadable without h5py
+        arrays = {'layers': np.array(json.dumps(self.layers))}
+        for k, (kernel, bias) in enumerate(self.weights):
+            arrays['kernel_' + str(k)] = kernel
+            arrays['bias_' + str(k)] = bias
+        np.savez_compressed(path, **arrays)
+
+    # Inference
+
+    def predict(self, batch, verbose=0, batch_size=None):
+        x = np.asarray(batch, dtype=np.float32)
+        w = 0
+        for layer in self.layers:
+            kind = layer['type']
+            if kind == 'conv':
+                kernel, bias = self.weights[w]
+                w += 1
+                x = self.conv(x, kernel, layer['padding']) + bias
+            elif kind == 'dense':
+                kernel, bias = self.weights[w]
+                w += 1
+                x = x @ kernel + bias
+            elif kind == 'relu':
+                x = np.maximum(x, 0)
+            elif kind == 'softmax':
+                x = np.exp(x - x.max(axis=-1, keepdims=True))
+                x /= x.sum(axis=-1, keepdims=True)
+            elif kind == 'pool':
+                ph, pw = layer['size']
+                n, h, wd, c = x.shape
+                x = x[:, :h - h % ph, :wd - wd % pw].reshape(n, h // ph, ph, wd // pw, pw, c).max(axis=(2, 4))
+            elif kind == 'flatten':
+                x = x.reshape(len(x), -1)
+        return x
+
+    def __call__(self, batch):
+        return self.predict(batch)
+
+    @staticmethod
+    def conv(x, kernel, padding):
+        # im2col: every kh x kw window becomes a row, then one matrix product with the kernel
+        kh, kw, c, out = kernel.shape
+        if padding == 'same':
+            x = np.pad(x, ((0, 0), ((kh - 1) // 2, kh // 2), ((kw - 1) // 2, kw // 2), (0, 0)))
+        n, h, w = x.shape[0], x.shape[1] - kh + 1, x.shape[2] - kw + 1
+        windows = np.lib.stride_tricks.sliding_window_view(x, (kh, kw), axis=(1, 2))
+        # (n, h, w, c, kh, kw) -> (n, h, w, kh, kw, c) to match the kernel layout
+        cols = windows.transpose(0, 1, 2, 4, 5, 3).reshape(n * h * w, kh * kw * c)
+        return (cols @ kernel.reshape(kh * kw * c, out)).reshape(n, h, w, out)
+
+
+if __name__ == '__main__':
+    # python NumpyCNN.py model_weights.h5 model_weights.npz
+    NumpyCNN.from_h5(sys.argv[1]).save_npz(sys.argv[2])
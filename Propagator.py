@@ -0,0 +1,225 @@
+# Class for constraint propagation (AC-3 and forward checking) over bitmask domains
+
+class Propagator:
+    def __init__(self, values, domains, mode='mac'):
+        # Variables are the int cell indices: domains[var] lists the values of cell var,
+        # bit k of a domain mask stands for values[k]
+        self.values = values
+        self.bits = {value: 1 << k for k, value in enumerate(values)}
+        self.domains = [sum([self.bits[v] for v in domain]) for domain in domains]
+        self.mode = mode
+
+        self.constraints = []
+        self.watchers = [[] for _ in domains]
+        self.revisers = {
+            'alldiff': self.revise_alldiff,
+            'count': self.revise_count,
+            'apart': self.revise_apart,
+            'skyline': self.revise_skyline
+        }
+
+        # Trail of (var, previous domain) and the trail length at every assignment, for undo
+        self.trail = []
+        self.marks = []
+        self.on_change = None
+        self.revisions = 0
+
+    def add_constraint(self, kind, scope, param=None):
+        idx = len(self.constraints)
+        self.constraints.append((kind, scope, param))
+        for var in scope:
+            self.watchers[var].append(idx)
+
+    def values_of(self, var):
+        return [value for value in self.values if self.domains[var] & self.bits[value]]
+
+    def size(self, var):
+        return bin(self.domains[var]).count('1')
+
+    def reduce(self, var, domain):
+        old = self.domains[var]
+        if domain == old:
+            return True
+        self.trail.append((var, old))
+        self.domains[var] = domain
+        if self.on_change is not None:
+            self.on_change(var)
+        if domain == 0:
+            return False
+        self.queue_watchers(var)
+        return True
+
+    def undo(self, mark):
+        while len(self.trail) > mark:
+            var, old = self.trail.pop()
+            self.domains[var] = old
+            if self.on_change is not None:
+                self.on_change(var)
+
+    # Search interface
+
+    def assign(self, var, value):
+        self.marks.append(len(self.trail))
+        self.queue = []
+        self.queued = set()
+        if self.reduce(var, self.domains[var] & self.bits[value]):
+            # The value may already be the only one left: its constraints are checked anyway
+            self.queue_watchers(var)
+            if self.propagate():
+                return True
+        self.unassign()
+        return False
+
+    def unassign(self):
+        self.undo(self.marks.pop())
+
+    def establish(self):
+        # Initial AC-3 pass over every constraint, before search
+        self.queue = list(range(len(self.constraints)))
+        self.queued = set(self.queue)
+        return self.propagate(cascade=True)
+
+    def queue_watchers(self, var):
+        for idx in self.watchers[var]:
+            if idx not in self.queued:
+                self.queued.add(idx)
+                self.queue.append(idx)
+
+    def propagate(self, cascade=None):
+        # MAC revises until nothing changes, forward checking only revises once the constraints
+        # queued by the assignment
+        if cascade is None:
+            cascade = self.mode == 'mac'
+        if not cascade:
+            pending = self.queue
+            self.queue = []
+            for idx in pending:
+                if not self.revise(idx):
+                    return False
+            return True
+        while self.queue:
+            idx = self.queue.pop()
+            self.queued.discard(idx)
+            if not self.revise(idx):
+                return False
+        return True
+
+    def revise(self, idx):
+        kind, scope, param = self.constraints[idx]
+        self.revisions += 1
+        return self.revisers[kind](scope, param)
+
+    # Revise functions: prune the domains in the scope, return False on a wipeout
+
+    def revise_alldiff(self, scope, values_mask):
+        # Fixed values are removed from the other cells; if the scope has to contain every value
+        # (values_mask), a value left in a single cell is fixed there
+        fixed = 0
+        for var in scope:
+            d = self.domains[var]
+            if d & (d - 1) == 0:
+                if d & fixed:
+                    return False
+                fixed |= d
+        once = 0
+        twice = 0
+        for var in scope:
+            d = self.domains[var]
+            if d & (d - 1) and d & fixed:
+                d &= ~fixed
+                if not self.reduce(var, d):
+                    return False
+            twice |= once & d
+            once |= d
+        if values_mask is None:
+            return True
+        if once & values_mask != values_mask:
+            return False
+        singles = once & ~twice & ~fixed
+        if singles:
+            for var in scope:
+                d = self.domains[var] & singles
+                if d and self.domains[var] != d:
+                    if d & (d - 1) or not self.reduce(var, d):
+                        return False
+        return True
+
+    def revise_count(self, scope, k):
+        # Exactly k cells of the scope take the value '1'
+        one = self.bits['1']
+        zero = self.bits['0']
+        ones = 0
+        undecided = []
+        for var in scope:
+            d = self.domains[var]
+            if d == one:
+                ones += 1
+            elif d & one:
+                undecided.append(var)
+        if ones > k or ones + len(undecided) < k:
+            return False
+        if ones == k:
+            for var in undecided:
+                if not self.reduce(var, zero):
+                    return False
+        elif ones + len(undecided) == k:
+            for var in undecided:
+                if not self.reduce(var, one):
+                    return False
+        return True
+
+    def revise_apart(self, scope, param):
+        # The two cells can't both be '1'
+        one = self.bits['1']
+        a, b = scope
+        if self.domains[a] == one:
+            return self.reduce(b, self.domains[b] & ~one)
+        if self.domains[b] == one:
+            return self.reduce(a, self.domains[a] & ~one)
+        return True
+
+    def revise_skyline(self, line, clues):
+        # Keep only the heights used by some permutation of the line that shows clues[0] buildings
+        # from the start and clues[1] from the end (0 means no clue)
+        first, last = clues
+        if not first and not last:
+            return True
+        n = len(line)
+        domains = [self.domains[var] for var in line]
+        supports = [0] * n
+        chosen = [0] * n
+
+        def visible_from_end():
+            count = 0
+            tallest = 0
+            for k in range(n - 1, -1, -1):
+                if chosen[k] > tallest:
+                    tallest = chosen[k]
+                    count += 1
+            return count
+
+        def search(pos, used, visible, tallest):
+            if first and (visible > first or visible + min(n - pos, n - tallest) < first):
+                return
+            if pos == n:
+                if (not first or visible == first) and (not last or visible_from_end() == last):
+                    for k in range(n):
+                        supports[k] |= 1 << (chosen[k] - 1)
+                return
+            free = domains[pos] & ~used
+            height = 1
+            while free:
+                if free & 1:
+                    chosen[pos] = height
+                    if height > tallest:
+                        search(pos + 1, used | (1 << (height - 1)), visible + 1, height)
+                    else:
+                        search(pos + 1, used | (1 << (height - 1)), visible, tallest)
+                free >>= 1
+                height += 1
+
+        search(0, 0, 0, 0)
+        for k, var in enumerate(line):
+            if not self.reduce(var, domains[k] & supports[k]):
+                return False
+        return True
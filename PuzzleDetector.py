@@ -3,15 +3,32 @@
 import cv2
 import numpy as np
 np.seterr(divide='ignore', invalid='ignore')
-from skimage.segmentation import clear_border
 import operator
+from Geometry import cell_key
 
 
 class PuzzleDetector:
-    def __init__(self, game_info):
+    def __init__(self, game_info, tracking=False):
         self.game_info = game_info  # Es. GRID_LEN
         self.grid_digit_images = None
 
+        # Images of the last detection by window name; display=False leaves showing them to the caller
+        # (the real-time pipeline detects in a worker thread and draws in the main one)
+        self.display = True
+        self.windows = {}
+
+        # Tracking mode (real-time): the board corners found in a frame are followed in the next ones with
+        # optical flow, the full contour search runs only when they are lost or every redetect_every frames
+        self.tracking = tracking
+        self.redetect_every = 30
+        self.track_radius = 64
+        self.track_windows = None
+        self.track_corners = None
+        self.track_area = 0
+        self.frames_since_detection = 0
+        self.tracked_frames = 0
+        self.full_detections = 0
+
     def detectGameBoard(self, image):
         if self.game_info['game'] == 'sudoku':
             return self.detectSudokuBoard(image)
@@ -23,7 +40,7 @@ class PuzzleDetector:
             return None
 
     def detectSudokuBoard(self, img):
-        polygon, output = self.findPolygon(img)
+        polygon, output = self.locatePolygon(img)
 
         bottom_right_index, _ = max(enumerate([pt[0][0] + pt[0][1] for pt in
                                                polygon]), key=operator.itemgetter(1))
@@ -59,33 +76,19 @@ class PuzzleDetector:
         m = cv2.getPerspectiveTransform(src_polygon, dst_polygon)
         img = cv2.warpPerspective(img, m, (int(square_side), int(square_side)))
 
-        squares = []
-        grid_len = self.game_info['GRID_LEN']  # Ex. 9
-        side = img.shape[:1]
-        side = side[0] / grid_len
-        for j in range(grid_len):
-            for i in range(grid_len):
-                p1 = (int(i * side), int(j * side))
-                p2 = (int((i + 1) * side), int((j + 1) * side))
-                squares.append((p1, p2))
-
-        digits = []
-        for idx, square in enumerate(squares):
-            square_roi = img[square[0][1]:square[1][1], square[0][0]:square[1][0]]
-            extracted_digit = self.get_digit(square_roi) if idx != 77 else self.get_digit(square_roi, True)
-            digits.append(extracted_digit)
+        digits = self.extract_digits(img, self.game_info['GRID_LEN'])
 
         output = cv2.putText(output, "Press Space when the puzzle is well seen", (30, output.shape[0] - 20),
                              cv2.FONT_HERSHEY_DUPLEX, 0.75, color=(0, 255, 255))
 
-        cv2.imshow("Sudoku Puzzle Found", img)
-        cv2.imshow("Sudoku Puzzle Image", output)
+        self.showImage("Sudoku Puzzle Found", img)
+        self.showImage("Sudoku Puzzle Image", output)
 
         self.grid_image = img
         self.grid_digit_images = digits
 
     def detectStarsBoard(self, img):
-        polygon, output = self.findPolygon(img)
+        polygon, output = self.locatePolygon(img)
 
         bottom_right_index, _ = max(enumerate([pt[0][0] + pt[0][1] for pt in
                                                polygon]), key=operator.itemgetter(1))
@@ -136,7 +139,7 @@ class PuzzleDetector:
         labeled_img = cv2.merge([label_hue, blank_ch, blank_ch])
         labeled_img = cv2.cvtColor(labeled_img, cv2.COLOR_HSV2BGR)
         labeled_img[label_hue == 0] = 0
-        cv2.imshow("Stars Puzzle - Area detection", labeled_img)
+        self.showImage("Stars Puzzle - Area detection", labeled_img)
 
         grid_len = self.game_info['GRID_LEN']  # Ex. 8
         side = img.shape[:1]
@@ -148,14 +151,14 @@ class PuzzleDetector:
                     p1 = (int(i * side), int(j * side))  # Top left corner of a box
                     p2 = (int((i + 1) * side), int((j + 1) * side))  # Bottom right corner
                     area_label = labels[p1[1] + int((p2[1] - p1[1]) / 2), p1[0] + int((p2[0] - p1[0]) / 2)] - 1
-                    areas[area_label].append(str(j) + str(i))
-        cv2.imshow("Stars Puzzle Image", output)
+                    areas[area_label].append(cell_key(j, i, grid_len))
+        self.showImage("Stars Puzzle Image", output)
 
         self.grid_image = warped
         self.grid_digit_images = areas
 
     def detectSkyscrapersBoard(self, img):
-        polygon, output = self.findPolygon(img)
+        polygon, output = self.locatePolygon(img)
 
         rect = cv2.minAreaRect(polygon)
         box = cv2.boxPoints(rect)
@@ -201,31 +204,93 @@ class PuzzleDetector:
                     squares.append((p1, p2))
                     # print(str(j) + str(i))
 
-        squares = []
-        grid_len = self.game_info['GRID_LEN']  # Ex. 9
-        side = img.shape[:1][0] / (grid_len)
-        for j in range(grid_len):
-            for i in range(grid_len):
-                p1 = (int(i * side), int(j * side))
-                p2 = (int((i + 1) * side), int((j + 1) * side))
-                squares.append((p1, p2))
-
-        digits = []
-        for idx, square in enumerate(squares):
-            square_roi = img[square[0][1]:square[1][1], square[0][0]:square[1][0]]
-            extracted_digit = self.get_digit(square_roi)
-            if extracted_digit is not None:
-                digits.append(extracted_digit)
+        digits = [d for d in self.extract_digits(img, self.game_info['GRID_LEN']) if d is not None]
 
         output = cv2.putText(output, "Press Space when the puzzle is well seen", (30, output.shape[0] - 20),
                              cv2.FONT_HERSHEY_DUPLEX, 0.75, color=(0, 255, 255))
 
-        cv2.imshow("Sudoku Puzzle Found", img)
-        cv2.imshow("Sudoku Puzzle Image", output)
+        self.showImage("Sudoku Puzzle Found", img)
+        self.showImage("Sudoku Puzzle Image", output)
 
         self.grid_image = img
         self.grid_digit_images = digits
 
+    def showImage(self, name, image):
+        self.windows[name] = image
+        if self.display:
+            cv2.imshow(name, image)
+
+    def locatePolygon(self, img):
+        if not self.tracking:
+            return self.findPolygon(img)
+        polygon = None
+        if self.track_corners is not None and self.frames_since_detection < self.redetect_every:
+            polygon = self.trackPolygon(img)
+        if polygon is None:
+            polygon, output = self.findPolygon(img)
+            corners = self.polygonCorners(polygon)
+            self.track_corners = corners.reshape(-1, 2).astype(np.float32)
+            self.track_area = cv2.contourArea(corners)
+            self.frames_since_detection = 0
+            self.full_detections += 1
+        else:
+            output = img.copy()
+            cv2.drawContours(output, [polygon], -1, (0, 255, 0), 2)
+            self.frames_since_detection += 1
+            self.tracked_frames += 1
+        self.track_windows = self.cornerWindows(img, self.track_corners)
+        return polygon, output
+
+    def cornerWindows(self, img, corners):
+        # Gray windows of side 2 * track_radius around the corners, with their top left offsets:
+        # only these are converted and searched in the next frame
+        r = self.track_radius
+        windows = []
+        for x, y in corners:
+            x0, y0 = max(int(x) - r, 0), max(int(y) - r, 0)
+            windows.append((cv2.cvtColor(img[y0:y0 + 2 * r, x0:x0 + 2 * r], cv2.COLOR_BGR2GRAY), (x0, y0)))
+        return windows
+
+    def trackPolygon(self, img):
+        # Pyramidal Lucas-Kanade inside each corner window, checked backwards; None when the board is lost
+        params = dict(winSize=(21, 21), maxLevel=2,
+                      criteria=(cv2.TERM_CRITERIA_EPS | cv2.TERM_CRITERIA_COUNT, 20, 0.03))
+        corners = []
+        for (previous, (x0, y0)), corner in zip(self.track_windows, self.track_corners):
+            window = img[y0:y0 + previous.shape[0], x0:x0 + previous.shape[1]]
+            if window.shape[:2] != previous.shape:
+                return self.lostTracking()
+            window = cv2.cvtColor(window, cv2.COLOR_BGR2GRAY)
+            start = (corner - (x0, y0)).reshape(1, 1, 2).astype(np.float32)
+            moved, status, _ = cv2.calcOpticalFlowPyrLK(previous, window, start, None, **params)
+            if moved is None or not status.all():
+                return self.lostTracking()
+            back, status, _ = cv2.calcOpticalFlowPyrLK(window, previous, moved, None, **params)
+            if back is None or not status.all() or np.abs(back - start).max() > 1.0:
+                return self.lostTracking()
+            corners.append(moved.reshape(2) + (x0, y0))
+        corners = np.array(corners, dtype=np.float32)
+        polygon = np.round(corners).astype(np.int32).reshape(-1, 1, 2)
+        area = cv2.contourArea(polygon)
+        # The board can move, not change shape suddenly
+        if not cv2.isContourConvex(polygon) or not 0.8 < area / self.track_area < 1.25:
+            return self.lostTracking()
+        self.track_corners = corners
+        self.track_area = area
+        return polygon
+
+    def lostTracking(self):
+        self.track_corners = None
+        return None
+
+    def polygonCorners(self, polygon):
+        # Top left, top right, bottom right, bottom left points of a contour, as (4, 1, 2) int32
+        points = polygon.reshape(-1, 2)
+        sums = points[:, 0] + points[:, 1]
+        diffs = points[:, 0] - points[:, 1]
+        corners = points[[sums.argmin(), diffs.argmax(), sums.argmax(), diffs.argmin()]]
+        return corners.reshape(-1, 1, 2).astype(np.int32)
+
     def findPolygon(self, img):
         gray = cv2.cvtColor(img, cv2.COLOR_BGR2GRAY)
         blurred = cv2.GaussianBlur(gray, (7, 7), 3)
@@ -252,7 +317,62 @@ class PuzzleDetector:
         b = p2[1] - p1[1]
         return np.sqrt((a ** 2) + (b ** 2))
 
+    def extract_digits(self, img, grid_len):
+        # Whole-grid version of get_digit: the cells of the warped board, row by row, as digit images or None.
+        # The thresholded cells are laid out as a tile of N x N blocks of the largest cell size, each inside a
+        # frame, so that one pass of each following step serves every cell and no component crosses cells
+        gray = cv2.cvtColor(img, cv2.COLOR_BGR2GRAY)
+        side = gray.shape[0] / grid_len
+        edges = (np.arange(grid_len + 1) * side).astype(int)
+        lens = np.diff(edges)
+        B = lens.max() + 2  # block side with its frame
+
+        # Otsu still picks a threshold per cell, as get_digit does. The frames (and the padding of the
+        # smaller cells) are foreground, so a single flood fill from the corner clears the frames and every
+        # component touching the border of its cell (clear_border)
+        thresh = np.full((grid_len * B, grid_len * B), 255, dtype=np.uint8)
+        for j in range(grid_len):
+            for i in range(grid_len):
+                cell_roi = gray[edges[j]:edges[j + 1], edges[i]:edges[i + 1]]
+                thresh[j * B + 1:j * B + 1 + lens[j], i * B + 1:i * B + 1 + lens[i]] = cv2.threshold(
+                    cell_roi, 0, 255, cv2.THRESH_BINARY_INV | cv2.THRESH_OTSU)[1]
+        cv2.floodFill(thresh, None, (0, 0), 0, flags=8)
+
+        # Largest component of every cell, from its pixels only (they are few once the borders are cleared)
+        count, labels = cv2.connectedComponentsWithAlgorithm(thresh, 8, cv2.CV_32S, cv2.CCL_GRANA)
+        pixels = np.flatnonzero(thresh)
+        pixel_labels = labels.ravel()[pixels]
+        rows, cols = np.divmod(pixels, thresh.shape[1])
+        cell_of = np.zeros(count, dtype=np.int64)
+        cell_of[pixel_labels] = (rows // B) * grid_len + cols // B
+        area = np.bincount(pixel_labels, minlength=count)
+        best = np.zeros(grid_len * grid_len, dtype=np.int64)
+        np.maximum.at(best, cell_of[1:], area[1:] * count + np.arange(1, count))
+        largest = np.zeros(count, dtype=bool)
+        largest[best[best > 0] % count] = True
+        digit_pixels = pixels[largest[pixel_labels]]
+
+        # The filled external contour of the largest component: the component plus its holes
+        mask = np.ones(thresh.shape, dtype=np.uint8)
+        mask.ravel()[digit_pixels] = 0
+        cv2.floodFill(mask, None, (0, 0), 0, flags=4)
+        mask.ravel()[digit_pixels] = 1
+        filled = np.count_nonzero(mask.reshape(grid_len, B, grid_len, B), axis=(1, 3)) / (lens[:, None] * lens[None, :])
+
+        blurred = cv2.medianBlur(thresh, 3)
+        digits = []
+        for j in range(grid_len):
+            for i in range(grid_len):
+                if filled[j, i] < 0.02:  # Empty cell
+                    digits.append(None)
+                else:
+                    cell = (slice(j * B + 1, j * B + 1 + lens[j]), slice(i * B + 1, i * B + 1 + lens[i]))
+                    digits.append(blurred[cell] * mask[cell])
+        return digits
+
     def get_digit(self, cell_roi, show=False):
+        # scikit-image is slow to import, load it with the first cell
+        from skimage.segmentation import clear_border
         cell_roi = cv2.cvtColor(cell_roi, cv2.COLOR_BGR2GRAY)
         if show:
             cv2.imshow("DEBUG", cell_roi)
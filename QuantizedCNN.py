@@ -0,0 +1,66 @@
+# Class for running the int8 post-training quantized digit CNN (TensorFlow Lite)
+import numpy as np
+
+
+def lite_interpreter():
+    # The standalone LiteRT / tflite runtimes are much lighter than TensorFlow, use them when installed
+    try:
+        from ai_edge_litert.interpreter import Interpreter
+    except ImportError:
+        try:
+            from tflite_runtime.interpreter import Interpreter
+        except ImportError:
+            import tensorflow as tf
+            Interpreter = tf.lite.Interpreter
+    return Interpreter
+
+
+class QuantizedCNN:
+    def __init__(self, path, num_threads=None):
+        self.path = path
+        self.interpreter = lite_interpreter()(model_path=path, num_threads=num_threads)
+        self.input = self.interpreter.get_input_details()[0]
+        self.output = self.interpreter.get_output_details()[0]
+        self.input_scale, self.input_zero = self.input['quantization']
+        self.output_scale, self.output_zero = self.output['quantization']
+        self.batch_len = None
+
+    @staticmethod
+    def convert(keras_model, calibration_images, path):
+        # Full integer quantization: weights and activations int8, the activation ranges are
+        # calibrated by running calibration_images (n, 28, 28, 1) float32 in [0, 1] through the model
+        import tensorflow as tf
+
+        def representative_dataset():
+            for k in range(len(calibration_images)):
+                yield [calibration_images[k:k + 1]]
+
+        converter = tf.lite.TFLiteConverter.from_keras_model(keras_model)
+        converter.optimizations = [tf.lite.Optimize.DEFAULT]
+        converter.representative_dataset = representative_dataset
+        converter.target_spec.supported_ops = [tf.lite.OpsSet.TFLITE_BUILTINS_INT8]
+        converter.inference_input_type = tf.int8
+        converter.inference_output_type = tf.int8
+        model = converter.convert()
+        with open(path, 'wb') as f:
+            f.write(model)
+        return len(model)
+
+    def resize(self, batch_len):
+        # Tensors are reallocated only when the batch size changes (e.g. a new grid size)
+        if batch_len != self.batch_len:
+            self.interpreter.resize_tensor_input(self.input['index'], [batch_len, 28, 28, 1])
+            self.interpreter.allocate_tensors()
+            self.batch_len = batch_len
+
+    def predict(self, batch, verbose=0, batch_size=None):
+        x = np.asarray(batch, dtype=np.float32)
+        self.resize(len(x))
+        q = np.clip(np.round(x / self.input_scale + self.input_zero), -128, 127).astype(np.int8)
+        self.interpreter.set_tensor(self.input['index'], q)
+        self.interpreter.invoke()
+        out = self.interpreter.get_tensor(self.output['index'])
+        return (out.astype(np.float32) - self.output_zero) * self.output_scale
+
+    def __call__(self, batch):
+        return self.predict(batch)
@@ -0,0 +1,122 @@
+# Class for the real-time capture / detection / OCR pipeline, one thread per stage
+import threading
+import queue
+import logging
+from timeit import default_timer as timer
+
+logger = logging.getLogger(__name__)
+
+
+def put_latest(q, item):
+    # Bounded queues keep the newest items: when full, the oldest one is dropped. Returns the number dropped
+    dropped = 0
+    while True:
+        try:
+            q.put_nowait(item)
+            return dropped
+        except queue.Full:
+            try:
+                q.get_nowait()
+                dropped += 1
+            except queue.Empty:
+                pass
+
+
+class RealTimePipeline:
+    def __init__(self, detector, classifier, capture, sample_every=10, queue_size=1):
+        # capture: anything with read() -> (ok, frame), e.g. cv2.VideoCapture.
+        # Every sample_every-th detected board goes to the classifier's save_puzzle, like the sequential loop
+        self.detector = detector
+        self.classifier = classifier
+        self.capture = capture
+        self.sample_every = sample_every
+        self.frames = queue.Queue(maxsize=queue_size)
+        self.boards = queue.Queue(maxsize=queue_size)
+        self.results = queue.Queue(maxsize=queue_size)
+        self.stopping = threading.Event()
+        self.detection_done = threading.Event()
+        self.threads = []
+        self.stats = {'captured': 0, 'detected': 0, 'failed': 0, 'saved': 0, 'dropped_frames': 0,
+                      'dropped_boards': 0, 'seconds': 0.0}
+        self.start_time = None
+
+        self.detector.display = False
+
+    def start(self):
+        self.start_time = timer()
+        for target in (self.capture_loop, self.detect_loop, self.ocr_loop):
+            thread = threading.Thread(target=target, name=target.__name__, daemon=True)
+            thread.start()
+            self.threads.append(thread)
+        return self
+
+    def stop(self):
+        # Capture and detection stop at once, the OCR stage first saves the boards already queued
+        self.stopping.set()
+        for thread in self.threads:
+            thread.join()
+        self.threads = []
+        self.stats['seconds'] = timer() - self.start_time
+
+    def running(self):
+        return any(thread.is_alive() for thread in self.threads)
+
+    def latest(self, timeout=0.02):
+        # Images of the last detection by window name, for the main thread to show; None if there is nothing new
+        try:
+            return self.results.get(timeout=timeout)
+        except queue.Empty:
+            return None
+
+    def fps(self):
+        seconds = (timer() - self.start_time) if self.threads else self.stats['seconds']
+        return self.stats['detected'] / seconds if seconds else 0.0
+
+    # Stages
+
+    def capture_loop(self):
+        while not self.stopping.is_set():
+            ok, frame = self.capture.read()
+            if not ok:
+                break
+            self.stats['captured'] += 1
+            self.stats['dropped_frames'] += put_latest(self.frames, frame)
+        # No more frames: the detection stage exits after the last one
+        while not self.stopping.is_set():
+            try:
+                self.frames.put(None, timeout=0.1)
+                break
+            except queue.Full:
+                pass
+
+    def detect_loop(self):
+        while not self.stopping.is_set():
+            try:
+                frame = self.frames.get(timeout=0.1)
+            except queue.Empty:
+                continue
+            if frame is None:
+                break
+            try:
+                self.detector.detectGameBoard(frame)
+            except Exception:
+                # A frame without a readable board
+                self.stats['failed'] += 1
+                logger.debug('detection failed', exc_info=True)
+                continue
+            self.stats['detected'] += 1
+            put_latest(self.results, dict(self.detector.windows))
+            if self.stats['detected'] % self.sample_every == 0 and self.detector.grid_digit_images is not None:
+                self.stats['dropped_boards'] += put_latest(self.boards, self.detector.grid_digit_images)
+        self.detection_done.set()
+
+    def ocr_loop(self):
+        while True:
+            try:
+                digit_images = self.boards.get(timeout=0.1)
+            except queue.Empty:
+                if self.detection_done.is_set():
+                    break
+                continue
+            self.classifier.save_puzzle(digit_images)
+            self.stats['saved'] += 1
@@ -0,0 +1,150 @@
+# Class for the Skyscrapers engine: every row and column keeps the permutations still allowed by its clues
+# and by the crossing lines, filtered against each other until nothing changes
+from functools import lru_cache
+from itertools import permutations
+import logging
+import os
+import tempfile
+import zipfile
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+# Permutation tables are saved here once built, one file per GRID_LEN
+CACHE_DIR = os.environ.get('SKYSCRAPERS_CACHE', os.path.join(os.path.dirname(os.path.abspath(__file__)), '.cache'))
+# 10! permutations would take 36 MB per table: larger grids keep the generic search
+MAX_TABLE_LEN = 9
+
+
+def visible_counts(perms):
+    # Buildings seen from the start of each permutation: the heights taller than all the previous ones
+    return (perms == np.maximum.accumulate(perms, axis=1)).sum(axis=1)
+
+
+def build_table(n):
+    # perms: (n!, n) heights, grouped by (left, right) clue pair: the pair k = left * (n + 1) + right
+    # owns order[starts[k]:starts[k + 1]]
+    perms = np.array(list(permutations(range(1, n + 1))), dtype=np.uint8)
+    keys = visible_counts(perms) * (n + 1) + visible_counts(perms[:, ::-1])
+    order = np.argsort(keys, kind='stable').astype(np.int32)
+    starts = np.searchsorted(keys[order], np.arange((n + 1) * (n + 1) + 1)).astype(np.int32)
+    return perms, order, starts
+
+
+@lru_cache(maxsize=None)
+def load_table(n):
+    path = os.path.join(CACHE_DIR, 'skyscrapers_%d.npz' % n)
+    if os.path.isfile(path):
+        try:
+            # Opened here so that the file is closed even when np.load fails on it
+            with open(path, 'rb') as f, np.load(f) as data:
+                return data['perms'], data['order'], data['starts']
+        except (OSError, EOFError, zipfile.BadZipFile, KeyError, ValueError) as e:
+            # Truncated by a killed run or unreadable: built again and written over
+            logger.warning('rebuilding the broken permutation table %s: %s', path, e)
+    perms, order, starts = build_table(n)
+    save_table(path, perms, order, starts)
+    return perms, order, starts
+
+
+def save_table(path, perms, order, starts):
+    # Written to a temporary file first and renamed onto path, so that the processes reading the table
+    # while another one builds it see either no file or the whole file
+    tmp = None
+    try:
+        os.makedirs(CACHE_DIR, exist_ok=True)
+        fd, tmp = tempfile.mkstemp(suffix='.npz', dir=CACHE_DIR)
+        with os.fdopen(fd, 'wb') as f:
+            np.savez_compressed(f, perms=perms, order=order, starts=starts)
+        os.replace(tmp, path)
+    except OSError as e:
+        logger.warning('could not cache the permutation table: %s', e)
+        if tmp is not None and os.path.exists(tmp):
+            os.remove(tmp)
+
+
+class Skyscrapers:
+    def __init__(self, grid_len, observers):
+        # observers: 'left', 'right', 'top', 'bottom' clue lists as in Solver, 0 for a missing clue.
+        # Lines 0..n-1 are the rows, n..2n-1 the columns
+        self.n = grid_len
+        perms, self.order, self.starts = load_table(grid_len)
+        # Bit h-1 stands for height h, like the solver masks
+        self.bits = (np.uint16(1) << (perms.astype(np.uint16) - 1))
+        self.candidates = [self.clue_candidates(observers['left'][i], observers['right'][i]) for i in range(grid_len)]
+        self.candidates += [self.clue_candidates(observers['top'][j], observers['bottom'][j])
+                            for j in range(grid_len)]
+        self.domains = np.full((grid_len, grid_len), (1 << grid_len) - 1, dtype=np.uint16)
+
+        self.nodes = 0
+        self.backtracks = 0
+        self.revisions = 0
+
+    def clue_candidates(self, first, last):
+        n = self.n
+        firsts = [first] if first else range(1, n + 1)
+        lasts = [last] if last else range(1, n + 1)
+        if not first and not last:
+            return np.arange(len(self.bits), dtype=np.int32)
+        groups = [self.order[self.starts[f * (n + 1) + s]:self.starts[f * (n + 1) + s + 1]] for f in firsts for s in lasts]
+        return np.concatenate(groups)
+
+    def line(self, k):
+        # The domains of line k, as a view
+        return self.domains[k] if k < self.n else self.domains[:, k - self.n]
+
+    def propagate(self, queue):
+        # Drops the candidates of each queued line that use a removed height, then narrows the line's cells to
+        # the heights of the candidates left; the crossing lines of the narrowed cells are queued in turn
+        queued = set(queue)
+        while queue:
+            k = queue.pop()
+            queued.discard(k)
+            self.revisions += 1
+            masks = self.line(k)
+            rows = self.bits[self.candidates[k]]
+            keep = np.all(rows & masks, axis=1)
+            if not keep.all():
+                self.candidates[k] = self.candidates[k][keep]
+                rows = rows[keep]
+            if len(rows) == 0:
+                return False
+            narrowed = masks & np.bitwise_or.reduce(rows, axis=0)
+            changed = np.flatnonzero(narrowed != masks)
+            if len(changed):
+                masks[:] = narrowed
+                for p in changed:
+                    crossing = p + self.n if k < self.n else p
+                    if crossing not in queued:
+                        queued.add(crossing)
+                        queue.append(crossing)
+        return True
+
+    def search(self):
+        self.nodes += 1
+        sizes = [len(c) for c in self.candidates]
+        open_lines = [k for k in range(2 * self.n) if sizes[k] > 1]
+        if not open_lines:
+            return True
+        # The line with the fewest permutations left, each tried in turn
+        k = min(open_lines, key=sizes.__getitem__)
+        for candidate in self.candidates[k]:
+            candidates = list(self.candidates)
+            domains = self.domains.copy()
+            self.candidates[k] = np.array([candidate], dtype=np.int32)
+            if self.propagate([k]) and self.search():
+                return True
+            self.candidates = candidates
+            self.domains = domains
+            self.backtracks += 1
+        return False
+
+    def solve(self, givens=None):
+        # givens: (i, j) -> height. Returns the (n, n) heights, None if there is no solution
+        for (i, j), height in (givens or {}).items():
+            self.domains[i, j] &= 1 << (height - 1)
+        if not self.propagate(list(range(2 * self.n))) or not self.search():
+            return None
+        # Single bit domains: the height is the bit length
+        return np.log2(self.domains).astype(int) + 1
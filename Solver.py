@@ -1,8 +1,75 @@
 import numpy as np
-import cv2
 import operator
+import logging
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor, as_completed
+import time
+from DomainBuckets import DomainBuckets
+from Propagator import Propagator
+from DancingLinks import DancingLinks
+from StarBattle import StarBattle
+import Skyscrapers
+from Board import Board, EMPTY
+from Geometry import cell_key
+from SolverStats import SolverStats
 # Class for CSP solving
 
+logger = logging.getLogger(__name__)
+
+# Parallel search: workers run CANCEL_CHECK_NODES nodes at a time, looking at the stop event and the shared
+# budget in between
+CANCEL_CHECK_NODES = 1000
+stop_event = None
+node_budget = None  # nodes left to all the workers, -1 without a node budget
+worker_deadline = None
+
+
+def init_worker(stop, budget, deadline):
+    global stop_event, node_budget, worker_deadline
+    stop_event = stop
+    node_budget = budget
+    worker_deadline = deadline
+
+
+def reserve_nodes():
+    with node_budget.get_lock():
+        if node_budget.value < 0:
+            return CANCEL_CHECK_NODES
+        nodes = min(CANCEL_CHECK_NODES, node_budget.value)
+        node_budget.value -= nodes
+        return nodes
+
+
+def release_nodes(nodes):
+    if nodes > 0:
+        with node_budget.get_lock():
+            if node_budget.value >= 0:
+                node_budget.value += nodes
+
+
+def solve_branch(info, game_data, branch):
+    # Runs in the worker processes: solves the puzzle below the branch values, until a solution, a failure, the
+    # stop event set by another worker's solution or the end of the budget. A stopped search gives back the
+    # branches it did not explore
+    solver = Solver(dict(info, workers=1, max_nodes=0, time_limit=None))
+    solver.branch = branch
+    solver.log_level = logging.DEBUG
+    # Only the setup: the search pauses before its first node
+    status = solver.solveGame(game_data)
+    while status == 'PAUSED' and not stop_event.is_set():
+        time_limit = None
+        if worker_deadline is not None:
+            time_limit = worker_deadline - time.time()
+            if time_limit <= 0:
+                break
+        nodes = reserve_nodes()
+        if nodes == 0:
+            break
+        start = solver.iterations
+        status = solver.resume(max_nodes=nodes, time_limit=time_limit)
+        release_nodes(nodes - (solver.iterations - start))
+    rest = solver.remaining_branches() if status == 'PAUSED' else []
+    return status, solver.result if status == 'SOLVED' else None, solver.iterations, solver.stats.backtracks, rest
 
 
 class Solver:
@@ -10,174 +77,416 @@ class Solver:
         self.info = game_info
         self.GRID_LEN = self.info['GRID_LEN']
         self.solving = False
+        self.board = Board(self.info['game'], self.GRID_LEN, self.info.get('SQUARE_LEN'))
 
         self.result = None
-
+        self.stats = SolverStats()
+        self.masks = None
+        self.star_counts = None
+        self.propagator = None
+        self.buckets = None
+        self.soft = {}
+        self.soft_order = []
+        # Values fixed before the search, in order: the subproblem of a parallel search
+        self.branch = {}
+        # Branches left by a paused parallel search
+        self.pending = None
+        # Level of the run statistics: the workers of a parallel search report every slice at DEBUG
+        self.log_level = logging.INFO
+
+        # Checks of the units touched by a single cell, used by is_consistent after each assignment
+        self.delta_checks = {
+            self.alldiff_in_cols_and_rows: self.alldiff_in_cols_and_rows_at,
+            self.all_diff_in_areas: self.all_diff_in_areas_at,
+            self.values_are_ordered: self.values_are_ordered_at,
+            self.only_X_in_colums_and_rows: self.only_X_in_colums_and_rows_at,
+            self.only_x_in_areas: self.only_x_in_areas_at,
+            self.never_adjacents: self.never_adjacents_at,
+            self.max_X_zeros: self.max_X_zeros_at
+        }
 
     def solveGame(self, game_data):
         self.data = game_data
         self.iterations = 0
+        self.stats = SolverStats()
+        self.masks = None
+        self.star_counts = None
+        self.propagator = None
+        self.buckets = None
+        self.soft = {}
+        self.soft_order = []
+        self.pending = None
         if self.info['game'] == 'sudoku':
-            return self.solveSudoku()
+            status = self.solveSudoku()
         elif self.info['game'] == 'stars':
-            return self.solveStars()
+            status = self.solveStars()
         elif self.info['game'] == 'skyscrapers':
-            return self.solveSkyscrapers()
+            status = self.solveSkyscrapers()
         else:
             return None
 
+        return self.finish(status)
+
+    def finish(self, status):
+        self.stats.nodes = self.iterations
+        if self.propagator is not None:
+            self.stats.propagations = self.propagator.revisions
+        logger.log(self.log_level, '%s %s: %s', self.info['game'], status, self.stats)
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug('result %s', self.result)
+            if self.info['game'] == 'sudoku' and isinstance(self.result, dict):
+                logger.debug('\n%s', self.format_sudoku_result(self.result))
+        return status
+
+    def resume(self, max_nodes=None, time_limit=None):
+        # Continues a search paused by its node or time budget, with a new budget (info's one by default)
+        if self.result != "PAUSED":
+            return None
+        self.solving = True
+        with self.stats.phase('search'):
+            if self.pending is not None:
+                last_node, deadline = self.budget(max_nodes, time_limit)
+                self.result = self.run_branches(self.pending, self.info['workers'], last_node, deadline)
+            else:
+                self.result = self.run_search(max_nodes, time_limit)
+        self.solving = False
+        return self.finish(self.search_status())
+
+    def search_status(self):
+        if self.result == "PAUSED":
+            return 'PAUSED'
+        if self.result != "FAILURE":
+            return 'SOLVED'
+        return 'FAILURE'
+
     def solveSudoku(self):
         self.SQUARE_LEN = self.info['SQUARE_LEN']
 
-        cells = []
-        [[cells.append(str(i) + str(j)) for j in range(self.GRID_LEN)] for i in range(self.GRID_LEN)]
+        with self.stats.phase('inference'):
+            cells = list(self.board.keys)
 
-        domains = {}
-        for var in cells:
-            # var = '00'
-            domains[var] = [str(k + 1) for k in range(self.GRID_LEN)]
+            domains = {}
+            for var in cells:
+                # var = '00'
+                domains[var] = [str(k + 1) for k in range(self.GRID_LEN)]
+            # Ambiguous OCR reads are not givens: their domain is the candidate digits
+            domains.update(self.soft_domains())
 
-        self.CSP = {
-            "VARIABLES": cells,
-            "DOMAINS": domains,
-            "CONSTRAINTS": [self.alldiff_in_cols_and_rows, self.all_diff_in_areas]
-        }
+            self.CSP = {
+                "VARIABLES": cells,
+                "DOMAINS": domains,
+                "CONSTRAINTS": [self.alldiff_in_cols_and_rows, self.all_diff_in_areas]
+            }
 
-        #initial_assignment = self.init_assignment(self.CSP)
-        initial_assignment = self.easy_inference(self.CSP)
-        print('initial_assignment ', initial_assignment)
-        #self.CSP['DOMAINS'] = self.update_domains(initial_assignment, domains)
+            #initial_assignment = self.init_assignment(self.CSP)
+            initial_assignment = self.easy_inference(self.CSP)
+            #self.CSP['DOMAINS'] = self.update_domains(initial_assignment, domains)
+        logger.debug('initial_assignment %s', initial_assignment)
 
         # Check initial assesment
         if self.alldiff_in_cols_and_rows(initial_assignment) or self.all_diff_in_areas(initial_assignment):
-            self.print_sudoku_result(initial_assignment)
+            if logger.isEnabledFor(logging.DEBUG):
+                logger.debug('\n%s', self.format_sudoku_result(initial_assignment))
             return 'WRONG_INITIAL_ASSIGNMENT'
 
+        self.board.load(initial_assignment)
         self.solving = True
-        self.result = self.recursive_backtracking(initial_assignment, self.CSP)
+        if self.info.get('engine', 'backtracking') == 'dlx':
+            self.check_engine_options('dlx')
+            with self.stats.phase('search'):
+                self.result = self.exact_cover(initial_assignment)
+        else:
+            self.result = self.backtracking_search(initial_assignment)
         self.solving = False
-
-        print('self.iterations ', self.iterations)
-        print(self.result)
-        if self.result != "FAILURE":
-            self.print_sudoku_result(self.result)
-            return 'SOLVED'
-
-        return 'FAILURE'
+        return self.search_status()
 
     def solveSkyscrapers(self):
-        
-        observers = {}
- 
-        self.observers = observers
-        print("variables_found:", self.data['variables_found'])
-
-
-        try:
-            #observers["left"] = [int(self.data['variables_found'][str(k)+'0']) for k in range(1, self.GRID_LEN+1)]
-            observers["left"] = [int(self.data['variables_found'].get(str(k)+'0', 0)) for k in range(1, self.GRID_LEN+1)]
-        except KeyError as e:
-            print(f"KeyError for left: {e}")
-        try:
-            #observers["right"] = [int(self.data['variables_found'][str(k)+str(self.GRID_LEN+1)]) for k in range(1, self.GRID_LEN+1)]
-            observers["right"] = [int(self.data['variables_found'].get(str(k)+str(self.GRID_LEN+1), 0)) for k in range(1, self.GRID_LEN+1)]
-        except KeyError as e:
-            print(f"KeyError for right: {e}")
-        try:
-            #observers["top"] = [int(self.data['variables_found']['0'+str(k)]) for k in range(1, self.GRID_LEN+1)]
-            observers["top"] = [int(self.data['variables_found'].get('0'+str(k), 0)) for k in range(1, self.GRID_LEN+1)]
-        except KeyError as e:
-            print(f"KeyError for top: {e}")
-        try:
-            #observers["bottom"] = [int(self.data['variables_found'][str(self.GRID_LEN+1) + str(k)]) for k in range(1, self.GRID_LEN+1)]
-            observers["bottom"] = [int(self.data['variables_found'].get(str(self.GRID_LEN+1) + str(k), 0)) for k in range(1, self.GRID_LEN+1)]
-        except KeyError as e:
-            print(f"KeyError for bottom: {e}")
-
-        print("Observers: ", observers)
-
-        cells = []
-        [[cells.append(str(i) + str(j)) for j in range(self.GRID_LEN)] for i in range(self.GRID_LEN)]
-
-        domains = {}
-        for var in cells:
-            # var = '00'
-            domains[var] = [str(k + 1) for k in range(self.GRID_LEN)]
-
-        self.CSP = {
-            "VARIABLES": cells,
-            "DOMAINS": domains,
-            "CONSTRAINTS": [self.alldiff_in_cols_and_rows, self.values_are_ordered]
+        # Clues sit on the frame around the grid, keyed on a (GRID_LEN + 2) board; a missing clue is 0
+        frame = self.GRID_LEN + 2
+        found = self.data['variables_found']
+        logger.debug('variables_found: %s', found)
+        lines = range(1, self.GRID_LEN + 1)
+        observers = {
+            'left': [int(found.get(cell_key(k, 0, frame), 0)) for k in lines],
+            'right': [int(found.get(cell_key(k, self.GRID_LEN + 1, frame), 0)) for k in lines],
+            'top': [int(found.get(cell_key(0, k, frame), 0)) for k in lines],
+            'bottom': [int(found.get(cell_key(self.GRID_LEN + 1, k, frame), 0)) for k in lines]
         }
+        self.observers = observers
+        logger.debug('Observers: %s', observers)
 
-        # initial_assignment = self.init_assignment(self.CSP)
-        initial_assignment = self.easy_inference(self.CSP)
-        print('initial_assignment ', initial_assignment)
-        self.CSP['DOMAINS'] = self.update_domains(initial_assignment, domains)
+        with self.stats.phase('inference'):
+            cells = list(self.board.keys)
+
+            domains = {}
+            for var in cells:
+                # var = '00'
+                domains[var] = [str(k + 1) for k in range(self.GRID_LEN)]
+
+            self.CSP = {
+                "VARIABLES": cells,
+                "DOMAINS": domains,
+                "CONSTRAINTS": [self.alldiff_in_cols_and_rows, self.values_are_ordered]
+            }
+
+            # initial_assignment = self.init_assignment(self.CSP)
+            initial_assignment = self.easy_inference(self.CSP)
+            self.CSP['DOMAINS'] = self.update_domains(initial_assignment, domains)
+        logger.debug('initial_assignment %s', initial_assignment)
 
         # Check initial assesment
         if self.alldiff_in_cols_and_rows(initial_assignment) or self.values_are_ordered(initial_assignment):
             return 'WRONG_INITIAL_ASSIGNMENT'
 
+        self.board.load(initial_assignment)
         self.solving = True
-        self.result = self.recursive_backtracking(initial_assignment, self.CSP)
+        if self.info.get('engine', 'tables') == 'tables' and self.GRID_LEN <= Skyscrapers.MAX_TABLE_LEN:
+            self.check_engine_options('tables')
+            with self.stats.phase('search'):
+                self.result = self.skyscrapers_tables(initial_assignment)
+        else:
+            self.result = self.backtracking_search(initial_assignment)
         self.solving = False
-
-        print(self.result)
-        print('self.iterations ', self.iterations)
-        if self.result != "FAILURE":
-            # self.print_stars_result(self.result)
-            return 'SOLVED'
-
-        return 'FAILURE'
+        return self.search_status()
 
     def solveStars(self):
         self.NUM_STARS = self.info['NUM_STARS']
+        self.board.set_areas(self.data['variables_found'])
 
-        cells = []
-        [[cells.append(str(i) + str(j)) for j in range(self.GRID_LEN)] for i in range(self.GRID_LEN)]
+        with self.stats.phase('inference'):
+            cells = list(self.board.keys)
 
-        domains = {}
-        for var in cells:
-            # var = '00'
-            domains[var] = ['0', '1']
+            domains = {}
+            for var in cells:
+                # var = '00'
+                domains[var] = ['0', '1']
 
-        self.CSP = {
-            "VARIABLES": cells,
-            "DOMAINS": domains,
-            "CONSTRAINTS": [self.only_X_in_colums_and_rows, self.only_x_in_areas, self.never_adjacents, self.max_X_zeros]
-        }
+            self.CSP = {
+                "VARIABLES": cells,
+                "DOMAINS": domains,
+                "CONSTRAINTS": [self.only_X_in_colums_and_rows, self.only_x_in_areas, self.never_adjacents, self.max_X_zeros]
+            }
 
-        # initial_assignment = self.init_assignment(self.CSP)
-        initial_assignment = self.easy_inference(self.CSP)
-        print('initial_assignment ', initial_assignment)
-        #self.CSP['DOMAINS'] = self.update_domains(initial_assignment, domains)
+            # initial_assignment = self.init_assignment(self.CSP)
+            initial_assignment = self.easy_inference(self.CSP)
+            #self.CSP['DOMAINS'] = self.update_domains(initial_assignment, domains)
+        logger.debug('initial_assignment %s', initial_assignment)
 
         # Check initial assesment
         if self.only_X_in_colums_and_rows(initial_assignment) or self.only_x_in_areas(initial_assignment) or self.never_adjacents(initial_assignment):
             return 'WRONG_INITIAL_ASSIGNMENT'
 
+        self.board.load(initial_assignment)
         self.solving = True
-        self.result = self.recursive_backtracking(initial_assignment, self.CSP)
+        if self.info.get('engine', 'counting') == 'counting':
+            self.check_engine_options('counting')
+            with self.stats.phase('search'):
+                self.result = self.star_battle(initial_assignment)
+        else:
+            self.result = self.backtracking_search(initial_assignment)
         self.solving = False
+        return self.search_status()
+
+    def check_engine_options(self, engine):
+        # The dedicated engines (dlx, counting, tables) always run to the end, on one core
+        for option in ('max_nodes', 'time_limit'):
+            if self.info.get(option) is not None:
+                logger.warning("engine '%s' ignores info['%s']: only the 'backtracking' engine has a budget",
+                               engine, option)
+        if self.info.get('workers', 1) > 1:
+            logger.warning("engine '%s' runs on one core: only the 'backtracking' engine uses info['workers']",
+                           engine)
+
+    def backtracking_search(self, assignment):
+        with self.stats.phase('propagation'):
+            if self.info['game'] == 'stars':
+                self.init_star_counts()
+                ready = self.init_propagation(assignment)
+            else:
+                ready = self.init_masks(assignment) and self.init_propagation(assignment)
+            if ready:
+                self.init_ordering(assignment)
+        if not ready or not self.apply_branch(assignment, self.branch):
+            # Two givens share a row, column or box, or AC-3 already wiped out a domain
+            return "FAILURE"
+        with self.stats.phase('search'):
+            workers = self.info.get('workers', 1)
+            if workers > 1:
+                return self.parallel_search(assignment, workers)
+            self.init_search(assignment)
+            return self.run_search()
+
+    # Parallel search: the top levels of the tree are split into branches, solved by a process pool
+
+    def parallel_search(self, assignment, workers):
+        last_node, deadline = self.budget()
+        branches = self.split(assignment, workers * self.info.get('branches_per_worker', 4), last_node, deadline)
+        if not branches:
+            return "FAILURE"
+        return self.run_branches(branches, workers, last_node, deadline)
+
+    def run_branches(self, branches, workers, last_node, deadline):
+        # The pool hands the next branch to the first idle worker; once a worker finds a solution, the branches
+        # not started are cancelled and the running ones stop at their next check. The workers share the
+        # node budget left and the deadline: when they run out, the branches still unexplored are kept
+        # for resume and the search is "PAUSED"
+        nodes_left = -1 if last_node is None else max(0, last_node - self.iterations)
+        stop = multiprocessing.Event()
+        budget = multiprocessing.Value('q', nodes_left)
+        result = "FAILURE"
+        pending = []
+        with ProcessPoolExecutor(max_workers=workers, initializer=init_worker,
+                                 initargs=(stop, budget, deadline)) as executor:
+            futures = [executor.submit(solve_branch, self.info, self.data, branch) for branch in branches]
+            for future in as_completed(futures):
+                if future.cancelled():
+                    continue
+                status, solution, nodes, backtracks, rest = future.result()
+                self.iterations += nodes
+                self.stats.backtracks += backtracks
+                if status == 'SOLVED' and result == "FAILURE":
+                    result = solution
+                    stop.set()
+                    for f in futures:
+                        f.cancel()
+                elif status == 'PAUSED':
+                    pending += rest
+        self.pending = None
+        if result == "FAILURE" and pending:
+            self.pending = pending
+            return "PAUSED"
+        return result
+
+    def split(self, assignment, size, last_node=None, deadline=None):
+        # Breadth first over the top levels of the search tree until there are size branches, each one the
+        # values chosen from the root in order, or until the budget runs out. Values that fail at once are left out
+        csp = self.CSP
+        branches = [{}]
+        while len(branches) < size:
+            children = []
+            for branch in branches:
+                if (last_node is not None and self.iterations >= last_node) or \
+                        (deadline is not None and time.time() >= deadline):
+                    children.append(branch)
+                    continue
+                self.apply_branch(assignment, branch)
+                if self.is_complete(assignment):
+                    children.append(branch)
+                else:
+                    var = self.select_unassigned_variable(csp["VARIABLES"], assignment)
+                    for value in self.neighbors_heuristic(assignment, csp["DOMAINS"], var):
+                        if self.apply_branch(assignment, {var: value}):
+                            children.append(dict(branch, **{var: value}))
+                            self.undo_branch(assignment, [var])
+                self.undo_branch(assignment, list(branch))
+            if children == branches:
+                # Only complete assignments left, or no budget
+                break
+            branches = children
+        return branches
+
+    def apply_branch(self, assignment, branch):
+        # Assigns the branch values in order; on a conflict the ones already assigned are undone
+        constraints = self.search_constraints(self.CSP["CONSTRAINTS"])
+        done = []
+        for var, value in branch.items():
+            idx = self.board.index[var]
+            assignment[var] = value
+            if self.assign_value(idx, value):
+                if self.is_consistent(assignment, constraints, var):
+                    done.append(var)
+                    continue
+                self.unassign_value(idx, value)
+            assignment[var] = None
+            self.undo_branch(assignment, done)
+            return False
+        return True
 
-        print(self.result)
-        print('self.iterations ',self.iterations)
-        if self.result != "FAILURE":
-            # self.print_stars_result(self.result)
-            return 'SOLVED'
+    def undo_branch(self, assignment, variables):
+        for var in reversed(variables):
+            self.unassign_value(self.board.index[var], assignment[var])
+            assignment[var] = None
 
-        return 'FAILURE'
+    # Exact cover engine for sudoku: one row per (cell, value), one column per cell, row-value,
+    # column-value and box-value pair
+
+    def exact_cover(self, assignment):
+        n = self.GRID_LEN
+        cells = n * n
+        board = self.board
+        dlx = DancingLinks(4 * cells)
+        for idx, var in enumerate(board.keys):
+            if assignment[var] is not None:
+                values = [int(assignment[var]) - 1]
+            elif var in self.soft:
+                values = [int(d) - 1 for d in self.soft[var]]
+            else:
+                values = range(n)
+            for v in values:
+                if 0 <= v < n:
+                    dlx.add_row((idx, v), (idx, cells + board.row_of[idx] * n + v,
+                                           2 * cells + board.col_of[idx] * n + v, 3 * cells + board.box_of[idx] * n + v))
+        rows = dlx.solve()
+        self.iterations = dlx.iterations
+        if rows is None:
+            self.stats.backtracks = dlx.iterations
+            return "FAILURE"
+        self.stats.backtracks = dlx.iterations - len(rows)
+        result = dict(assignment)
+        for idx, v in rows:
+            result[board.keys[idx]] = str(v + 1)
+        return result
+
+    # Star Battle engine: counters per row, column and area instead of rescanning the board per node
+
+    def star_battle(self, assignment):
+        engine = StarBattle(self.board, self.NUM_STARS)
+        givens = {idx: int(assignment[var]) for idx, var in enumerate(self.board.keys) if assignment[var] is not None}
+        values = engine.solve(givens)
+        self.iterations = engine.nodes
+        self.stats.backtracks = engine.backtracks
+        self.stats.propagations = engine.revisions
+        if values is None:
+            return "FAILURE"
+        return {var: str(values[idx]) for idx, var in enumerate(self.board.keys)}
+
+    # Skyscrapers engine: each line keeps the permutations allowed by its clues, precomputed per GRID_LEN
+
+    def skyscrapers_tables(self, assignment):
+        engine = Skyscrapers.Skyscrapers(self.GRID_LEN, self.observers)
+        givens = {(self.board.row_of[idx], self.board.col_of[idx]): int(assignment[var])
+                  for idx, var in enumerate(self.board.keys) if assignment[var] is not None}
+        heights = engine.solve(givens)
+        self.iterations = engine.nodes
+        self.stats.backtracks = engine.backtracks
+        self.stats.propagations = engine.revisions
+        if heights is None:
+            return "FAILURE"
+        return {var: str(heights[self.board.row_of[idx], self.board.col_of[idx]])
+                for idx, var in enumerate(self.board.keys)}
 
     def is_complete(self, assignment):
         return None not in (assignment.values())
 
     def select_unassigned_variable(self, variables, assignment):
         self.iterations += 1
+        # Ambiguous OCR cells go first, the most confident ones before the others
+        for var in self.soft_order:
+            if assignment[var] is None:
+                return var
+        if self.buckets is not None:
+            return self.board.keys[self.buckets.select()]
         nones = [var for var in variables if assignment[var] is None]
         return nones[0]
 
-    def is_consistent(self, assignment, constraints):
+    def is_consistent(self, assignment, constraints, var=None):
+        # With var, the rest of the assignment is known to be consistent: only its units are checked
+        if var is not None:
+            idx = self.board.index[var]
+            for constraint_violated in constraints:
+                if self.delta_checks[constraint_violated](assignment, idx):
+                    return False
+            return True
         for constraint_violated in constraints:
             if constraint_violated(assignment):
                 return False
@@ -193,28 +502,266 @@ class Solver:
                 assignment[var] = already_found[var]
         return assignment
 
-    def recursive_backtracking(self, assignment, csp):
-        if self.is_complete(assignment):
-            if not self.there_are_enough_values(assignment):
-                return "FAILURE"
-            return assignment
-        var = self.select_unassigned_variable(csp["VARIABLES"], assignment)
+    # Depth first search without recursion: level k of the stack holds the k-th chosen variable, its ordered
+    # values and the position of the next one to try. The value in use is the one in the assignment
+
+    def init_search(self, assignment):
+        levels = len(self.CSP["VARIABLES"]) + 1
+        self.assignment = assignment
+        self.stack_vars = [None] * levels
+        self.stack_values = [None] * levels
+        self.stack_next = [0] * levels
+        self.depth = 0
+
+    def budget(self, max_nodes=None, time_limit=None):
+        # The last node and the time.time() deadline of a run; info's budget by default
+        if max_nodes is None:
+            max_nodes = self.info.get('max_nodes')
+        if time_limit is None:
+            time_limit = self.info.get('time_limit')
+        last_node = self.iterations + max_nodes if max_nodes is not None else None
+        deadline = time.time() + time_limit if time_limit is not None else None
+        return last_node, deadline
+
+    def run_search(self, max_nodes=None, time_limit=None):
+        # Returns the solution, "FAILURE", or "PAUSED" once max_nodes nodes were opened or time_limit seconds
+        # went by in this run; the stack is kept so that resume goes on from the same node
+        last_node, deadline = self.budget(max_nodes, time_limit)
+
+        assignment = self.assignment
+        csp = self.CSP
+        constraints = self.search_constraints(csp["CONSTRAINTS"])
+        stack_vars = self.stack_vars
+        stack_values = self.stack_values
+        stack_next = self.stack_next
+        depth = self.depth
+        # True when the next step opens a node below the top level, False when it tries the top level's next value.
+        # A search always pauses before opening a node
+        descend = True
+        while True:
+            if descend:
+                if not self.is_complete(assignment):
+                    if (last_node is not None and self.iterations >= last_node) or \
+                            (deadline is not None and time.time() >= deadline):
+                        self.depth = depth
+                        return "PAUSED"
+                    var = self.select_unassigned_variable(csp["VARIABLES"], assignment)
+                    stack_vars[depth] = var
+                    # domain = lcv_heuristic(assignment, csp["DOMAINS"], var)
+                    stack_values[depth] = self.neighbors_heuristic(assignment, csp["DOMAINS"], var)
+                    stack_next[depth] = 0
+                    depth += 1
+                elif self.there_are_enough_values(assignment):
+                    self.depth = depth
+                    return assignment
+                elif depth == 0:
+                    return "FAILURE"
+                else:
+                    self.undo_level(depth - 1)
+                    self.stats.backtracks += 1
+
+            # Next value of the top level
+            level = depth - 1
+            var = stack_vars[level]
+            idx = self.board.index[var]
+            values = stack_values[level]
+            k = stack_next[level]
+            descend = False
+            while k < len(values):
+                value = values[k]
+                k += 1
+                assignment[var] = value
+                if self.assign_value(idx, value):
+                    if self.is_consistent(assignment, constraints, var):
+                        descend = True
+                        break
+                    self.unassign_value(idx, value)
+                    self.stats.backtracks += 1
+                assignment[var] = None
+            stack_next[level] = k
+            if not descend:
+                # Every value failed: back to the level above, which moves on to its next value
+                stack_values[level] = None
+                depth = level
+                if depth == 0:
+                    self.depth = 0
+                    return "FAILURE"
+                self.undo_level(depth - 1)
+                self.stats.backtracks += 1
+
+    def remaining_branches(self):
+        # The part of the tree a paused search has not explored: the node it paused before, then the values
+        # not tried yet at every level, as branches from the root
+        path = dict(self.branch)
+        branches = []
+        for level in range(self.depth):
+            var = self.stack_vars[level]
+            for value in self.stack_values[level][self.stack_next[level]:]:
+                branches.append(dict(path, **{var: value}))
+            path[var] = self.assignment[var]
+        return [path] + branches[::-1]
+
+    def undo_level(self, level):
+        var = self.stack_vars[level]
+        self.unassign_value(self.board.index[var], self.assignment[var])
+        self.assignment[var] = None
+
+    def assign_value(self, idx, value):
+        if self.masks is not None and not self.assign_mask(idx, value):
+            return False
+        if self.propagator is not None and not self.propagator.assign(idx, value):
+            if self.masks is not None:
+                self.unassign_mask(idx, value)
+            return False
+        self.board.set(idx, value)
+        if self.star_counts is not None:
+            self.count_star(idx, value, 1)
+        if self.buckets is not None:
+            self.buckets.remove(idx)
+            self.update_peers(idx, -1)
+        return True
 
-        domains_copy = {}
-        for v in self.CSP['VARIABLES']:
-            domains_copy[v] = csp["DOMAINS"][v]
-        # domain = lcv_heuristic(assignment, domains_copy, var)
-        domain = self.neighbors_heuristic(assignment, domains_copy, var)
-        for value in domain:
-            assignment[var] = value
+    def unassign_value(self, idx, value):
+        if self.masks is not None:
+            self.unassign_mask(idx, value)
+        if self.propagator is not None:
+            self.propagator.unassign()
+        self.board.values[idx] = EMPTY
+        if self.star_counts is not None:
+            self.count_star(idx, value, -1)
+        if self.buckets is not None:
+            self.buckets.push(idx, self.domain_size(idx))
+            self.update_peers(idx, 1)
+
+    def search_constraints(self, constraints):
+        # Propagation enforces every rule of the game, the bitmasks the rows, columns and boxes
+        if self.propagator is not None:
+            return []
+        if self.masks is None:
+            return constraints
+        return [c for c in constraints if c != self.alldiff_in_cols_and_rows and c != self.all_diff_in_areas]
+
+    # Propagation: every rule becomes a constraint over an explicit scope of cells
+
+    def init_propagation(self, assignment):
+        self.propagator = None
+        mode = self.info.get('propagation', 'mac')
+        if mode == 'none':
+            return True
+        domains = []
+        for var in self.board.keys:
+            domains.append([assignment[var]] if assignment[var] is not None else self.CSP['DOMAINS'][var])
+        if self.info['game'] == 'stars':
+            values = ['0', '1']
+        else:
+            values = [str(k + 1) for k in range(self.GRID_LEN)]
+
+        self.propagator = Propagator(values, domains, mode)
+        for kind, scope, param in self.constraint_scopes():
+            self.propagator.add_constraint(kind, scope, param)
+        self.propagator.on_change = self.domain_changed
+        # AC-3 before search
+        return self.propagator.establish()
+
+    def constraint_scopes(self):
+        rows, cols, areas = self.board.units()
+        scopes = []
+        if self.info['game'] == 'stars':
+            for unit in rows + cols + areas:
+                if len(unit) > 0:
+                    scopes.append(('count', unit, self.NUM_STARS))
+            for idx in range(self.board.size):
+                for d in self.board.neighbours[idx]:
+                    if d > idx:
+                        scopes.append(('apart', (idx, d), None))
+        else:
+            all_values = (1 << self.GRID_LEN) - 1
+            for unit in rows + cols + areas:
+                scopes.append(('alldiff', unit, all_values))
+        if self.info['game'] == 'skyscrapers':
+            for i in range(self.GRID_LEN):
+                scopes.append(('skyline', rows[i], (self.observers['left'][i], self.observers['right'][i])))
+                scopes.append(('skyline', cols[i], (self.observers['top'][i], self.observers['bottom'][i])))
+        return scopes
 
-            if self.is_consistent(assignment, csp["CONSTRAINTS"]):
-                result = self.recursive_backtracking(assignment, csp)
-                if result != "FAILURE":
-                    return result
-                
-            assignment[var] = None
-        return "FAILURE"
+    def domain_changed(self, idx):
+        if self.buckets is not None and idx in self.buckets:
+            self.buckets.update(idx, self.propagator.size(idx))
+
+    # MRV ordering: unassigned cells are kept in buckets by remaining domain size
+
+    def init_ordering(self, assignment):
+        self.buckets = None
+        if self.info.get('ordering', 'mrv') != 'mrv':
+            return
+        self.peers = self.board.peers()
+        if self.info['game'] == 'stars':
+            self.domain_bits = None
+        else:
+            self.domain_bits = [sum([1 << (int(d) - 1) for d in self.CSP['DOMAINS'][var]]) for var in self.board.keys]
+
+        self.buckets = DomainBuckets(max([len(self.CSP['DOMAINS'][var]) for var in self.board.keys] + [2]))
+        for idx in range(self.board.size):
+            if self.board.values[idx] == EMPTY:
+                degree = len([p for p in self.peers[idx] if self.board.values[p] == EMPTY])
+                self.buckets.push(idx, self.domain_size(idx), degree)
+
+    def update_peers(self, idx, delta):
+        sizes = self.buckets.sizes
+        for p in self.peers[idx]:
+            if p in sizes:
+                self.buckets.update(p, self.domain_size(p), delta)
+
+    def domain_size(self, idx):
+        if self.propagator is not None:
+            return self.propagator.size(idx)
+        if self.domain_bits is not None:
+            return bin(self.domain_bits[idx] & ~self.used_mask(idx)).count('1')
+        return len(self.star_values(idx))
+
+    def star_values(self, idx):
+        # '1' needs room in row, column and area and no neighbour star,
+        # '0' needs enough free cells left in row, column and area for the missing stars
+        can_be_star = True
+        can_be_empty = True
+        for unit, k in self.star_units(idx):
+            stars = self.star_counts[unit][k]
+            if stars >= self.NUM_STARS:
+                can_be_star = False
+            if self.star_counts['free_' + unit][k] <= self.NUM_STARS - stars:
+                can_be_empty = False
+        if can_be_star:
+            for d in self.board.neighbours[idx]:
+                if self.board.values[d] == 1:
+                    can_be_star = False
+                    break
+        return [v for v, possible in (('0', can_be_empty), ('1', can_be_star)) if possible]
+
+    def star_units(self, idx):
+        units = [('rows', self.board.row_of[idx]), ('cols', self.board.col_of[idx])]
+        if self.board.area_of[idx] != EMPTY:
+            units.append(('areas', self.board.area_of[idx]))
+        return units
+
+    def init_star_counts(self):
+        # Stars placed and cells still unassigned in every row, column and area
+        self.star_counts = {
+            'rows': [0] * self.GRID_LEN,
+            'cols': [0] * self.GRID_LEN,
+            'areas': [0] * len(self.board.areas),
+            'free_rows': [self.GRID_LEN] * self.GRID_LEN,
+            'free_cols': [self.GRID_LEN] * self.GRID_LEN,
+            'free_areas': [len(area) for area in self.board.areas]
+        }
+        for idx in range(self.board.size):
+            if self.board.values[idx] != EMPTY:
+                self.count_star(idx, str(self.board.values[idx]), 1)
+
+    def count_star(self, idx, value, delta):
+        for unit, k in self.star_units(idx):
+            self.star_counts['free_' + unit][k] -= delta
+            if value == '1':
+                self.star_counts[unit][k] += delta
 
     def easy_inference(self, csp):
         assignment = {}
@@ -223,57 +770,52 @@ class Solver:
             assignment[var] = None
 
         if self.info['game'] == 'stars':
-            for area in self.data['variables_found']:
+            keys = self.board.keys
+            rows = self.board.rows
+            cols = self.board.cols
+            for area in self.board.areas:
                 for k in range(self.GRID_LEN):
-                    if len(area) == len([el for el in area if el[0] == str(k)]):
+                    if len(area) == len([idx for idx in area if self.board.row_of[idx] == k]):
                         # all in row
-                        for r in range(self.GRID_LEN):
-                            if str(k) + str(r) not in area:
-                                assignment[str(k) + str(r)] = '0'
-                                csp['DOMAINS'][str(k) + str(r)] = []
-                    if len(area) == len([el for el in area if el[1] == str(k)]):
+                        for idx in rows[k]:
+                            if idx not in area:
+                                assignment[keys[idx]] = '0'
+                                csp['DOMAINS'][keys[idx]] = []
+                    if len(area) == len([idx for idx in area if self.board.col_of[idx] == k]):
                         # all in col
-                        for r in range(self.GRID_LEN):
-                            if str(r) + str(k) not in area:
-                                assignment[str(r) + str(k)] = '0'
-                                csp['DOMAINS'][str(r) + str(k)] = []
+                        for idx in cols[k]:
+                            if idx not in area:
+                                assignment[keys[idx]] = '0'
+                                csp['DOMAINS'][keys[idx]] = []
                     if self.NUM_STARS == 1:
                         # if all elements in the row are inside the area, set to 0 other area elements
-                        row = [str(k) + str(i) for i in range(self.GRID_LEN)]
-                        if self.GRID_LEN == len([r for r in row if r in area]):
-                            for el in [e for e in area if e not in row]:
-                                assignment[el] = '0'
-                                csp['DOMAINS'][el] = []
+                        if self.GRID_LEN == len([idx for idx in rows[k] if idx in area]):
+                            for idx in [e for e in area if e not in rows[k]]:
+                                assignment[keys[idx]] = '0'
+                                csp['DOMAINS'][keys[idx]] = []
                         # if all elements in the col are inside the area, set to 0 other area elements
-                        col = [str(i) + str(k) for i in range(self.GRID_LEN)]
-                        if self.GRID_LEN == len([c for c in col if c in area]):
-                            for el in [e for e in area if e not in col]:
-                                assignment[el] = '0'
-                                csp['DOMAINS'][el] = []
+                        if self.GRID_LEN == len([idx for idx in cols[k] if idx in area]):
+                            for idx in [e for e in area if e not in cols[k]]:
+                                assignment[keys[idx]] = '0'
+                                csp['DOMAINS'][keys[idx]] = []
 
             # If an area has only one cell empty, fill with 1 and set to 0 corrisponding row/col
             if self.NUM_STARS == 1:
-                for area in self.data['variables_found']:
-                    area_nones = [el for el in area if assignment[el] is None]
+                for area in self.board.areas:
+                    area_nones = [idx for idx in area if assignment[keys[idx]] is None]
                     if len(area_nones) == 1:
-                        row = [area_nones[0][0] + str(k) for k in range(self.GRID_LEN) if
-                               area_nones[0][0] + str(k) is not area_nones[0]]
-                        col = [str(k) + area_nones[0][1] for k in range(self.GRID_LEN) if
-                               str(k) + area_nones[0][1] is not area_nones[0]]
-                        for r in row:
-                            assignment[r] = '0'
-                            csp['DOMAINS'][r] = []
-                        for c in col:
-                            assignment[c] = '0'
-                            csp['DOMAINS'][c] = []
-                        assignment[area_nones[0]] = '1'
-                        csp['DOMAINS'][area_nones[0]] = []
+                        star = area_nones[0]
+                        for idx in rows[self.board.row_of[star]] + cols[self.board.col_of[star]]:
+                            assignment[keys[idx]] = '0'
+                            csp['DOMAINS'][keys[idx]] = []
+                        assignment[keys[star]] = '1'
+                        csp['DOMAINS'][keys[star]] = []
 
             # If an row/col has only one cell empty, fill with 1 and set to 0 corrisponding row/col
             if self.NUM_STARS == 1:
                 for k in range(self.GRID_LEN):
-                    row_nones = [str(k) + str(r) for r in range(self.GRID_LEN) if assignment[str(k) + str(r)] is None]
-                    col_nones = [str(c) + str(k) for c in range(self.GRID_LEN) if assignment[str(c) + str(k)] is None]
+                    row_nones = [keys[idx] for idx in rows[k] if assignment[keys[idx]] is None]
+                    col_nones = [keys[idx] for idx in cols[k] if assignment[keys[idx]] is None]
                     if len(row_nones) == 1:
                         assignment[row_nones[0]] = '1'
                         csp['DOMAINS'][row_nones[0]] = []
@@ -281,15 +823,10 @@ class Solver:
                         assignment[col_nones[0]] = '1'
                         csp['DOMAINS'][col_nones[0]] = []
             # For each 1s put 0 in diagonals also
-            for var in [v for v in csp['VARIABLES'] if assignment[v] == '1']:
-                e_0 = int(var[0])
-                e_1 = int(var[1])
-                diagonals = [str(e_0 - 1) + str(e_1 - 1), str(e_0 - 1) + str(e_1 + 1), str(e_0 + 1) + str(e_1 - 1),
-                             str(e_0 + 1) + str(e_1 + 1)]
-                for d in diagonals:
-                    if d in csp['VARIABLES']:
-                        assignment[d] = '0'
-                        csp['DOMAINS'][d] = []
+            for star in [idx for idx in range(self.board.size) if assignment[keys[idx]] == '1']:
+                for idx in self.board.diagonals[star]:
+                    assignment[keys[idx]] = '0'
+                    csp['DOMAINS'][keys[idx]] = []
 
 
         elif self.info['game'] == 'skyscrapers':
@@ -324,22 +861,38 @@ class Solver:
         elif self.info['game'] == 'sudoku':
             already_found = self.data['variables_found']
             for var in already_found:
-                assignment[var] = already_found[var]
+                if var not in self.soft:
+                    assignment[var] = already_found[var]
         return assignment
 
+    def soft_domains(self):
+        # data['candidates']: cell -> [(digit, probability), ...] for the cells the OCR is unsure of.
+        # Each becomes a domain tried in decreasing probability order
+        self.soft = {}
+        confidence = {}
+        values = [str(k + 1) for k in range(self.GRID_LEN)]
+        for var, candidates in self.data.get('candidates', {}).items():
+            ranked = sorted(candidates, key=lambda candidate: -candidate[1])
+            domain = [str(d) for d, p in ranked if str(d) in values]
+            if var in self.board.index and domain:
+                self.soft[var] = domain
+                confidence[var] = ranked[0][1]
+        self.soft_order = sorted(self.soft, key=lambda var: -confidence[var])
+        if self.soft:
+            logger.debug('soft domains %s', self.soft)
+        return {var: list(domain) for var, domain in self.soft.items()}
+
     def update_domains(self, definitive_asmt, domains_starting):
+        keys = self.board.keys
         domains_copy = {}
         for v in self.CSP['VARIABLES']:
             domains_copy[v] = domains_starting[v]
-        for i in range(self.GRID_LEN):
-            for j in range(self.GRID_LEN):
-                val = definitive_asmt[str(i) + str(j)]
-                if val != None:
-                    for k in range(self.GRID_LEN):
-                        if val in domains_copy[str(i) + str(k)]:
-                            domains_copy[str(i) + str(k)].remove(val)
-                        if val in domains_copy[str(k) + str(j)]:
-                            domains_copy[str(k) + str(j)].remove(val)
+        for idx in range(self.board.size):
+            val = definitive_asmt[keys[idx]]
+            if val != None:
+                for p in self.board.rows[self.board.row_of[idx]] + self.board.cols[self.board.col_of[idx]]:
+                    if val in domains_copy[keys[p]]:
+                        domains_copy[keys[p]].remove(val)
         return domains_copy
 
     # Stars
@@ -350,157 +903,184 @@ class Solver:
                 return True
         return False
 
+    def only_x_in_areas_at(self, asmt, idx):
+        area = self.board.area_of[idx]
+        if area == EMPTY or asmt[self.board.keys[idx]] != "1":
+            return False
+        keys = self.board.keys
+        return len([p for p in self.board.areas[area] if asmt[keys[p]] == "1"]) > self.NUM_STARS
+
     def never_adjacents(self, asmt):
-        for i in range(self.GRID_LEN):
-            for j in range(self.GRID_LEN):
-                if (asmt[str(i) + str(j)] != "1"):
-                    continue
-                for v in range(i - 1, i + 2):
-                    for u in range(j - 1, j + 2):
-                        if v is i and u is j:
-                            continue
-                        if str(v) + str(u) in self.CSP["VARIABLES"]:
-                            if asmt[str(v) + str(u)] == "1":
-                                return True
+        keys = self.board.keys
+        for idx in range(self.board.size):
+            if asmt[keys[idx]] != "1":
+                continue
+            for d in self.board.neighbours[idx]:
+                if asmt[keys[d]] == "1":
+                    return True
+        return False
+
+    def never_adjacents_at(self, asmt, idx):
+        keys = self.board.keys
+        if asmt[keys[idx]] != "1":
+            return False
+        for d in self.board.neighbours[idx]:
+            if asmt[keys[d]] == "1":
+                return True
         return False
 
     def only_X_in_colums_and_rows(self, asmt):
-        for i in range(self.GRID_LEN):
-            col = [str(i) + str(j) for j in range(self.GRID_LEN)]
-            row = [str(j) + str(i) for j in range(self.GRID_LEN)]
-            col_stars = [asmt[variable] for variable in col if asmt[variable] == "1"]
-            row_stars = [asmt[variable] for variable in row if asmt[variable] == "1"]
-            if not len(col_stars) <= self.NUM_STARS:
+        keys = self.board.keys
+        for unit in self.board.lines:
+            unit_stars = [idx for idx in unit if asmt[keys[idx]] == "1"]
+            if not len(unit_stars) <= self.NUM_STARS:
                 return True
-            if not len(row_stars) <= self.NUM_STARS:
+        return False
+
+    def only_X_in_colums_and_rows_at(self, asmt, idx):
+        keys = self.board.keys
+        if asmt[keys[idx]] != "1":
+            return False
+        for unit in (self.board.rows[self.board.row_of[idx]], self.board.cols[self.board.col_of[idx]]):
+            if len([p for p in unit if asmt[keys[p]] == "1"]) > self.NUM_STARS:
                 return True
         return False
 
     def max_X_zeros(self, asmt):
-        for i in range(self.GRID_LEN):
-            col = [str(i) + str(j) for j in range(self.GRID_LEN)]
-            row = [str(j) + str(i) for j in range(self.GRID_LEN)]
-            col_zeros = [variable for variable in col if asmt[variable] == "0"]
-            row_zeros = [variable for variable in row if asmt[variable] == "0"]
-            if len(col_zeros) == self.GRID_LEN:
+        keys = self.board.keys
+        for unit in self.board.lines:
+            unit_zeros = [idx for idx in unit if asmt[keys[idx]] == "0"]
+            if len(unit_zeros) == self.GRID_LEN:
                 return True
-            if len(row_zeros) == self.GRID_LEN:
+        return False
+
+    def max_X_zeros_at(self, asmt, idx):
+        keys = self.board.keys
+        if asmt[keys[idx]] != "0":
+            return False
+        for unit in (self.board.rows[self.board.row_of[idx]], self.board.cols[self.board.col_of[idx]]):
+            if len([p for p in unit if asmt[keys[p]] == "0"]) == self.GRID_LEN:
                 return True
         return False
 
     # Sudoku Heuristics
 
     def there_are_enough_values(self, assignment):
+        keys = self.board.keys
         if self.info['game'] == 'sudoku' or self.info['game'] == 'skyscrapers':
-            asmt_matrix = np.array(list(assignment.values())).reshape(self.GRID_LEN, self.GRID_LEN)
-            for i in range(self.GRID_LEN):
-                col_values = asmt_matrix[:, i]
-                row_values = asmt_matrix[i, :]
-                col_ok = True
-                row_ok = True
-                for k in range(self.GRID_LEN):
-                    col_ok = col_ok and str(k + 1) in col_values
-                    row_ok = row_ok and str(k + 1) in row_values
-
-                if not col_ok or not row_ok:
+            values = set([str(k + 1) for k in range(self.GRID_LEN)])
+            for unit in self.board.lines:
+                if not values <= set([assignment[keys[idx]] for idx in unit]):
                     return False
         elif self.info['game'] == 'stars':
-            for i in range(self.GRID_LEN):
-                col = [str(i) + str(j) for j in range(self.GRID_LEN)]
-                row = [str(j) + str(i) for j in range(self.GRID_LEN)]
-                col_stars = [assignment[variable] for variable in col if assignment[variable] == "1"]
-                row_stars = [assignment[variable] for variable in row if assignment[variable] == "1"]
-                if not len(col_stars) == self.NUM_STARS or not len(row_stars) == self.NUM_STARS:
+            for unit in self.board.lines:
+                unit_stars = [idx for idx in unit if assignment[keys[idx]] == "1"]
+                if not len(unit_stars) == self.NUM_STARS:
                     return False
 
         return True
 
     def neighbors_heuristic(self, assignment, domains, var):
         domain = [d for d in domains[var]]
+        idx = self.board.index[var]
 
-        if self.info['game'] == 'sudoku':
-            asmt_matrix = np.array(list(assignment.values())).reshape(self.GRID_LEN, self.GRID_LEN)
-            row = [v for v in asmt_matrix[int(var[0]), :] if v is not None]
-            col = [v for v in asmt_matrix[:, int(var[1])] if v is not None]
-
-            [domain.remove(r) for r in row if r in domain]
-            [domain.remove(c) for c in col if c in domain]
-
-            squares = []
-            for i in range(self.SQUARE_LEN):
-                for j in range(self.SQUARE_LEN):
-                    square_tmp = []
-                    for k in range(self.SQUARE_LEN):
-                        [square_tmp.append(str(i * self.SQUARE_LEN + k) + str(s + self.SQUARE_LEN * j)) for s in
-                         range(self.SQUARE_LEN)]
-                    squares.append(square_tmp)
-
-            for square in squares:
-                if var in square:
-                    [domain.remove(v) for v in [assignment[vv] for vv in square] if v in domain]
+        if self.propagator is not None:
+            domain = self.propagator.values_of(idx)
+        elif self.info['game'] == 'sudoku' or self.info['game'] == 'skyscrapers':
+            used = self.used_mask(idx)
+            domain = [d for d in domain if not used & (1 << (int(d) - 1))]
         elif self.info['game'] == 'stars':
-            asmt_matrix = np.array(list(assignment.values())).reshape(self.GRID_LEN, self.GRID_LEN)
-            row = [v for v in asmt_matrix[int(var[0]), :] if v is not None]
-            col = [v for v in asmt_matrix[:, int(var[1])] if v is not None]
-
-            if '1' in domain:
-                if '1' in row:
-                    domain.remove('1')
-                elif '1' in col:
-                    domain.remove('1')
-                else:
-                    for square in self.data['variables_found']:
-                        if var in square and '1' in [assignment[vv] for vv in square]:
-                            domain.remove('1')
+            values = self.star_values(idx)
+            domain = [d for d in domain if d in values]
 
-        elif self.info['game'] == 'skyscrapers':
-            domain = [d for d in domains[var]]
+        if var in self.soft:
+            domain = [d for d in self.soft[var] if d in domain]
+        return domain
 
-            asmt_matrix = np.array(list(assignment.values())).reshape(self.GRID_LEN, self.GRID_LEN)
-            row = [v for v in asmt_matrix[int(var[0]), :] if v is not None]
-            col = [v for v in asmt_matrix[:, int(var[1])] if v is not None]
+    # Sudoku and skyscrapers bitmasks: bit k of a mask is set when value k+1 is already used in that row,
+    # column or (sudoku only) box
 
-            [domain.remove(r) for r in row if r in domain]
-            [domain.remove(c) for c in col if c in domain]
+    def init_masks(self, assignment):
+        self.masks = {
+            'rows': [0] * self.GRID_LEN,
+            'cols': [0] * self.GRID_LEN,
+            'boxes': [0] * self.GRID_LEN
+        }
+        for var in assignment:
+            if assignment[var] is not None and not self.assign_mask(self.board.index[var], assignment[var]):
+                return False
+        return True
 
+    def used_mask(self, idx):
+        board = self.board
+        return self.masks['rows'][board.row_of[idx]] | self.masks['cols'][board.col_of[idx]] | self.masks['boxes'][board.box_of[idx]]
+
+    def assign_mask(self, idx, value):
+        bit = 1 << (int(value) - 1)
+        if self.used_mask(idx) & bit:
+            return False
+        self.masks['rows'][self.board.row_of[idx]] |= bit
+        self.masks['cols'][self.board.col_of[idx]] |= bit
+        # Skyscrapers have no boxes: every cell shares the same always-empty box mask
+        if self.info['game'] == 'sudoku':
+            self.masks['boxes'][self.board.box_of[idx]] |= bit
+        return True
 
-        return domain
+    def unassign_mask(self, idx, value):
+        bit = ~(1 << (int(value) - 1))
+        self.masks['rows'][self.board.row_of[idx]] &= bit
+        self.masks['cols'][self.board.col_of[idx]] &= bit
+        self.masks['boxes'][self.board.box_of[idx]] &= bit
 
     def all_diff_in_areas(self, asmt):
-        for i in range(self.SQUARE_LEN):
-            for j in range(self.SQUARE_LEN):
-                square_tmp = []
-                for k in range(self.SQUARE_LEN):
-                    [square_tmp.append(asmt[str(i * self.SQUARE_LEN + k) + str(s + self.SQUARE_LEN * j)]) for s in
-                     range(self.SQUARE_LEN)]
-                if (not None in square_tmp and not len(square_tmp) == len(set(square_tmp))):# or (self.solving and not len(square_tmp) == len(set(square_tmp))):
-                    return True
+        keys = self.board.keys
+        for box in self.board.boxes:
+            square_tmp = [asmt[keys[idx]] for idx in box]
+            if (not None in square_tmp and not len(square_tmp) == len(set(square_tmp))):# or (self.solving and not len(square_tmp) == len(set(square_tmp))):
+                return True
         return False
 
+    def all_diff_in_areas_at(self, asmt, idx):
+        # The new value repeated in the box of idx
+        if self.info['game'] != 'sudoku':
+            return False
+        return self.repeated_in(asmt, idx, self.board.boxes[self.board.box_of[idx]])
+
     def alldiff_in_cols_and_rows(self, asmt):
-        asmt_matrix = np.array(list(asmt.values())).reshape(self.GRID_LEN, self.GRID_LEN)
-        for i in range(self.GRID_LEN):
-            row = asmt_matrix[:, i]
-            col = asmt_matrix[i, :]
-            if (not None in col and not len(col) == len(set(col))) or (
-                    not None in row and not len(row) == len(set(row))):# or (self.solving and (not len(col) == len(set(col)) or not len(row) == len(set(row)))):
+        keys = self.board.keys
+        for unit in self.board.lines:
+            line = [asmt[keys[idx]] for idx in unit]
+            if not None in line and not len(line) == len(set(line)):
                 return True
         return False
 
-    def print_sudoku_result(self, result):
-        result_values = list(result.values())
-        sudoku = ''
-        for k in range(self.GRID_LEN * self.GRID_LEN):
-            if result_values[k] is not None:
-                sudoku += result_values[k] + ' '
+    def alldiff_in_cols_and_rows_at(self, asmt, idx):
+        return (self.repeated_in(asmt, idx, self.board.rows[self.board.row_of[idx]]) or
+                self.repeated_in(asmt, idx, self.board.cols[self.board.col_of[idx]]))
+
+    def repeated_in(self, asmt, idx, unit):
+        keys = self.board.keys
+        value = asmt[keys[idx]]
+        for p in unit:
+            if p != idx and asmt[keys[p]] == value:
+                return True
+        return False
+
+    def format_sudoku_result(self, result):
+        parts = []
+        for k, value in enumerate(list(result.values())[:self.GRID_LEN * self.GRID_LEN]):
+            if value is not None:
+                parts.append(value + ' ')
                 if (k + 1) % self.SQUARE_LEN == 0:
-                    sudoku += '| '
+                    parts.append('| ')
                 if (k + 1) % (self.SQUARE_LEN * self.SQUARE_LEN) == 0:
-                    sudoku += '\n'
+                    parts.append('\n')
                 if (k + 1) % (self.GRID_LEN * self.SQUARE_LEN) == 0:
-                    sudoku += '\n'
+                    parts.append('\n')
+        return ''.join(parts)
 
-        print(sudoku)
+    def print_sudoku_result(self, result):
+        print(self.format_sudoku_result(result))
 
     def drawResult(self, grid_image, data=None):
         if self.result is not None:
@@ -512,6 +1092,7 @@ class Solver:
                 return self.drawSkyscrapersResult(grid_image, data)
 
     def drawSudokuResult(self, grid_image, sudoku_values):
+        import cv2  # only needed to draw, keeps OpenCV out of solver only runs
         squares = []
         grid_len = self.GRID_LEN  # Ex. 9
         side = grid_image.shape[:1]
@@ -532,6 +1113,7 @@ class Solver:
         return grid_image
 
     def drawStarsResult(self, grid_image, data):
+        import cv2
         squares = []
         grid_len = self.GRID_LEN  # Ex. 9
         side = grid_image.shape[:1]
@@ -556,46 +1138,71 @@ class Solver:
         return grid_image
 
     def values_are_ordered(self, asmt):
+        # Every line of sight must still be able to show as many buildings as its clue (0 means no clue)
+        for side, lines in self.board.sight_lines.items():
+            for i, line in enumerate(lines):
+                if self.clue_unreachable(asmt, self.observers[side][i], line):
+                    return True
+        return False
 
-        LEFT = self.observers["left"]
-        RIGHT = self.observers["right"]
-        TOP = self.observers["top"]
-        BOTTOM = self.observers["bottom"]
-
-        # asmt_values = list(asmt.values())
-        asmt_matrix = np.array(list(asmt.values())).reshape(self.GRID_LEN, self.GRID_LEN)
-        asmt_matrix = np.where(asmt_matrix == None, 0, asmt_matrix).astype(int)
-
-        for i in range(self.GRID_LEN):
-            # i = 0
-            # LEFT => 00 01 02 03
-            l_row = asmt_matrix[i, :]
-            # RIGHT => 03 02 01 00
-            r_row = l_row[::-1]
-            # TOP => 00 10 20 30
-            t_row = asmt_matrix[:, i]
-            # BOTTOM => 30 20 10 00
-            b_row = t_row[::-1]
-
-            if 0 in l_row or 0 in t_row:
-                continue
-
-            left_visibles = 1
-            right_visibles = 1
-            top_visibles = 1
-            bottom_visibles = 1
-            for k in range(1, self.GRID_LEN):
-                left_visibles = left_visibles + 1 if l_row[k] > 0 and l_row[k] > max(l_row[:k]) else left_visibles
-                right_visibles = right_visibles + 1 if r_row[k] > 0 and r_row[k] > max(r_row[:k]) else right_visibles
-                top_visibles = top_visibles + 1 if t_row[k] > 0 and t_row[k] > max(t_row[:k]) else top_visibles
-                bottom_visibles = bottom_visibles + 1 if b_row[k] > 0 and b_row[k] > max(b_row[:k]) else bottom_visibles
-
-            if not (LEFT[i] > 0 and LEFT[i] == left_visibles) or not (RIGHT[i] > 0 and RIGHT[i] == right_visibles) or not (
-                    TOP[i] > 0 and TOP[i] == top_visibles) or not (BOTTOM[i] > 0 and BOTTOM[i] == bottom_visibles):
+    def values_are_ordered_at(self, asmt, idx):
+        # Only the four lines of sight crossing idx
+        for side, k in self.board.sight_lines_of[idx]:
+            if self.clue_unreachable(asmt, self.observers[side][k], self.board.sight_lines[side][k]):
                 return True
         return False
 
+    def clue_unreachable(self, asmt, clue, line):
+        if clue == 0:
+            return False
+        low, high = self.visible_bounds(asmt, line)
+        return not low <= clue <= high
+
+    def visible_bounds(self, asmt, line):
+        # Fewest and most buildings the line can show once filled, in one pass from the observer.
+        # An assigned building may be seen if it beats the tallest assigned before it, and surely is if it
+        # also beats every missing height that an empty cell before it could take. A run of empty cells after a
+        # tallest m may show at most one building per missing height above m.
+        # Both bounds are exact on a full line
+        n = len(line)
+        values = [asmt[self.board.keys[idx]] for idx in line]
+        present = [False] * (n + 1)
+        for value in values:
+            if value is not None:
+                present[int(value)] = True
+        # missing_above[h]: missing heights taller than h
+        missing_above = [0] * (n + 1)
+        for h in range(n - 1, -1, -1):
+            missing_above[h] = missing_above[h + 1] + (not present[h + 1])
+        tallest_missing = max([h for h in range(1, n + 1) if not present[h]] + [0])
+
+        low = high = 0
+        tallest = 0
+        hidden = 0  # tallest height an empty cell seen so far could take
+        gaps = 0
+        for value in values:
+            if value is None:
+                gaps += 1
+                hidden = tallest_missing
+                continue
+            if gaps:
+                high += min(gaps, missing_above[tallest])
+                gaps = 0
+            height = int(value)
+            if height > tallest:
+                high += 1
+                if height > hidden:
+                    low += 1
+                tallest = height
+        if gaps:
+            high += min(gaps, missing_above[tallest])
+        # The tallest building is always seen, wherever it goes
+        if tallest_missing == n:
+            low += 1
+        return low, high
+
     def drawSkyscrapersResult(self, grid_image, data):
+        import cv2
         squares = []
         grid_len = self.GRID_LEN  # Ex. 9
         side = grid_image.shape[:1]
@@ -0,0 +1,32 @@
+# Class for the counters and phase timings of a solver run
+from contextlib import contextmanager
+from timeit import default_timer as timer
+
+
+class SolverStats:
+    def __init__(self):
+        self.nodes = 0
+        self.backtracks = 0
+        self.propagations = 0
+        self.times = {}
+
+    @contextmanager
+    def phase(self, name):
+        start = timer()
+        try:
+            yield
+        finally:
+            self.times[name] = self.times.get(name, 0.0) + timer() - start
+
+    def as_dict(self):
+        return {
+            'nodes': self.nodes,
+            'backtracks': self.backtracks,
+            'propagations': self.propagations,
+            'times': dict(self.times)
+        }
+
+    def __repr__(self):
+        times = ', '.join([name + ' %.4fs' % seconds for name, seconds in self.times.items()])
+        return ('SolverStats(nodes=' + str(self.nodes) + ', backtracks=' + str(self.backtracks) +
+                ', propagations=' + str(self.propagations) + ', ' + times + ')')
@@ -0,0 +1,318 @@
+# Class for the Star Battle engine: star and free cell counters per row, column and area, with
+# incremental propagation of forced stars and eliminations for any number of stars per unit
+
+UNKNOWN = -1
+
+
+class StarBattle:
+    def __init__(self, board, num_stars):
+        # Units are the rows, then the columns, then the areas of the board; cells are the board indices
+        self.n = board.GRID_LEN
+        self.k = num_stars
+        self.size = board.size
+        self.row_of = board.row_of
+        self.col_of = board.col_of
+        self.neighbours = [set(cells) for cells in board.neighbours]
+        self.units = [tuple(sorted(unit)) for unit in list(board.lines) + list(board.areas) if len(unit) > 0]
+        self.units_of = [[] for _ in range(self.size)]
+        for u, unit in enumerate(self.units):
+            for idx in unit:
+                self.units_of[idx].append(u)
+        self.areas = board.areas
+        # The area arguments need every cell in exactly one area
+        self.area_of = board.area_of
+        self.full_areas = len(self.areas) > 0 and all(self.areas) and all(a >= 0 for a in self.area_of)
+
+        self.values = [UNKNOWN] * self.size
+        self.stars = [0] * len(self.units)
+        self.free = [len(unit) for unit in self.units]
+        self.trail = []
+        self.queue = []
+        self.queued = [False] * len(self.units)
+
+        # Units with up to placement_limit free cells are revised by listing every way to place their stars
+        self.placement_limit = 12
+        self.placement_memo = {}
+        self.cover_memo = {}
+        self.neighbour_bits = [sum([1 << d for d in cells]) for cells in board.neighbours]
+
+        self.nodes = 0
+        self.backtracks = 0
+        self.revisions = 0
+
+    # Cell updates: every change goes on the trail and queues the units of the cell
+
+    def assign(self, idx, value):
+        if self.values[idx] != UNKNOWN:
+            return self.values[idx] == value
+        self.values[idx] = value
+        self.trail.append(idx)
+        for u in self.units_of[idx]:
+            self.free[u] -= 1
+            self.stars[u] += value
+            if not self.queued[u]:
+                self.queued[u] = True
+                self.queue.append(u)
+        if value == 1:
+            # No star touches another one, not even diagonally
+            for d in self.neighbours[idx]:
+                if not self.assign(d, 0):
+                    return False
+        return True
+
+    def undo(self, mark):
+        while len(self.trail) > mark:
+            idx = self.trail.pop()
+            value = self.values[idx]
+            self.values[idx] = UNKNOWN
+            for u in self.units_of[idx]:
+                self.free[u] += 1
+                self.stars[u] -= value
+        self.clear_queue()
+
+    def clear_queue(self):
+        for u in self.queue:
+            self.queued[u] = False
+        self.queue = []
+
+    # Propagation
+
+    def propagate(self):
+        while True:
+            while self.queue:
+                u = self.queue.pop()
+                self.queued[u] = False
+                if not self.revise(u):
+                    self.clear_queue()
+                    return False
+            # The area arguments only run once the unit counters are stable
+            mark = len(self.trail)
+            if not self.pigeonhole():
+                self.clear_queue()
+                return False
+            if len(self.trail) == mark:
+                return True
+
+    def revise(self, u):
+        self.revisions += 1
+        needed = self.k - self.stars[u]
+        free = self.free[u]
+        if needed < 0 or needed > free:
+            return False
+        if free == 0:
+            return True
+        unknown = [idx for idx in self.units[u] if self.values[idx] == UNKNOWN]
+        if needed == 0:
+            for idx in unknown:
+                self.assign(idx, 0)
+            return True
+        if needed == free:
+            for idx in unknown:
+                if not self.assign(idx, 1):
+                    return False
+            return True
+        if free <= self.placement_limit:
+            return self.revise_placements(unknown, needed)
+
+        # Any 2x2 block holds at most one star: the blocks covering the free cells bound the stars left
+        blocks = self.cover(unknown)
+        if len(blocks) < needed:
+            return False
+        if len(blocks) == needed:
+            # Every block then holds exactly one star: a block with a single free cell has it, and the
+            # cells touching every free cell of a block can't be stars
+            for block in blocks:
+                if len(block) == 1:
+                    if not self.assign(block[0], 1):
+                        return False
+                elif not self.clear_common_neighbours(block):
+                    return False
+        return True
+
+    def revise_placements(self, cells, needed):
+        # Stars in every placement are forced, cells in none are empty, and so are the cells touching a star
+        # of every placement. The same free cells come back often while backtracking: the outcome is memoized
+        key = (tuple(cells), needed)
+        outcome = self.placement_memo.get(key)
+        if outcome is None:
+            if len(self.placement_memo) >= 100000:
+                self.placement_memo.clear()
+            outcome = self.placement_memo[key] = self.placements(cells, needed)
+        if outcome is None:
+            return False
+        forced, unused, touched = outcome
+        for idx in unused:
+            self.assign(idx, 0)
+        for idx in forced:
+            if not self.assign(idx, 1):
+                return False
+        for idx in touched:
+            if not self.assign(idx, 0):
+                return False
+        return True
+
+    def placements(self, cells, needed):
+        # Every set of needed cells with no two touching, as bitmasks over the board: returns the cells in all
+        # of them, the cells in none and the cells around a star in all of them; None if there is no such set
+        found = [-1, 0, -1]  # and of the placements, or of the placements, and of the cells around them
+        neighbour_bits = self.neighbour_bits
+
+        def extend(start, left, chosen, around):
+            if left == 0:
+                found[0] &= chosen
+                found[1] |= chosen
+                found[2] &= around
+                return
+            for k in range(start, len(cells) - left + 1):
+                idx = cells[k]
+                if not around >> idx & 1:
+                    extend(k + 1, left - 1, chosen | 1 << idx, around | neighbour_bits[idx])
+
+        extend(0, needed, 0, 0)
+        if found[0] == -1:
+            return None
+        touched = []
+        bits = found[2]
+        while bits:
+            low = bits & -bits
+            touched.append(low.bit_length() - 1)
+            bits ^= low
+        return ([idx for idx in cells if found[0] >> idx & 1], [idx for idx in cells if not found[1] >> idx & 1],
+                touched)
+
+    def cover(self, cells):
+        # Greedy cover of the cells (in board order) with 2x2 blocks, each block as the list of cells it takes
+        key = tuple(cells)
+        blocks = self.cover_memo.get(key)
+        if blocks is None:
+            if len(self.cover_memo) >= 100000:
+                self.cover_memo.clear()
+            blocks = self.cover_memo[key] = self.greedy_cover(cells)
+        return blocks
+
+    def greedy_cover(self, cells):
+        n = self.n
+        left = set(cells)
+        blocks = []
+        for idx in cells:
+            if idx not in left:
+                continue
+            r = self.row_of[idx]
+            c = self.col_of[idx]
+            # The block starting at the cell or one column to its left, whichever takes more cells
+            best = None
+            for c0 in (c, c - 1):
+                if c0 < 0:
+                    continue
+                block = [i * n + j for i in (r, r + 1) for j in (c0, c0 + 1)
+                         if i < n and j < n and i * n + j in left]
+                if best is None or len(block) > len(best):
+                    best = block
+            for cell in best:
+                left.discard(cell)
+            blocks.append(best)
+        return blocks
+
+    def clear_common_neighbours(self, cells):
+        common = None
+        for idx in cells:
+            common = set(self.neighbours[idx]) if common is None else common & self.neighbours[idx]
+            if not common:
+                return True
+        for idx in common:
+            if idx not in cells and not self.assign(idx, 0):
+                return False
+        return True
+
+    def pigeonhole(self):
+        # m areas inside m consecutive rows (columns) hold all the stars of those rows, so the other cells
+        # of the rows are empty; m consecutive rows whose cells lie in m areas hold all the stars of those
+        # areas, so the other cells of the areas are empty
+        if not self.full_areas:
+            return True
+        n = self.n
+        for position in (self.row_of, self.col_of):
+            low = [n] * len(self.areas)
+            high = [-1] * len(self.areas)
+            touched = [set() for _ in range(n)]
+            for idx in range(self.size):
+                if self.values[idx] != 0:
+                    a = self.area_of[idx]
+                    p = position[idx]
+                    low[a] = min(low[a], p)
+                    high[a] = max(high[a], p)
+                    touched[p].add(a)
+            for first in range(n):
+                # Areas starting at first or below, by the last row (column) they reach
+                ending = [[] for _ in range(n)]
+                for a in range(len(self.areas)):
+                    if first <= low[a] and high[a] >= 0:
+                        ending[high[a]].append(a)
+                areas = set()
+                inside = []
+                for last in range(first, n):
+                    m = last - first + 1
+                    if m == n:
+                        break
+                    areas |= touched[last]
+                    inside += ending[last]
+                    if len(inside) > m or len(areas) < m:
+                        return False
+                    if len(inside) == m:
+                        for idx in range(self.size):
+                            if first <= position[idx] <= last and self.values[idx] == UNKNOWN \
+                                    and self.area_of[idx] not in inside:
+                                self.assign(idx, 0)
+                    if len(areas) == m:
+                        for a in areas:
+                            for idx in self.areas[a]:
+                                if self.values[idx] == UNKNOWN and not first <= position[idx] <= last:
+                                    self.assign(idx, 0)
+                    if self.queue:
+                        return True
+        return True
+
+    # Search
+
+    def select(self):
+        # The unit missing stars with the least room to spare: the fewest 2x2 blocks beyond the stars it
+        # still needs, then the fewest free cells
+        best = None
+        best_slack = None
+        for u in range(len(self.units)):
+            needed = self.k - self.stars[u]
+            if needed > 0:
+                unknown = [idx for idx in self.units[u] if self.values[idx] == UNKNOWN]
+                slack = (len(self.cover(unknown)) - needed, self.free[u])
+                if best is None or slack < best_slack:
+                    best = u
+                    best_slack = slack
+        return best
+
+    def search(self):
+        self.nodes += 1
+        u = self.select()
+        if u is None:
+            return True
+        idx = [cell for cell in self.units[u] if self.values[cell] == UNKNOWN][0]
+        for value in (1, 0):
+            mark = len(self.trail)
+            if self.assign(idx, value) and self.propagate() and self.search():
+                return True
+            self.undo(mark)
+            self.backtracks += 1
+        return False
+
+    def solve(self, givens=None):
+        # givens: cell -> 0 or 1. Returns the value of every cell, None if there is no solution
+        for idx, value in (givens or {}).items():
+            if not self.assign(idx, value):
+                return None
+        self.queue = []
+        self.queued = [True] * len(self.units)
+        for u in range(len(self.units)):
+            self.queue.append(u)
+        if not self.propagate() or not self.search():
+            return None
+        # Cells left once every unit has its stars are empty
+        return [0 if value == UNKNOWN else value for value in self.values]
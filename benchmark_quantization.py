@@ -0,0 +1,90 @@
+# Accuracy, latency and memory of the float32 and int8 digit classifiers
+#
+# python benchmark_quantization.py [--variants float32 int8] [--batches 1 81 256] [--no-accuracy]
+#
+# Each variant runs in a fresh interpreter so the peak memory is its own. The accuracy is the
+# classification_report of DigitClassifier.evaluate on the MNIST test set.
+import argparse
+import json
+import resource
+import subprocess
+import sys
+import os
+from timeit import default_timer as timer
+
+import numpy as np
+
+VARIANTS = ['float32', 'int8']
+
+
+def child(variant, batches, runs, accuracy):
+    from DigitClassifier import DigitClassifier
+
+    start = timer()
+    classifier = DigitClassifier(precision=variant)
+    load = timer() - start
+    model_file = classifier.quantized_file if variant == 'int8' else classifier.weights_file
+
+    result = {'variant': variant, 'load': load, 'model_kb': os.path.getsize(model_file) / 1024, 'latency_ms': {}}
+    rng = np.random.default_rng(0)
+    for batch_len in batches:
+        batch = rng.random((batch_len, 28, 28, 1)).astype(np.float32)
+        classifier.predict(batch)
+        times = []
+        for _ in range(runs):
+            start = timer()
+            classifier.predict(batch)
+            times.append(timer() - start)
+        result['latency_ms'][str(batch_len)] = 1000 * float(np.median(times))
+
+    if accuracy:
+        _, (testData, testLabels) = classifier.load_mnist()
+        print('classification_report', variant)
+        report = classifier.evaluate(testData, testLabels)
+        result['accuracy'] = report['accuracy']
+
+    # ru_maxrss is in kilobytes on Linux, in bytes on macOS
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    result['peak_mb'] = peak / 1024 / 1024 if sys.platform == 'darwin' else peak / 1024
+    print(json.dumps(result))
+
+
+def measure(variant, args):
+    command = [sys.executable, os.path.abspath(__file__), '--child', variant, '--runs', str(args.runs),
+               '--batches'] + [str(b) for b in args.batches]
+    if args.no_accuracy:
+        command.append('--no-accuracy')
+    out = subprocess.run(command, capture_output=True, text=True, cwd=os.path.dirname(os.path.abspath(__file__)),
+                         env=dict(os.environ, TF_CPP_MIN_LOG_LEVEL='3'))
+    if out.returncode != 0:
+        print(variant, 'failed:', out.stderr.strip().splitlines()[-1])
+        return None
+    lines = out.stdout.strip().splitlines()
+    # Everything before the JSON result is the classification report
+    report = [line for line in lines[:-1] if line.strip() and 'MNIST' not in line]
+    if report:
+        print('\n'.join(report))
+    return json.loads(lines[-1])
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Compare the float32 and int8 digit classifiers')
+    parser.add_argument('--child', default=None, help=argparse.SUPPRESS)
+    parser.add_argument('--variants', nargs='+', default=VARIANTS, choices=VARIANTS)
+    parser.add_argument('--batches', nargs='+', type=int, default=[1, 81, 256])
+    parser.add_argument('--runs', type=int, default=20, help='timed runs per batch size, the median is reported')
+    parser.add_argument('--no-accuracy', action='store_true', help='skip the MNIST test set evaluation')
+    args = parser.parse_args()
+
+    if args.child:
+        child(args.child, args.batches, args.runs, not args.no_accuracy)
+        sys.exit(0)
+
+    results = [r for r in [measure(variant, args) for variant in args.variants] if r is not None]
+    print()
+    print('%-8s %9s %9s %9s %9s  %s' % ('variant', 'accuracy', 'model KB', 'load s', 'peak MB',
+                                        '  '.join(['batch ' + str(b) + ' ms' for b in args.batches])))
+    for r in results:
+        accuracy = '%9.4f' % r['accuracy'] if 'accuracy' in r else '%9s' % '-'
+        print('%-8s %s %9.0f %9.2f %9.1f  %s' % (r['variant'], accuracy, r['model_kb'], r['load'], r['peak_mb'],
+                                                 '  '.join(['%10.2f' % r['latency_ms'][str(b)] for b in args.batches])))
@@ -0,0 +1,93 @@
+# Startup time and peak memory of main.py for each game
+#
+# python benchmark_startup.py [--modes solver pipeline keras] [--repeat 3]
+#
+# Every measure runs in a fresh interpreter: 'solver' solves a digitised board (main.py --board),
+# 'pipeline' loads the detector and the numpy classifier, 'keras' the detector and the TensorFlow classifier.
+import argparse
+import json
+import resource
+import subprocess
+import sys
+import os
+from timeit import default_timer as timer
+
+GAMES = {
+    'sudoku': ({'game': 'sudoku', 'GRID_LEN': 9, 'SQUARE_LEN': 3, 'NUM_STARS': 1},
+               '530070000600195000098000060800060003400800001700020006060000280000419005000080079'),
+    'stars': ({'game': 'stars', 'GRID_LEN': 8, 'SQUARE_LEN': 1, 'NUM_STARS': 1},
+              json.dumps({'variables_found': [
+                  ['60', '70', '71', '72'],
+                  ['22', '23', '24', '31', '32', '33', '34', '41', '42', '43', '44', '52', '53', '54', '55'],
+                  ['63', '73', '74', '75', '76', '77'],
+                  ['40', '50', '51', '61', '62'],
+                  ['00', '01', '02', '03', '04', '05', '06', '07', '10', '11', '12', '13', '14', '15', '20', '21', '30'],
+                  ['16', '17', '25', '26'],
+                  ['27', '35', '36', '37', '45', '46', '47', '57'],
+                  ['56', '64', '65', '66', '67']]})),
+    'skyscrapers': ({'game': 'skyscrapers', 'GRID_LEN': 5, 'SQUARE_LEN': 1, 'NUM_STARS': 1},
+                    json.dumps({'variables_found': {
+                        '10': '3', '16': '2', '01': '3', '61': '2', '20': '2', '26': '3', '02': '3', '62': '1',
+                        '30': '3', '36': '1', '03': '2', '63': '3', '40': '1', '46': '2', '04': '1', '64': '2',
+                        '50': '2', '56': '3', '05': '3', '65': '3'}}))
+}
+MODES = ['solver', 'pipeline', 'keras']
+HEAVY = ['cv2', 'skimage', 'tensorflow', 'h5py']
+
+
+def child(game, mode):
+    start = timer()
+    import main
+    info, board = GAMES[game]
+    if mode == 'solver':
+        _, status = main.solve_board(info, board)
+    else:
+        main.load_pipeline(info, 'numpy' if mode == 'pipeline' else 'keras')
+        main.Solver(info)
+        status = 'LOADED'
+    # ru_maxrss is in kilobytes on Linux, in bytes on macOS
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    peak_mb = peak / 1024 / 1024 if sys.platform == 'darwin' else peak / 1024
+    print(json.dumps({
+        'status': status,
+        'setup': timer() - start,
+        'peak_mb': peak_mb,
+        'imported': [name for name in HEAVY if name in sys.modules]
+    }))
+
+
+def measure(game, mode):
+    start = timer()
+    out = subprocess.run([sys.executable, os.path.abspath(__file__), '--child', game, mode],
+                         capture_output=True, text=True, cwd=os.path.dirname(os.path.abspath(__file__)),
+                         env=dict(os.environ, TF_CPP_MIN_LOG_LEVEL='3'))
+    total = timer() - start
+    if out.returncode != 0:
+        return {'status': 'ERROR: ' + out.stderr.strip().splitlines()[-1], 'total': total}
+    result = json.loads(out.stdout.strip().splitlines()[-1])
+    result['total'] = total
+    return result
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Report startup time and peak memory of main.py for each game')
+    parser.add_argument('--child', nargs=2, metavar=('GAME', 'MODE'), help=argparse.SUPPRESS)
+    parser.add_argument('--games', nargs='+', default=list(GAMES), choices=list(GAMES))
+    parser.add_argument('--modes', nargs='+', default=MODES, choices=MODES)
+    parser.add_argument('--repeat', type=int, default=3, help='runs per measure, the fastest is reported')
+    args = parser.parse_args()
+
+    if args.child:
+        child(*args.child)
+        sys.exit(0)
+
+    print('%-12s %-9s %9s %9s %9s  %s' % ('game', 'mode', 'total s', 'setup s', 'peak MB', 'heavy imports'))
+    for game in args.games:
+        for mode in args.modes:
+            runs = [measure(game, mode) for _ in range(args.repeat)]
+            best = min(runs, key=lambda r: r['total'])
+            if 'setup' not in best:
+                print('%-12s %-9s %9.2f  %s' % (game, mode, best['total'], best['status']))
+                continue
+            print('%-12s %-9s %9.2f %9.2f %9.1f  %s' % (game, mode, best['total'], best['setup'], best['peak_mb'],
+                                                      ', '.join(best['imported']) or '-'))
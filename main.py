@@ -1,109 +1,186 @@
-from PuzzleDetector import PuzzleDetector
 from Solver import Solver
-from DigitClassifier import DigitClassifier
 
-import cv2
 import sys
+import argparse
+import logging
+from collections import deque
 from timeit import default_timer as timer
 
 import os
 
-#TODO Arguments parser con sys
-
-
-info = {
-    'game': 'sudoku', # sudoku, stars, skyscrapers
-    'GRID_LEN': 4,
-    'SQUARE_LEN': 2,
-    'NUM_STARS': 1
-}
-
-if len(sys.argv) > 1:#TODO check + controllo games
-    if sys.argv[1] is not None:
-        info['game'] = sys.argv[1]
-    if sys.argv[2] is not None:
-        info['GRID_LEN'] = int(sys.argv[2])
-    if len(sys.argv) > 3 and sys.argv[3] is not None:
-        info['SQUARE_LEN'] = int(sys.argv[3])
-
-puzzle_detected = False
-puzzle_analyzed = False
-puzzle_solved = False
-
-detector = PuzzleDetector(info)
-classifier = DigitClassifier()
-solver = Solver(info)
+# PuzzleDetector (OpenCV, scikit-image) and DigitClassifier (the CNN) are imported by the phases that need them
 
 REAL_TIME = False
 
-# 1. Board detection phase
-
-if REAL_TIME:
-    cap = cv2.VideoCapture(0, cv2.CAP_DSHOW)
-    counter = 0
-    while not puzzle_detected:
-        _, frame = cap.read()
-
-        detector.detectGameBoard(frame)
-        counter += 1
-        if counter % 10 == 0 and detector.grid_digit_images is not None:
-            classifier.save_puzzle(detector.grid_digit_images)
-
-        k = cv2.waitKey(20)
-        if k == 27 & 0xFF == ord('q'):
-            break
-        elif k == 32:
-            puzzle_detected = True
 
-else:
-    img = cv2.imread('input_'+info['game']+'.png')
-    detector.detectGameBoard(img)
-    classifier.save_puzzle(detector.grid_digit_images)
+def parse_args(argv):
+    parser = argparse.ArgumentParser(description='Detect, read and solve a logic game')
+    parser.add_argument('game', nargs='?', default='sudoku', choices=['sudoku', 'stars', 'skyscrapers'])
+    parser.add_argument('grid_len', nargs='?', type=int, default=4)
+    parser.add_argument('square_len', nargs='?', type=int, default=2)
+    parser.add_argument('--num-stars', type=int, default=1)
+    parser.add_argument('--board', default=None,
+                        help='solver only mode: a sudoku line, a JSON game data object or a file holding one')
+    parser.add_argument('--backend', default='numpy', choices=['numpy', 'keras'],
+                        help='digit classifier backend, keras imports TensorFlow')
+    parser.add_argument('--precision', default='float32', choices=['float32', 'int8'],
+                        help='int8 runs the quantized classifier (TensorFlow Lite)')
+    args = parser.parse_args(argv)
+
+    info = {
+        'game': args.game,  # sudoku, stars, skyscrapers
+        'GRID_LEN': args.grid_len,
+        'SQUARE_LEN': args.square_len,
+        'NUM_STARS': args.num_stars
+    }
+    return info, args
+
+
+class BoardRing:
+    # Last 7 detected boards, for stars, which never need the digit classifier
+    def __init__(self):
+        self.puzzles = deque(maxlen=7)
+
+    def save_puzzle(self, puzzle):
+        self.puzzles.append(puzzle)
+
+
+def load_pipeline(info, backend, precision='float32', tracking=False):
+    from PuzzleDetector import PuzzleDetector
+    detector = PuzzleDetector(info, tracking=tracking)
+    if info['game'] == 'stars':
+        return detector, BoardRing()
+    from DigitClassifier import DigitClassifier
+    if backend == 'numpy':
+        classifier = DigitClassifier(weights_file='model_weights.npz', backend='numpy', precision=precision)
+    else:
+        classifier = DigitClassifier(precision=precision)
+    return detector, classifier
+
+
+def read_board(board, info):
+    # The board as text, or the path of a file with it on the first line
+    from BatchSolver import parse_line
+    if os.path.isfile(board):
+        with open(board) as f:
+            board = f.readline()
+    return parse_line(board.strip(), info)
+
+
+def solve_board(info, board):
+    # Solver only mode: no OpenCV, no CNN
+    solver = Solver(info)
+    start = timer()
+    solved = solver.solveGame(read_board(board, info))
+    print(solved, 'in', timer() - start, 'seconds')
+    if solved == 'SOLVED':
+        if info['game'] == 'sudoku':
+            print(solver.format_sudoku_result(solver.result))
+        else:
+            print(solver.result)
+    return solver, solved
 
-print('Digits found ', str(len([d for d in detector.grid_digit_images if d is not None])))
-
-
-# 2. Board analyze phase
-start = timer()
-
-digits_found = {}
-if info['game'] == 'sudoku':
-    digits_found = classifier.get_sudoku_digits(info)
-elif info['game'] == 'stars':
-    digits_found = detector.get_stars_areas(classifier.puzzles)
-elif info['game'] == 'skyscrapers':
-    digits_found = classifier.get_skyscrapers_digits(info)
-
-print(digits_found)
-
-# 3. Game solution phase
-data = {
-    'variables_found': digits_found
-}
-solved = solver.solveGame(data)
 
 def save_image(image, title, file_prefix="output"):
     """ Save image to a file with a unique name based on the title. """
+    import cv2
     if not os.path.exists("images"):
         os.makedirs("images")
     filename = f"imgs/{file_prefix}_{title.replace(' ', '_').replace(':', '')}.png"
     cv2.imwrite(filename, image)
-    
-# cv2.imshow("Digits found", solver.drawResult(detector.grid_image, digits_found))
-end = timer()
-print(end - start, " seconds")
-if solved != "SOLVED":
-    print("Error: ", solved)
-    #cv2.imshow("Impossible without solution (wrong ocr?)", solver.drawResult(detector.grid_image, digits_found))
-    result_image = solver.drawResult(detector.grid_image, digits_found)
-    save_image(result_image, "Impossible_without_solution_wrong_ocr")
-else:
-    print("Game solved?: ", solved)
-    #cv2.imshow("Game Solved in "+ str(end - start)+" seconds", solver.drawResult(detector.grid_image, solver.result))
-    result_image = solver.drawResult(detector.grid_image, solver.result)
-    save_image(result_image, f"Game_Solved_in_{end - start}_seconds")
-
-#cv2.waitKey(0)
-
-cap.release()
-#cv2.destroyAllWindows()
+
+
+def run_pipeline(info, backend, precision='float32'):
+    import cv2
+
+    puzzle_detected = False
+
+    # Between webcam frames the board is tracked instead of searched again
+    detector, classifier = load_pipeline(info, backend, precision, tracking=REAL_TIME)
+    solver = Solver(info)
+    if info['game'] in ('sudoku', 'skyscrapers'):
+        # Every saved board is read once, when saved, into the running votes
+        classifier.stream_votes(info)
+
+    # 1. Board detection phase
+
+    if REAL_TIME:
+        # Capture, detection and OCR run in their own threads; the main thread only draws and reads the keys
+        from RealTimePipeline import RealTimePipeline
+        cap = cv2.VideoCapture(0, cv2.CAP_DSHOW)
+        pipeline = RealTimePipeline(detector, classifier, cap).start()
+        while not puzzle_detected and pipeline.running():
+            windows = pipeline.latest()
+            if windows is not None:
+                for name, image in windows.items():
+                    cv2.imshow(name, image)
+
+            k = cv2.waitKey(20)
+            if k == 27 & 0xFF == ord('q'):
+                break
+            elif k == 32:
+                puzzle_detected = True
+        pipeline.stop()
+        cap.release()
+        print('Real-time: %.1f detections/sec' % pipeline.fps(), pipeline.stats)
+
+    else:
+        img = cv2.imread('input_'+info['game']+'.png')
+        detector.detectGameBoard(img)
+        classifier.save_puzzle(detector.grid_digit_images)
+
+    print('Digits found ', str(len([d for d in detector.grid_digit_images if d is not None])))
+
+    # 2. Board analyze phase
+    start = timer()
+
+    digits_found = {}
+    candidates = {}
+    if info['game'] == 'sudoku':
+        digits_found = classifier.get_sudoku_digits(info)
+        # Unsure reads reach the solver as their top 3 digits instead of fixed givens
+        candidates = classifier.get_sudoku_candidates(info)
+    elif info['game'] == 'stars':
+        digits_found = detector.get_stars_areas(list(classifier.puzzles))
+    elif info['game'] == 'skyscrapers':
+        digits_found = classifier.get_skyscrapers_digits(info)
+
+    print(digits_found)
+    if getattr(classifier, 'cache', None) is not None:
+        print('OCR cache:', classifier.cache)
+
+    # 3. Game solution phase
+    data = {
+        'variables_found': digits_found,
+        'candidates': candidates
+    }
+    solved = solver.solveGame(data)
+
+    # cv2.imshow("Digits found", solver.drawResult(detector.grid_image, digits_found))
+    end = timer()
+    print(end - start, " seconds")
+    if solved != "SOLVED":
+        print("Error: ", solved)
+        #cv2.imshow("Impossible without solution (wrong ocr?)", solver.drawResult(detector.grid_image, digits_found))
+        result_image = solver.drawResult(detector.grid_image, digits_found)
+        save_image(result_image, "Impossible_without_solution_wrong_ocr")
+    else:
+        print("Game solved?: ", solved)
+        #cv2.imshow("Game Solved in "+ str(end - start)+" seconds", solver.drawResult(detector.grid_image, solver.result))
+        result_image = solver.drawResult(detector.grid_image, solver.result)
+        save_image(result_image, f"Game_Solved_in_{end - start}_seconds")
+
+    #cv2.waitKey(0)
+    #cv2.destroyAllWindows()
+    return solved
+
+
+if __name__ == '__main__':
+    # Solver diagnostics: INFO for the run stats, DEBUG for assignments and results
+    logging.basicConfig(level=logging.INFO, format='%(name)s %(levelname)s: %(message)s')
+
+    info, args = parse_args(sys.argv[1:])
+    if args.board is not None:
+        solve_board(info, args.board)
+    else:
+        run_pipeline(info, args.backend, args.precision)
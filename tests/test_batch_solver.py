@@ -0,0 +1,55 @@
+import unittest
+import tempfile
+import json
+import os
+from argparse import Namespace
+from BatchSolver import BatchSolver, parse_line, game_info
+
+EASY = '530070000600195000098000060800060003400803001700020006060000280000419005000080079'
+HARD = '800000000003600000070090200050007000000045700000100030001000068008500010090000400'
+HARD_SOLUTION = '812753649943682175675491283154237896369845721287169534521974368438526917796318452'
+
+
+class TestBatchSolver(unittest.TestCase):
+    def setUp(self):
+        self.info = {'game': 'sudoku', 'GRID_LEN': 9, 'SQUARE_LEN': 3}
+        f = tempfile.NamedTemporaryFile('w', suffix='.txt', delete=False)
+        f.write('# two sudokus and a wrong one\n' + HARD + '\n\n' + EASY + '\n')
+        f.write(json.dumps({'variables_found': {'00': '5', '01': '5'}}) + '\n')
+        f.close()
+        self.path = f.name
+
+    def tearDown(self):
+        os.remove(self.path)
+
+    def test_parse_line(self):
+        game_data = parse_line(EASY, self.info)
+        self.assertEqual(game_data['variables_found']['00'], '5')
+        self.assertNotIn('02', game_data['variables_found'])
+        self.assertRaises(ValueError, parse_line, EASY[:80], self.info)
+        sixteen = parse_line('G' + '.' * 255, {'GRID_LEN': 16})
+        self.assertEqual(sixteen['variables_found'], {'0000': '16'})
+
+    def test_solve_file_in_order(self):
+        for workers in (1, 2):
+            batch = BatchSolver(self.info, workers=workers, chunksize=1)
+            results = list(batch.solve_file(self.path))
+            self.assertEqual([r['index'] for r in results], [0, 1, 2])
+            self.assertEqual(results[0]['solution'], HARD_SOLUTION)
+            self.assertEqual([r['status'] for r in results], ['SOLVED', 'SOLVED', 'FAILURE'])
+            self.assertEqual(batch.stats['puzzles'], 3)
+            self.assertEqual(batch.stats['solved'], 2)
+            self.assertGreater(batch.throughput(), 0)
+
+    def test_game_info(self):
+        args = Namespace(game='stars', grid_len=10, square_len=3, num_stars=2, engine=None)
+        # No engine: the solver keeps the game's default one
+        self.assertNotIn('engine', game_info(args))
+        args.engine = 'counting'
+        self.assertEqual(game_info(args)['engine'], 'counting')
+        skyscrapers = Namespace(game='skyscrapers', grid_len=5, square_len=1, num_stars=1, engine=None)
+        self.assertNotIn('engine', game_info(skyscrapers))
+
+
+if __name__ == '__main__':
+    unittest.main()
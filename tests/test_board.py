@@ -0,0 +1,32 @@
+import unittest
+from Board import Board, EMPTY
+
+
+class TestBoard(unittest.TestCase):
+
+    def test_shared_tables(self):
+        self.assertIs(Board('sudoku', 9, 3).rows, Board('sudoku', 9, 3).rows)
+
+    def test_stars_areas(self):
+        board = Board('stars', 8)
+        board.set_areas([['00', '01'], ['10']])
+        self.assertEqual(board.areas, ((0, 1), (8,)))
+        self.assertEqual(board.area_of[8], 1)
+        self.assertEqual(board.area_of[2], EMPTY)
+        # '11' touches '00', '12' shares no unit with it
+        self.assertIn(1, board.peers()[0])
+        self.assertIn(9, board.peers()[0])
+        self.assertNotIn(10, board.peers()[0])
+
+    def test_translation(self):
+        board = Board('sudoku', 16, 4)
+        assignment = {key: None for key in board.keys}
+        assignment['0111'] = '12'
+        board.load(assignment)
+        self.assertEqual(board.values[board.index['0111']], 12)
+        self.assertEqual(board.values[board.index['1101']], EMPTY)
+        self.assertEqual(board.to_assignment(), assignment)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,27 @@
+import unittest
+from DancingLinks import DancingLinks
+
+
+class TestDancingLinks(unittest.TestCase):
+
+    def test_knuth_example(self):
+        # The exact cover example of Knuth's paper: rows 'D', 'A' and 'E' cover the 7 columns
+        dlx = DancingLinks(7)
+        dlx.add_row('A', [2, 4, 5])
+        dlx.add_row('B', [0, 3, 6])
+        dlx.add_row('C', [1, 2, 5])
+        dlx.add_row('D', [0, 3])
+        dlx.add_row('E', [1, 6])
+        dlx.add_row('F', [3, 4, 6])
+        self.assertEqual(sorted(dlx.solve()), ['A', 'D', 'E'])
+        self.assertGreater(dlx.iterations, 0)
+
+    def test_no_cover(self):
+        dlx = DancingLinks(3)
+        dlx.add_row('A', [0, 1])
+        dlx.add_row('B', [1, 2])
+        self.assertIsNone(dlx.solve())
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -32,9 +32,25 @@ class TestDigitClassifier(unittest.TestCase):
         self.assertIsNotNone(prediction)
 
 
-    @patch.object(DigitClassifier, 'predictDigitImage')
-    def test_analyze_boards(self, mock_predict_digit_image):
-        mock_predict_digit_image.side_effect = lambda x: 1 if np.any(x) else 0
+    def test_compiled_inference(self):
+        classifier = DigitClassifier()
+        batch = np.random.rand(3, 28, 28, 1).astype(np.float32)
+
+        preds = classifier.predict(batch)
+
+        self.assertIs(classifier.infer_model, classifier.model)
+        np.testing.assert_allclose(preds, classifier.model.predict(batch, verbose=0), atol=1e-5)
+
+    def test_evaluate(self):
+        classifier = DigitClassifier()
+        labels = np.arange(20) % 10
+        report = classifier.evaluate(np.zeros((20, 28, 28, 1), dtype=np.float32), labels,
+                                     predict=lambda batch: np.eye(10)[labels])
+        self.assertEqual(report['accuracy'], 1.0)
+
+    @patch.object(DigitClassifier, 'predict_digit_images')
+    def test_analyze_boards(self, mock_predict_digit_images):
+        mock_predict_digit_images.side_effect = lambda images: np.array([1 if np.any(x) else 0 for x in images])
         
         classifier = DigitClassifier()
         
@@ -44,6 +60,64 @@ class TestDigitClassifier(unittest.TestCase):
         board_structure = classifier.analyze_boards(digit_images, info)
         
         self.assertEqual(board_structure, {'00': '1', '01': '0'})
+        # One forward pass for the whole board
+        self.assertEqual(mock_predict_digit_images.call_count, 1)
+
+    @patch.object(DigitClassifier, 'predict_digit_images')
+    def test_analyze_puzzles_single_pass(self, mock_predict_digit_images):
+        mock_predict_digit_images.side_effect = lambda images: np.array([int(x[0, 0]) for x in images])
+
+        classifier = DigitClassifier()
+        puzzles = [[np.full((28, 28), 3), None, np.full((28, 28), 4)], [None, np.full((28, 28), 5), None]]
+
+        boards = classifier.analyze_puzzles(puzzles, ['00', '01', '02'])
+
+        self.assertEqual(boards, [{'00': '3', '02': '4'}, {'01': '5'}])
+        self.assertEqual(mock_predict_digit_images.call_count, 1)
+        self.assertEqual(len(mock_predict_digit_images.call_args[0][0]), 3)
+
+    def test_predict_digit_images(self):
+        classifier = DigitClassifier()
+        classifier.model = MagicMock()
+        classifier.model.predict.return_value = np.array([[0.1, 0.2, 0.7], [0.5, 0.3, 0.2]])
+        classifier.exclude_classes = [0]
+        classifier.cache = None  # both images are the same cell
+
+        predictions = classifier.predict_digit_images([np.zeros((40, 40), dtype=np.uint8)] * 2)
+
+        self.assertEqual(list(predictions), [2, 1])
+        probabilities = classifier.predict_digit_probabilities([np.zeros((40, 40), dtype=np.uint8)] * 2)
+        np.testing.assert_allclose(probabilities, [[0, 2 / 9, 7 / 9], [0, 0.6, 0.4]])
+        batch = classifier.model.predict.call_args[0][0]
+        self.assertEqual(batch.shape, (2, 28, 28, 1))
+        self.assertEqual(batch.dtype, np.float32)
+
+    def test_prediction_cache(self):
+        classifier = DigitClassifier(weights_file='model_weights.npz', backend='numpy')
+        rng = np.random.default_rng(0)
+        cells = [(rng.random((40, 40)) > 0.6).astype(np.uint8) * 255 for _ in range(3)]
+        expected = classifier.predict_digit_images(cells)
+        self.assertEqual(classifier.cache.as_dict()['misses'], 3)
+
+        # The same cells again, one with a pixel of noise: no inference at all
+        noisy = cells[0].copy()
+        noisy[20, 20] = 255 - noisy[20, 20]
+        with patch.object(classifier, 'predict') as mock_predict:
+            predictions = classifier.predict_digit_images([cells[2], noisy, cells[1], cells[2]])
+            mock_predict.assert_not_called()
+        self.assertEqual(list(predictions), [expected[2], expected[0], expected[1], expected[2]])
+        self.assertEqual(classifier.cache.hits, 4)
+        self.assertAlmostEqual(classifier.cache.hit_rate(), 4 / 7)
+
+    def test_prediction_cache_eviction(self):
+        classifier = DigitClassifier(weights_file='model_weights.npz', backend='numpy', cache_size=2)
+        cells = [np.full((28, 28), 80 * k, dtype=np.uint8) for k in range(3)]
+        classifier.predict_digit_images(cells)
+        self.assertEqual(len(classifier.cache.entries), 2)
+        self.assertEqual(classifier.cache.evictions, 1)
+        # The first cell was the least recently used
+        classifier.predict_digit_images(cells[:1])
+        self.assertEqual(classifier.cache.misses, 4)
 
     def test_save_puzzle(self):
         classifier = DigitClassifier()
@@ -57,9 +131,9 @@ class TestDigitClassifier(unittest.TestCase):
         self.assertEqual(len(classifier.puzzles), 2)
         self.assertEqual(classifier.puzzles_seen, 2)
 
-    @patch.object(DigitClassifier, 'analyze_boards')
-    def test_get_sudoku_digits(self, mock_analyze_boards):
-        mock_analyze_boards.return_value = {'00': '1', '01': '2'}
+    @patch.object(DigitClassifier, 'analyze_puzzles')
+    def test_get_sudoku_digits(self, mock_analyze_puzzles):
+        mock_analyze_puzzles.return_value = [{'00': '1', '01': '2'}, {'00': '1', '01': '2'}]
         
         classifier = DigitClassifier()
         classifier.puzzles = [np.zeros((28, 28)), np.ones((28, 28))]
@@ -71,9 +145,9 @@ class TestDigitClassifier(unittest.TestCase):
         
         self.assertEqual(digits_found, {'00': '1', '01': '2'})
 
-    @patch.object(DigitClassifier, 'analyze_skyscrapers_boards')
-    def test_get_skyscrapers_digits(self, mock_analyze_skyscrapers_boards):
-        mock_analyze_skyscrapers_boards.return_value = {'00': '1', '01': '2'}
+    @patch.object(DigitClassifier, 'analyze_puzzles')
+    def test_get_skyscrapers_digits(self, mock_analyze_puzzles):
+        mock_analyze_puzzles.return_value = [{'00': '1', '01': '2'}, {'00': '1', '01': '2'}]
         
         classifier = DigitClassifier()
         classifier.puzzles = [np.zeros((28, 28)), np.ones((28, 28))]
@@ -85,6 +159,30 @@ class TestDigitClassifier(unittest.TestCase):
         
         self.assertEqual(digits_found, {'00': '1', '01': '2'})
 
+    @patch.object(DigitClassifier, 'predict_digit_probabilities')
+    def test_stream_votes(self, mock_predict_digit_images):
+        mock_predict_digit_images.side_effect = lambda images: np.eye(10)[[int(x[0, 0]) for x in images]]
+
+        classifier = DigitClassifier()
+        info = {'game': 'sudoku', 'GRID_LEN': 4, 'SQUARE_LEN': 2}
+        board = [None] * 16
+        for k in range(9):
+            board[0] = np.full((28, 28), 1 if k < 6 else 2)
+            classifier.save_puzzle(list(board))
+        classifier.stream_votes(info)
+        # The 7 boards still in the ring are classified together, the new ones once each
+        self.assertEqual(mock_predict_digit_images.call_count, 1)
+        self.assertEqual(classifier.votes.consensus(), {'00': '1'})
+
+        for _ in range(3):
+            board[0] = np.full((28, 28), 2)
+            classifier.save_puzzle(list(board))
+        self.assertEqual(mock_predict_digit_images.call_count, 4)
+        self.assertEqual(classifier.votes.confidence(), {'00': 6 / 7})
+        self.assertEqual(classifier.get_sudoku_digits(info), {'00': '2'})
+        self.assertEqual(classifier.get_sudoku_candidates(info, top_k=2), {'00': [('2', 6 / 7), ('1', 1 / 7)]})
+        self.assertEqual(mock_predict_digit_images.call_count, 4)
+
 
 if __name__ == '__main__':
     unittest.main()
\ No newline at end of file
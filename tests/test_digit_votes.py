@@ -0,0 +1,52 @@
+import unittest
+from DigitVotes import DigitVotes
+
+
+class TestDigitVotes(unittest.TestCase):
+
+    def test_consensus(self):
+        votes = DigitVotes(size=3)
+        votes.add({'00': '1', '01': '7'})
+        votes.add({'00': '1', '01': '1'})
+        votes.add({'00': '2', '01': '7', '02': '3'})
+
+        # The cells of the newest board, ties go to the smallest digit
+        self.assertEqual(votes.consensus(), {'00': '1', '01': '7', '02': '3'})
+        self.assertEqual(votes.confidence(), {'00': 2 / 3, '01': 2 / 3, '02': 1.0})
+
+    def test_eviction(self):
+        votes = DigitVotes(size=2)
+        votes.add({'00': 4, '01': 5})
+        votes.add({'00': 9})
+        votes.add({'00': 9})
+
+        # The first board's votes are gone
+        self.assertEqual(len(votes), 2)
+        self.assertEqual(votes.weights['00'][4], 0)
+        self.assertNotIn('01', votes.weights)
+        self.assertEqual(votes.consensus(), {'00': '9'})
+        self.assertEqual(votes.vote('00'), (9, 1.0))
+
+    def test_probabilities(self):
+        votes = DigitVotes(size=2)
+        votes.add({'00': [0, 0.6, 0, 0, 0, 0, 0, 0.4, 0, 0], '01': 3})
+        votes.add({'00': [0, 0.4, 0, 0, 0, 0, 0, 0.5, 0.1, 0], '01': 3})
+
+        self.assertEqual(votes.consensus(), {'00': '1', '01': '3'})
+        self.assertAlmostEqual(votes.vote('00')[1], 0.5)
+        top = votes.top('00')
+        self.assertEqual([value for value, share in top], [1, 7, 8])
+        self.assertAlmostEqual(sum([share for value, share in top]), 1.0)
+        # Only the unsure cells are candidates
+        self.assertEqual(list(votes.candidates(k=2)), ['00'])
+        self.assertEqual([value for value, share in votes.candidates(k=2)['00']], ['1', '7'])
+
+    def test_empty(self):
+        votes = DigitVotes()
+        self.assertEqual(votes.consensus(), {})
+        self.assertEqual(votes.confidence(), {})
+        self.assertEqual(votes.candidates(), {})
+
+
+if __name__ == '__main__':
+    unittest.main()
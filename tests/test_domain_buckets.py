@@ -0,0 +1,54 @@
+import unittest
+from DomainBuckets import DomainBuckets
+
+
+class TestDomainBuckets(unittest.TestCase):
+
+    def test_select_smallest_domain(self):
+        buckets = DomainBuckets(9)
+        buckets.push('00', 5, 20)
+        buckets.push('01', 2, 10)
+        buckets.push('02', 7, 20)
+        self.assertEqual(buckets.select(), '01')
+        buckets.update('02', 1)
+        self.assertEqual(buckets.select(), '02')
+
+    def test_degree_tie_break(self):
+        buckets = DomainBuckets(9)
+        buckets.push('00', 3, 4)
+        buckets.push('01', 3, 12)
+        buckets.push('02', 3, 8)
+        self.assertEqual(buckets.select(), '01')
+        buckets.update('01', 3, -10)
+        self.assertEqual(buckets.select(), '02')
+
+    def test_degree_buckets(self):
+        buckets = DomainBuckets(2)
+        for k in range(6):
+            buckets.push('0' + str(k), 2, k)
+        self.assertEqual(buckets.select(), '05')
+        # One move for the new size and degree
+        buckets.update('05', 2, -5)
+        self.assertEqual(buckets.select(), '04')
+        buckets.remove('04')
+        buckets.remove('03')
+        self.assertEqual(buckets.select(), '02')
+        self.assertEqual(buckets.top[2], 2)
+        buckets.update('00', 2, 7)
+        self.assertEqual(buckets.select(), '00')
+        self.assertEqual(buckets.degrees['00'], 7)
+
+    def test_remove(self):
+        buckets = DomainBuckets(2)
+        buckets.push('00', 1, 0)
+        buckets.push('01', 2, 0)
+        buckets.remove('00')
+        self.assertNotIn('00', buckets)
+        self.assertEqual(len(buckets), 1)
+        self.assertEqual(buckets.select(), '01')
+        buckets.remove('01')
+        self.assertIsNone(buckets.select())
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,39 @@
+import unittest
+from Geometry import Geometry, get_geometry, cell_key
+
+
+class TestGeometry(unittest.TestCase):
+
+    def test_cell_key(self):
+        self.assertEqual(cell_key(3, 4, 9), '34')
+        self.assertEqual(cell_key(9, 9, 10), '99')
+        self.assertEqual(cell_key(1, 11, 16), '0111')
+        self.assertNotEqual(cell_key(1, 11, 16), cell_key(11, 1, 16))
+
+    def test_sudoku_tables(self):
+        geometry = Geometry('sudoku', 9, 3)
+        self.assertEqual(geometry.keys[40], '44')
+        self.assertEqual(geometry.index['44'], 40)
+        self.assertEqual(geometry.cols[2][:3], (2, 11, 20))
+        self.assertEqual(len(geometry.lines), 18)
+        self.assertEqual(geometry.box_of[geometry.index['58']], 5)
+        self.assertEqual(geometry.boxes[4][0], geometry.index['33'])
+        self.assertEqual(len(geometry.peers[0]), 20)
+        self.assertNotIn(0, geometry.peers[0])
+
+    def test_neighbours_and_sight_lines(self):
+        geometry = Geometry('skyscrapers', 4)
+        self.assertEqual(geometry.neighbours[0], (1, 4, 5))
+        self.assertEqual(len(geometry.neighbours[5]), 8)
+        self.assertEqual(geometry.diagonals[5], (0, 2, 8, 10))
+        self.assertEqual(geometry.sight_lines['right'][0], (3, 2, 1, 0))
+        self.assertEqual(geometry.sight_lines['bottom'][1], (13, 9, 5, 1))
+        self.assertEqual(geometry.boxes, ())
+
+    def test_cache(self):
+        self.assertIs(get_geometry('sudoku', 9, 3), get_geometry('sudoku', 9, 3))
+        self.assertIsNot(get_geometry('sudoku', 9, 3), get_geometry('skyscrapers', 9, None))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,31 @@
+import unittest
+import subprocess
+import sys
+import main
+
+
+class TestMain(unittest.TestCase):
+
+    def test_parse_args(self):
+        info, args = main.parse_args(['skyscrapers', '6'])
+        self.assertEqual(info['game'], 'skyscrapers')
+        self.assertEqual(info['GRID_LEN'], 6)
+        self.assertIsNone(args.board)
+        self.assertEqual(args.backend, 'numpy')
+
+    def test_solve_board(self):
+        info, _ = main.parse_args(['sudoku', '4', '2'])
+        _, solved = main.solve_board(info, '1.3.3..2.1..4..1')
+        self.assertEqual(solved, 'SOLVED')
+
+    def test_solver_only_skips_cv_and_ml(self):
+        code = ('import sys, main\n'
+                'info, args = main.parse_args(["sudoku", "4", "2", "--board", "1.3.3..2.1..4..1"])\n'
+                'main.solve_board(info, args.board)\n'
+                'print([m for m in ("cv2", "skimage", "tensorflow") if m in sys.modules])\n')
+        output = subprocess.run([sys.executable, '-c', code], capture_output=True, text=True, check=True).stdout
+        self.assertEqual(output.strip().splitlines()[-1], '[]')
+
+
+if __name__ == '__main__':
+    unittest.main()
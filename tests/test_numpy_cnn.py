@@ -0,0 +1,49 @@
+import unittest
+import subprocess
+import tempfile
+import sys
+import os
+import numpy as np
+from NumpyCNN import NumpyCNN
+
+
+class TestNumpyCNN(unittest.TestCase):
+
+    def setUp(self):
+        self.batch = np.random.default_rng(0).random((5, 28, 28, 1)).astype(np.float32)
+
+    def test_same_predictions_as_keras(self):
+        import tensorflow as tf
+        keras_model = tf.keras.models.load_model('model_weights.h5')
+        model = NumpyCNN.load('model_weights.h5')
+        np.testing.assert_allclose(model.predict(self.batch), keras_model.predict(self.batch, verbose=0), atol=1e-5)
+
+    def test_npz_round_trip(self):
+        model = NumpyCNN.load('model_weights.h5')
+        with tempfile.TemporaryDirectory() as folder:
+            path = os.path.join(folder, 'weights.npz')
+            model.save_npz(path)
+            converted = NumpyCNN.load(path)
+        self.assertEqual(converted.layers, model.layers)
+        np.testing.assert_array_equal(converted.predict(self.batch), model.predict(self.batch))
+
+    def test_conv_same_padding(self):
+        # A 3x3 kernel of ones sums the neighbourhood of each pixel
+        x = np.ones((1, 4, 4, 1), dtype=np.float32)
+        out = NumpyCNN.conv(x, np.ones((3, 3, 1, 1), dtype=np.float32), 'same')
+        self.assertEqual(out.shape, (1, 4, 4, 1))
+        self.assertEqual(out[0, 0, 0, 0], 4)
+        self.assertEqual(out[0, 1, 1, 0], 9)
+
+    def test_numpy_backend_does_not_import_tensorflow(self):
+        code = ('import sys, numpy as np\n'
+                'from DigitClassifier import DigitClassifier\n'
+                'classifier = DigitClassifier(weights_file="model_weights.npz", backend="numpy")\n'
+                'classifier.predict_digit_images([np.zeros((30, 30), dtype=np.uint8)])\n'
+                'print("tensorflow" in sys.modules)\n')
+        output = subprocess.run([sys.executable, '-c', code], capture_output=True, text=True, check=True).stdout
+        self.assertEqual(output.strip(), 'False')
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,65 @@
+import unittest
+from Propagator import Propagator
+
+
+class TestPropagator(unittest.TestCase):
+
+    def test_alldiff_removes_fixed_values(self):
+        domains = [['1'], ['1', '2', '3'], ['1', '2', '3']]
+        propagator = Propagator(['1', '2', '3'], domains)
+        propagator.add_constraint('alldiff', [0, 1, 2], None)
+        self.assertTrue(propagator.establish())
+        self.assertEqual(propagator.values_of(1), ['2', '3'])
+        self.assertEqual(propagator.values_of(2), ['2', '3'])
+
+    def test_alldiff_hidden_single(self):
+        domains = [['1', '2'], ['1', '2'], ['1', '2', '3']]
+        propagator = Propagator(['1', '2', '3'], domains)
+        propagator.add_constraint('alldiff', [0, 1, 2], 0b111)
+        self.assertTrue(propagator.establish())
+        self.assertEqual(propagator.values_of(2), ['3'])
+
+    def test_assign_and_undo(self):
+        cells = [0, 1, 2]
+        propagator = Propagator(['1', '2', '3'], [['1', '2', '3'] for var in cells])
+        propagator.add_constraint('alldiff', cells, 0b111)
+        self.assertTrue(propagator.establish())
+        self.assertTrue(propagator.assign(0, '2'))
+        self.assertEqual(propagator.values_of(1), ['1', '3'])
+        self.assertTrue(propagator.assign(1, '3'))
+        self.assertEqual(propagator.values_of(2), ['1'])
+        propagator.unassign()
+        propagator.unassign()
+        self.assertEqual([propagator.size(var) for var in cells], [3, 3, 3])
+
+    def test_failed_assign_is_undone(self):
+        propagator = Propagator(['1', '2'], [['1', '2'], ['1']])
+        propagator.add_constraint('alldiff', [0, 1], None)
+        self.assertTrue(propagator.establish())
+        self.assertFalse(propagator.assign(0, '1'))
+        self.assertEqual(propagator.values_of(0), ['2'])
+        self.assertEqual(propagator.marks, [])
+
+    def test_count_and_apart(self):
+        cells = [0, 1, 2]
+        propagator = Propagator(['0', '1'], [['0', '1'] for var in cells])
+        propagator.add_constraint('count', cells, 1)
+        propagator.add_constraint('apart', [0, 1])
+        propagator.add_constraint('apart', [1, 2])
+        self.assertTrue(propagator.establish())
+        self.assertTrue(propagator.assign(2, '0'))
+        self.assertTrue(propagator.assign(1, '0'))
+        self.assertEqual(propagator.values_of(0), ['1'])
+
+    def test_skyline(self):
+        cells = [0, 1, 2]
+        propagator = Propagator(['1', '2', '3'], [['1', '2', '3'] for var in cells])
+        propagator.add_constraint('alldiff', cells, 0b111)
+        # Three buildings seen from the start: the line can only be 1 2 3
+        propagator.add_constraint('skyline', cells, (3, 0))
+        self.assertTrue(propagator.establish())
+        self.assertEqual([propagator.values_of(var) for var in cells], [['1'], ['2'], ['3']])
+
+
+if __name__ == '__main__':
+    unittest.main()
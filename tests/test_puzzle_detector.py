@@ -56,6 +56,26 @@ class TestPuzzleDetector(unittest.TestCase):
         self.assertIsInstance(output, np.ndarray)
         self.assertEqual(output.shape, self.sudoku_sample_image.shape)
 
+    def test_tracking(self):
+        detector = PuzzleDetector(self.sudoku_info, tracking=True)
+        h, w = self.sudoku_sample_image.shape[:2]
+
+        def shifted(dx, dy):
+            m = np.float32([[1, 0, dx], [0, 1, dy]])
+            return cv2.warpAffine(self.sudoku_sample_image, m, (w, h), borderValue=(255, 255, 255))
+
+        for k in range(5):
+            frame = shifted(2 * k, k)
+            polygon, _ = detector.locatePolygon(frame)
+            expected = detector.polygonCorners(detector.findPolygon(frame)[0])
+            self.assertLessEqual(np.abs(detector.polygonCorners(polygon) - expected).max(), 3)
+        self.assertEqual(detector.full_detections, 1)
+        self.assertEqual(detector.tracked_frames, 4)
+
+        # A jump far beyond the search windows loses the board: full detection again
+        detector.locatePolygon(shifted(300, 200))
+        self.assertEqual(detector.full_detections, 2)
+
     def test_distance(self):
         p1 = (0, 0)
         p2 = (3, 4)
@@ -72,6 +92,29 @@ class TestPuzzleDetector(unittest.TestCase):
         self.assertIsNotNone(result)
         self.assertEqual(result.shape, (50, 50))
 
+    def test_extract_digits_matches_get_digit(self):
+        # 4x4 board of 53/54 px cells with grid lines and a few digits
+        board = np.ones((213, 213, 3), dtype=np.uint8) * 255
+        for k in range(5):
+            cv2.line(board, (int(k * 53.25), 0), (int(k * 53.25), 212), (0, 0, 0), 2)
+            cv2.line(board, (0, int(k * 53.25)), (212, int(k * 53.25)), (0, 0, 0), 2)
+        for digit, (x, y) in zip('3807', [(15, 42), (121, 42), (68, 149), (175, 202)]):
+            cv2.putText(board, digit, (x, y), cv2.FONT_HERSHEY_SIMPLEX, 1, (0, 0, 0), 2)
+
+        digits = self.sudoku_detector.extract_digits(board, 4)
+
+        side = board.shape[0] / 4
+        self.assertEqual(len(digits), 16)
+        self.assertEqual(len([d for d in digits if d is not None]), 4)
+        for k, digit in enumerate(digits):
+            j, i = divmod(k, 4)
+            expected = self.sudoku_detector.get_digit(
+                board[int(j * side):int((j + 1) * side), int(i * side):int((i + 1) * side)])
+            if expected is None:
+                self.assertIsNone(digit)
+            else:
+                np.testing.assert_array_equal(digit, expected)
+
     def test_get_stars_areas(self):
         puzzles = [
             ['00', '01', '02'],
@@ -0,0 +1,48 @@
+import unittest
+import tempfile
+import shutil
+import os
+import numpy as np
+import tensorflow as tf
+from QuantizedCNN import QuantizedCNN
+from DigitClassifier import DigitClassifier
+
+
+class TestQuantizedCNN(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        cls.tmp = tempfile.mkdtemp()
+        cls.weights_file = os.path.join(cls.tmp, 'model_weights.h5')
+        shutil.copy('model_weights.h5', cls.weights_file)
+        cls.model = tf.keras.models.load_model(cls.weights_file)
+        # Synthetic calibration set: the tests don't download MNIST
+        calibration = np.random.default_rng(0).random((50, 28, 28, 1)).astype(np.float32)
+        cls.size = QuantizedCNN.convert(cls.model, calibration, os.path.join(cls.tmp, 'model_weights_int8.tflite'))
+
+    @classmethod
+    def tearDownClass(cls):
+        shutil.rmtree(cls.tmp)
+
+    def test_convert(self):
+        # int8 weights: about a quarter of the float32 model
+        self.assertLess(self.size, self.model.count_params() * 4 / 2)
+
+    def test_predict_matches_float_model(self):
+        quantized = QuantizedCNN(os.path.join(self.tmp, 'model_weights_int8.tflite'))
+        batch = np.random.default_rng(1).random((20, 28, 28, 1)).astype(np.float32)
+        expected = self.model.predict(batch, verbose=0)
+        for batch_len in (20, 1, 20):
+            preds = quantized.predict(batch[:batch_len])
+            self.assertEqual(preds.shape, (batch_len, 10))
+            np.testing.assert_allclose(preds, expected[:batch_len], atol=0.1)
+
+    def test_classifier_precision(self):
+        classifier = DigitClassifier(weights_file=self.weights_file, precision='int8')
+        self.assertIsInstance(classifier.model, QuantizedCNN)
+        digits = classifier.predict_digit_images([np.zeros((30, 30), dtype=np.uint8)] * 3)
+        self.assertEqual(len(digits), 3)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,66 @@
+import unittest
+import queue
+import time
+import cv2
+import numpy as np
+from unittest.mock import MagicMock
+from PuzzleDetector import PuzzleDetector
+from RealTimePipeline import RealTimePipeline, put_latest
+
+
+class FrameSource:
+    # cv2.VideoCapture stand-in: the same image a fixed number of times at ~50 fps, then the end of the stream
+    def __init__(self, frame, count):
+        self.frame = frame
+        self.count = count
+
+    def read(self):
+        if self.count == 0:
+            return False, None
+        self.count -= 1
+        time.sleep(0.02)
+        return True, self.frame
+
+
+class TestRealTimePipeline(unittest.TestCase):
+
+    def test_put_latest(self):
+        q = queue.Queue(maxsize=2)
+        self.assertEqual(put_latest(q, 1), 0)
+        self.assertEqual(put_latest(q, 2), 0)
+        self.assertEqual(put_latest(q, 3), 1)
+        self.assertEqual([q.get_nowait(), q.get_nowait()], [2, 3])
+
+    def test_pipeline(self):
+        detector = PuzzleDetector({'game': 'sudoku', 'GRID_LEN': 9, 'SQUARE_LEN': 3}, tracking=True)
+        classifier = MagicMock()
+        image = cv2.imread('input_sudoku.png')
+        pipeline = RealTimePipeline(detector, classifier, FrameSource(image, 30), sample_every=2).start()
+        while pipeline.running():
+            pipeline.latest()
+        pipeline.stop()
+
+        stats = pipeline.stats
+        self.assertFalse(detector.display)
+        self.assertEqual(stats['captured'], 30)
+        self.assertEqual(stats['failed'], 0)
+        self.assertGreater(stats['detected'], 0)
+        # Every frame is either detected or dropped for a newer one
+        self.assertLessEqual(stats['detected'] + stats['dropped_frames'], 30)
+        self.assertEqual(classifier.save_puzzle.call_count, stats['saved'])
+        self.assertGreater(stats['saved'], 0)
+        self.assertEqual(len(classifier.save_puzzle.call_args[0][0]), 81)
+
+    def test_failed_frames(self):
+        detector = PuzzleDetector({'game': 'sudoku', 'GRID_LEN': 9, 'SQUARE_LEN': 3})
+        blank = np.zeros((100, 100, 3), dtype=np.uint8)
+        pipeline = RealTimePipeline(detector, MagicMock(), FrameSource(blank, 5)).start()
+        while pipeline.running():
+            pipeline.latest()
+        pipeline.stop()
+        self.assertEqual(pipeline.stats['detected'], 0)
+        self.assertGreater(pipeline.stats['failed'], 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
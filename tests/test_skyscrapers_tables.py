@@ -0,0 +1,112 @@
+import gc
+import os
+import tempfile
+import unittest
+import warnings
+import numpy as np
+import Skyscrapers
+from Solver import Solver
+from Geometry import cell_key
+
+
+def visible(line):
+    tallest = 0
+    count = 0
+    for height in line:
+        if height > tallest:
+            tallest = height
+            count += 1
+    return count
+
+
+class TestSkyscrapersTables(unittest.TestCase):
+
+    def test_table(self):
+        perms, order, starts = Skyscrapers.build_table(4)
+        self.assertEqual(perms.shape, (24, 4))
+        self.assertEqual(starts[-1], 24)
+        # Four buildings seen from the left, one from the right: only 1 2 3 4
+        pair = 4 * 5 + 1
+        self.assertEqual(perms[order[starts[pair]:starts[pair + 1]]].tolist(), [[1, 2, 3, 4]])
+        for k in range(25):
+            for perm in perms[order[starts[k]:starts[k + 1]]]:
+                self.assertEqual((visible(perm), visible(perm[::-1])), divmod(k, 5))
+
+    def test_disk_cache(self):
+        with tempfile.TemporaryDirectory() as cache:
+            old_dir = Skyscrapers.CACHE_DIR
+            Skyscrapers.CACHE_DIR = cache
+            Skyscrapers.load_table.cache_clear()
+            try:
+                perms, _, _ = Skyscrapers.load_table(5)
+                self.assertTrue(os.path.isfile(os.path.join(cache, 'skyscrapers_5.npz')))
+                Skyscrapers.load_table.cache_clear()
+                cached, _, _ = Skyscrapers.load_table(5)
+                np.testing.assert_array_equal(cached, perms)
+            finally:
+                Skyscrapers.CACHE_DIR = old_dir
+                Skyscrapers.load_table.cache_clear()
+
+    def test_broken_cache(self):
+        with tempfile.TemporaryDirectory() as cache:
+            old_dir = Skyscrapers.CACHE_DIR
+            Skyscrapers.CACHE_DIR = cache
+            Skyscrapers.load_table.cache_clear()
+            path = os.path.join(cache, 'skyscrapers_5.npz')
+            try:
+                # A table cut short by a killed run is built again and written over
+                for broken in (b'', b'PK\x03\x04 truncated'):
+                    with open(path, 'wb') as f:
+                        f.write(broken)
+                    Skyscrapers.load_table.cache_clear()
+                    with warnings.catch_warnings(record=True) as caught:
+                        warnings.simplefilter('always', ResourceWarning)
+                        with self.assertLogs('Skyscrapers', level='WARNING'):
+                            perms, _, _ = Skyscrapers.load_table(5)
+                        gc.collect()
+                    # The broken file is closed
+                    self.assertEqual([w for w in caught if issubclass(w.category, ResourceWarning)], [])
+                    self.assertEqual(perms.shape, (120, 5))
+                self.assertEqual(os.listdir(cache), ['skyscrapers_5.npz'])
+                Skyscrapers.load_table.cache_clear()
+                cached, _, _ = Skyscrapers.load_table(5)
+                np.testing.assert_array_equal(cached, perms)
+            finally:
+                Skyscrapers.CACHE_DIR = old_dir
+                Skyscrapers.load_table.cache_clear()
+
+    def test_same_result_as_backtracking(self):
+        clues = {'10': '3', '16': '2', '01': '3', '61': '2', '20': '2', '26': '3', '02': '3', '62': '1',
+                 '30': '3', '36': '1', '03': '2', '63': '3', '40': '1', '46': '2', '04': '1', '64': '2',
+                 '50': '2', '56': '3', '05': '3', '65': '3'}
+        tables = Solver({'game': 'skyscrapers', 'GRID_LEN': 5, 'SQUARE_LEN': 1})
+        backtracking = Solver({'game': 'skyscrapers', 'GRID_LEN': 5, 'SQUARE_LEN': 1, 'engine': 'backtracking'})
+        self.assertEqual(tables.solveGame({'variables_found': clues}), 'SOLVED')
+        self.assertEqual(backtracking.solveGame({'variables_found': clues}), 'SOLVED')
+        self.assertEqual(tables.result, backtracking.result)
+
+    def test_solve_7x7(self):
+        # Some clues are missing
+        clues = {'10': '3', '18': '1', '02': '3', '30': '3', '03': '2', '48': '3', '04': '3', '84': '2', '50': '2',
+                 '85': '3', '60': '3', '68': '2', '06': '3', '86': '1', '70': '3', '07': '1'}
+        solver = Solver({'game': 'skyscrapers', 'GRID_LEN': 7, 'SQUARE_LEN': 1})
+        self.assertEqual(solver.solveGame({'variables_found': clues}), 'SOLVED')
+        grid = [[int(solver.result[cell_key(i, j, 7)]) for j in range(7)] for i in range(7)]
+        for line in grid + [list(col) for col in zip(*grid)]:
+            self.assertEqual(sorted(line), list(range(1, 8)))
+        for i in range(1, 8):
+            row = grid[i - 1]
+            col = [grid[k][i - 1] for k in range(7)]
+            for key, seen in [(cell_key(i, 0, 9), visible(row)), (cell_key(i, 8, 9), visible(row[::-1])),
+                              (cell_key(0, i, 9), visible(col)), (cell_key(8, i, 9), visible(col[::-1]))]:
+                if key in clues:
+                    self.assertEqual(int(clues[key]), seen)
+
+    def test_no_solution(self):
+        # Four buildings seen from the left of the first row but only one from the top of the first column
+        observers = {'left': [4, 0, 0, 0], 'right': [0] * 4, 'top': [1, 0, 0, 0], 'bottom': [0] * 4}
+        self.assertIsNone(Skyscrapers.Skyscrapers(4, observers).solve())
+
+
+if __name__ == '__main__':
+    unittest.main()
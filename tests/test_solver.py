@@ -1,6 +1,7 @@
+import multiprocessing
 import unittest
 from unittest.mock import patch, MagicMock
-from Solver import Solver
+from Solver import Solver, init_worker, solve_branch
 from DigitClassifier import DigitClassifier
 from PuzzleDetector import PuzzleDetector
 
@@ -131,5 +132,350 @@ class TestSolver(unittest.TestCase):
         result = solver.solveGame(game_data)
         self.assertEqual(result, 'FAILURE')
 
+    def test_sudoku_masks(self):
+        game_info = {
+            'game': 'sudoku',
+            'GRID_LEN': 9,
+            'SQUARE_LEN': 3,
+        }
+        solver = Solver(game_info)
+        self.assertTrue(solver.init_masks({'00': '5', '44': '1', '88': None}))
+        # '11' shares the box with '00', '40' the column, '48' the row of '44'
+        index = solver.board.index
+        self.assertEqual(solver.used_mask(index['11']), 1 << 4)
+        self.assertEqual(solver.used_mask(index['40']), (1 << 4) | 1)
+        self.assertFalse(solver.assign_mask(index['48'], '1'))
+        self.assertTrue(solver.assign_mask(index['48'], '2'))
+        solver.unassign_mask(index['48'], '2')
+        self.assertEqual(solver.used_mask(index['48']), 1)
+
+    def test_solve_sudoku(self):
+        game_info = {
+            'game': 'sudoku',
+            'GRID_LEN': 9,
+            'SQUARE_LEN': 3,
+        }
+        puzzle = '800000000003600000070090200050007000000045700000100030001000068008500010090000400'
+        solution = '812753649943682175675491283154237896369845721287169534521974368438526917796318452'
+        game_data = {
+            'variables_found': {str(k // 9) + str(k % 9): v for k, v in enumerate(puzzle) if v != '0'}
+        }
+        solver = Solver(game_info)
+        self.assertEqual(solver.solveGame(game_data), 'SOLVED')
+        self.assertEqual(''.join(solver.result.values()), solution)
+
+    def test_solve_sudoku_16x16(self):
+        # Two digit coordinates need the '0111' style keys
+        solution = [[(4 * (i % 4) + i // 4 + j) % 16 + 1 for j in range(16)] for i in range(16)]
+        game_data = {'variables_found': {}}
+        for i in range(16):
+            for j in range(16):
+                if (i * 7 + j * 5) % 3 != 0:
+                    game_data['variables_found']['%02d%02d' % (i, j)] = str(solution[i][j])
+        solver = Solver({'game': 'sudoku', 'GRID_LEN': 16, 'SQUARE_LEN': 4})
+        self.assertEqual(solver.solveGame(game_data), 'SOLVED')
+        self.assertEqual(solver.result['1511'], str(solution[15][11]))
+        self.assertTrue(solver.there_are_enough_values(solver.result))
+
+    def test_delta_checks(self):
+        solver = Solver({'game': 'stars', 'GRID_LEN': 4, 'NUM_STARS': 1})
+        solver.NUM_STARS = 1
+        solver.data = {'variables_found': [['00', '01', '10', '11'], ['02', '03', '12', '13'],
+                                           ['20', '21', '30', '31'], ['22', '23', '32', '33']]}
+        solver.board.set_areas(solver.data['variables_found'])
+        assignment = {var: None for var in solver.board.keys}
+        assignment['00'] = '1'
+        assignment['11'] = '1'
+        constraints = [solver.only_X_in_colums_and_rows, solver.only_x_in_areas, solver.never_adjacents]
+        self.assertFalse(solver.is_consistent(assignment, constraints))
+        self.assertFalse(solver.is_consistent(assignment, constraints, '11'))
+        # '33' is far from both stars: its own units are fine
+        assignment['33'] = '0'
+        self.assertTrue(solver.is_consistent(assignment, constraints, '33'))
+
+    def test_dlx_engine(self):
+        puzzle = '800000000003600000070090200050007000000045700000100030001000068008500010090000400'
+        game_data = {'variables_found': {str(k // 9) + str(k % 9): c for k, c in enumerate(puzzle) if c != '0'}}
+        backtracking = Solver({'game': 'sudoku', 'GRID_LEN': 9, 'SQUARE_LEN': 3})
+        dlx = Solver({'game': 'sudoku', 'GRID_LEN': 9, 'SQUARE_LEN': 3, 'engine': 'dlx'})
+        self.assertEqual(backtracking.solveGame(dict(game_data)), 'SOLVED')
+        self.assertEqual(dlx.solveGame(dict(game_data)), 'SOLVED')
+        self.assertEqual(dlx.result, backtracking.result)
+        self.assertEqual(list(dlx.result), dlx.CSP['VARIABLES'])
+
+        wrong = Solver({'game': 'sudoku', 'GRID_LEN': 9, 'SQUARE_LEN': 3, 'engine': 'dlx'})
+        self.assertEqual(wrong.solveGame({'variables_found': {'00': '5', '01': '5'}}), 'FAILURE')
+
+    def test_stats_and_logging(self):
+        puzzle = '800000000003600000070090200050007000000045700000100030001000068008500010090000400'
+        game_data = {'variables_found': {str(k // 9) + str(k % 9): c for k, c in enumerate(puzzle) if c != '0'}}
+        solver = Solver({'game': 'sudoku', 'GRID_LEN': 9, 'SQUARE_LEN': 3})
+        with self.assertLogs('Solver', level='DEBUG') as logs:
+            self.assertEqual(solver.solveGame(game_data), 'SOLVED')
+        self.assertTrue(any('sudoku SOLVED' in line for line in logs.output))
+        self.assertEqual(solver.stats.nodes, solver.iterations)
+        self.assertGreater(solver.stats.backtracks, 0)
+        self.assertGreater(solver.stats.propagations, 0)
+        self.assertEqual(set(solver.stats.times), {'inference', 'propagation', 'search'})
+        self.assertEqual(solver.format_sudoku_result(solver.result).split('\n')[0], '8 1 2 | 7 5 3 | 6 4 9 | ')
+
+    def test_pause_and_resume(self):
+        puzzle = '800000000003600000070090200050007000000045700000100030001000068008500010090000400'
+        game_data = {'variables_found': {str(k // 9) + str(k % 9): c for k, c in enumerate(puzzle) if c != '0'}}
+        whole = Solver({'game': 'sudoku', 'GRID_LEN': 9, 'SQUARE_LEN': 3, 'propagation': 'none'})
+        self.assertEqual(whole.solveGame(dict(game_data)), 'SOLVED')
+
+        paused = Solver({'game': 'sudoku', 'GRID_LEN': 9, 'SQUARE_LEN': 3, 'propagation': 'none', 'max_nodes': 1000})
+        status = paused.solveGame(dict(game_data))
+        runs = 1
+        while status == 'PAUSED':
+            self.assertEqual(paused.iterations, 1000 * runs)
+            status = paused.resume()
+            runs += 1
+        self.assertEqual(status, 'SOLVED')
+        self.assertEqual(runs, whole.iterations // 1000 + 1)
+        self.assertEqual(paused.result, whole.result)
+        self.assertEqual(paused.iterations, whole.iterations)
+        self.assertIsNone(paused.resume())
+
+        timed = Solver({'game': 'sudoku', 'GRID_LEN': 9, 'SQUARE_LEN': 3, 'propagation': 'none', 'time_limit': 0})
+        self.assertEqual(timed.solveGame(dict(game_data)), 'PAUSED')
+        self.assertEqual(timed.iterations, 0)
+        self.assertEqual(timed.resume(time_limit=60), 'SOLVED')
+        self.assertEqual(timed.result, whole.result)
+
+    def test_search_failure(self):
+        # Three stars can't sit on a 3x3 board without two of them touching
+        solver = Solver({'game': 'stars', 'GRID_LEN': 3, 'NUM_STARS': 1, 'engine': 'backtracking'})
+        areas = [['00', '01', '02'], ['10', '11', '12'], ['20', '21', '22']]
+        self.assertEqual(solver.solveGame({'variables_found': areas}), 'FAILURE')
+        self.assertEqual(solver.depth, 0)
+
+    def test_budget_needs_backtracking(self):
+        # The table engine has no budget: it says so and solves the puzzle anyway
+        solver = Solver({'game': 'skyscrapers', 'GRID_LEN': 4, 'SQUARE_LEN': 1, 'max_nodes': 5})
+        with self.assertLogs('Solver', level='WARNING') as logs:
+            self.assertEqual(solver.solveGame({'variables_found': {'10': '4'}}), 'SOLVED')
+        self.assertTrue(any("engine 'tables' ignores info['max_nodes']" in line for line in logs.output))
+
+        stars = Solver({'game': 'stars', 'GRID_LEN': 3, 'NUM_STARS': 1, 'workers': 2})
+        areas = [['00', '01', '02'], ['10', '11', '12'], ['20', '21', '22']]
+        with self.assertLogs('Solver', level='WARNING') as logs:
+            stars.solveGame({'variables_found': areas})
+        self.assertTrue(any("engine 'counting' runs on one core" in line for line in logs.output))
+
+    def test_parallel_search(self):
+        puzzle = '800000000003600000070090200050007000000045700000100030001000068008500010090000400'
+        game_data = {'variables_found': {str(k // 9) + str(k % 9): c for k, c in enumerate(puzzle) if c != '0'}}
+        sequential = Solver({'game': 'sudoku', 'GRID_LEN': 9, 'SQUARE_LEN': 3})
+        parallel = Solver({'game': 'sudoku', 'GRID_LEN': 9, 'SQUARE_LEN': 3, 'workers': 2})
+        self.assertEqual(sequential.solveGame(dict(game_data)), 'SOLVED')
+        self.assertEqual(parallel.solveGame(dict(game_data)), 'SOLVED')
+        self.assertEqual(parallel.result, sequential.result)
+        self.assertEqual(parallel.stats.nodes, parallel.iterations)
+
+        # The workers report their slices at DEBUG only
+        init_worker(multiprocessing.Event(), multiprocessing.Value('q', -1), None)
+        with self.assertLogs('Solver', level='DEBUG') as logs:
+            status, solution = solve_branch({'game': 'sudoku', 'GRID_LEN': 9, 'SQUARE_LEN': 3}, dict(game_data), {})[:2]
+        self.assertEqual((status, solution), ('SOLVED', sequential.result))
+        self.assertTrue(all(line.startswith('DEBUG') for line in logs.output))
+
+        stars = Solver({'game': 'stars', 'GRID_LEN': 3, 'NUM_STARS': 1, 'engine': 'backtracking', 'workers': 2})
+        areas = [['00', '01', '02'], ['10', '11', '12'], ['20', '21', '22']]
+        self.assertEqual(stars.solveGame({'variables_found': areas}), 'FAILURE')
+
+    def test_parallel_budget(self):
+        puzzle = '800000000003600000070090200050007000000045700000100030001000068008500010090000400'
+        game_data = {'variables_found': {str(k // 9) + str(k % 9): c for k, c in enumerate(puzzle) if c != '0'}}
+        sequential = Solver({'game': 'sudoku', 'GRID_LEN': 9, 'SQUARE_LEN': 3, 'propagation': 'none'})
+        sequential.solveGame(dict(game_data))
+
+        # The workers share the budget: the run pauses after 5 nodes, split included
+        parallel = Solver({'game': 'sudoku', 'GRID_LEN': 9, 'SQUARE_LEN': 3, 'propagation': 'none', 'workers': 2,
+                           'max_nodes': 5})
+        self.assertEqual(parallel.solveGame(dict(game_data)), 'PAUSED')
+        self.assertEqual(parallel.iterations, 5)
+        self.assertTrue(parallel.pending)
+        # resume goes on with the branches left, without losing the solution
+        status = parallel.resume(max_nodes=4000)
+        self.assertLessEqual(parallel.iterations, 4005)
+        while status == 'PAUSED':
+            status = parallel.resume(max_nodes=4000)
+        self.assertEqual(status, 'SOLVED')
+        self.assertEqual(parallel.result, sequential.result)
+
+        timed = Solver({'game': 'sudoku', 'GRID_LEN': 9, 'SQUARE_LEN': 3, 'workers': 2, 'time_limit': 0})
+        self.assertEqual(timed.solveGame(dict(game_data)), 'PAUSED')
+        self.assertEqual(timed.iterations, 0)
+        self.assertEqual(timed.resume(time_limit=60), 'SOLVED')
+        self.assertEqual(timed.result, sequential.result)
+
+    def test_remaining_branches(self):
+        puzzle = '800000000003600000070090200050007000000045700000100030001000068008500010090000400'
+        game_data = {'variables_found': {str(k // 9) + str(k % 9): c for k, c in enumerate(puzzle) if c != '0'}}
+        paused = Solver({'game': 'sudoku', 'GRID_LEN': 9, 'SQUARE_LEN': 3, 'propagation': 'none', 'max_nodes': 50})
+        self.assertEqual(paused.solveGame(dict(game_data)), 'PAUSED')
+        branches = paused.remaining_branches()
+        # The node the search paused before holds every value of the stack
+        self.assertEqual(len(branches[0]), paused.depth)
+        self.assertTrue(all(len(branch) <= paused.depth for branch in branches))
+        # Solving the branches one by one finds the same solution
+        whole = Solver({'game': 'sudoku', 'GRID_LEN': 9, 'SQUARE_LEN': 3, 'propagation': 'none'})
+        whole.solveGame(dict(game_data))
+        results = []
+        for branch in branches:
+            solver = Solver({'game': 'sudoku', 'GRID_LEN': 9, 'SQUARE_LEN': 3, 'propagation': 'none'})
+            solver.branch = branch
+            if solver.solveGame(dict(game_data)) == 'SOLVED':
+                results.append(solver.result)
+        self.assertEqual(results, [whole.result])
+
+    def test_split(self):
+        puzzle = '800000000003600000070090200050007000000045700000100030001000068008500010090000400'
+        game_data = {'variables_found': {str(k // 9) + str(k % 9): c for k, c in enumerate(puzzle) if c != '0'}}
+        sequential = Solver({'game': 'sudoku', 'GRID_LEN': 9, 'SQUARE_LEN': 3})
+        sequential.solveGame(dict(game_data))
+        found = {}
+
+        def split_only(solver, assignment, workers):
+            given = sum(value is not None for value in assignment.values())
+            backtracks = solver.stats.backtracks
+            found['branches'] = solver.split(assignment, 8)
+            # Undoing the branches is not a backtrack of the search
+            found['backtracks'] = solver.stats.backtracks - backtracks
+            # The split leaves the assignment as it found it
+            found['given'] = (given, sum(value is not None for value in assignment.values()))
+            return "FAILURE"
+
+        with patch.object(Solver, 'parallel_search', autospec=True, side_effect=split_only):
+            Solver({'game': 'sudoku', 'GRID_LEN': 9, 'SQUARE_LEN': 3, 'workers': 2}).solveGame(dict(game_data))
+        branches = found['branches']
+        self.assertGreaterEqual(len(branches), 8)
+        self.assertEqual(found['given'][0], found['given'][1])
+        self.assertEqual(found['backtracks'], 0)
+        # The branches split the search space: only one of them leads to the solution
+        matching = [b for b in branches if all(sequential.result[var] == value for var, value in b.items())]
+        self.assertEqual(len(matching), 1)
+
+    def test_mrv_ordering(self):
+        puzzle = '530070000600195000098000060800060003400803001700020006060000280000419005000080079'
+        game_data = {
+            'variables_found': {str(k // 9) + str(k % 9): v for k, v in enumerate(puzzle) if v != '0'}
+        }
+        mrv_solver = Solver({'game': 'sudoku', 'GRID_LEN': 9, 'SQUARE_LEN': 3, 'propagation': 'none'})
+        static_solver = Solver({'game': 'sudoku', 'GRID_LEN': 9, 'SQUARE_LEN': 3, 'propagation': 'none',
+                                'ordering': 'static'})
+        self.assertEqual(mrv_solver.solveGame(dict(game_data)), 'SOLVED')
+        self.assertEqual(static_solver.solveGame(dict(game_data)), 'SOLVED')
+        self.assertEqual(mrv_solver.result, static_solver.result)
+        self.assertLess(mrv_solver.iterations, static_solver.iterations)
+
+    def test_soft_domains(self):
+        puzzle = '530070000600195000098000060800060003400803001700020006060000280000419005000080079'
+        givens = {str(k // 9) + str(k % 9): v for k, v in enumerate(puzzle) if v != '0'}
+        # The OCR read the 5 in '00' as a 1, which breaks no rule but leaves no solution
+        misread = dict(givens, **{'00': '1'})
+        self.assertEqual(Solver({'game': 'sudoku', 'GRID_LEN': 9, 'SQUARE_LEN': 3}).solveGame(
+            {'variables_found': misread}), 'FAILURE')
+
+        exact = Solver({'game': 'sudoku', 'GRID_LEN': 9, 'SQUARE_LEN': 3})
+        exact.solveGame({'variables_found': givens})
+        for engine in ['backtracking', 'dlx']:
+            solver = Solver({'game': 'sudoku', 'GRID_LEN': 9, 'SQUARE_LEN': 3, 'engine': engine})
+            game_data = {'variables_found': misread, 'candidates': {'00': [('5', 0.3), ('1', 0.6), ('7', 0.1)]}}
+            self.assertEqual(solver.solveGame(game_data), 'SOLVED')
+            self.assertEqual(solver.result, exact.result)
+            self.assertEqual(solver.CSP['DOMAINS']['00'], ['1', '5', '7'])
+
+        # A misread digit repeated in its row only costs a tried value
+        conflict = dict(givens, **{'00': '3'})
+        solver = Solver({'game': 'sudoku', 'GRID_LEN': 9, 'SQUARE_LEN': 3})
+        self.assertEqual(solver.solveGame({'variables_found': conflict}), 'FAILURE')
+        self.assertEqual(solver.solveGame({'variables_found': conflict, 'candidates': {'00': [('3', 0.5), ('5', 0.4)]}}),
+                         'SOLVED')
+        self.assertEqual(solver.result['00'], '5')
+
+    def test_propagation_modes(self):
+        puzzle = '800000000003600000070090200050007000000045700000100030001000068008500010090000400'
+        game_data = {
+            'variables_found': {str(k // 9) + str(k % 9): v for k, v in enumerate(puzzle) if v != '0'}
+        }
+        iterations = {}
+        results = []
+        for mode in ['none', 'fc', 'mac']:
+            solver = Solver({'game': 'sudoku', 'GRID_LEN': 9, 'SQUARE_LEN': 3, 'propagation': mode})
+            self.assertEqual(solver.solveGame(game_data), 'SOLVED')
+            iterations[mode] = solver.iterations
+            results.append(solver.result)
+        self.assertEqual(results[0], results[1])
+        self.assertEqual(results[0], results[2])
+        self.assertLess(iterations['fc'], iterations['none'])
+        self.assertLess(iterations['mac'], iterations['fc'])
+
+    def test_solve_stars(self):
+        game_info = {
+            'game': 'stars',
+            'GRID_LEN': 8,
+            'NUM_STARS': 1,
+        }
+        areas = [['60', '70', '71', '72'],
+                 ['22', '23', '24', '31', '32', '33', '34', '41', '42', '43', '44', '52', '53', '54', '55'],
+                 ['63', '73', '74', '75', '76', '77'],
+                 ['40', '50', '51', '61', '62'],
+                 ['00', '01', '02', '03', '04', '05', '06', '07', '10', '11', '12', '13', '14', '15', '20', '21',
+                  '30'],
+                 ['16', '17', '25', '26'],
+                 ['27', '35', '36', '37', '45', '46', '47', '57'],
+                 ['56', '64', '65', '66', '67']]
+        solver = Solver(game_info)
+        self.assertEqual(solver.solveGame({'variables_found': areas}), 'SOLVED')
+        stars = [var for var in solver.result if solver.result[var] == '1']
+        self.assertEqual(stars, ['04', '17', '22', '35', '40', '56', '63', '71'])
+
+    def test_solve_skyscrapers(self):
+        game_info = {
+            'game': 'skyscrapers',
+            'GRID_LEN': 5,
+            'SQUARE_LEN': 1,
+        }
+        # Clues keyed like the classifier output: '10' is the left clue of the first row, '01' the top one
+        clues = {'10': '3', '16': '2', '01': '3', '61': '2', '20': '2', '26': '3', '02': '3', '62': '1',
+                 '30': '3', '36': '1', '03': '2', '63': '3', '40': '1', '46': '2', '04': '1', '64': '2',
+                 '50': '2', '56': '3', '05': '3', '65': '3'}
+        solver = Solver(game_info)
+        self.assertEqual(solver.solveGame({'variables_found': clues}), 'SOLVED')
+        self.assertEqual(''.join(solver.result.values()), '3245141532243155312415243')
+
+    def test_visible_bounds(self):
+        solver = Solver({'game': 'skyscrapers', 'GRID_LEN': 5, 'SQUARE_LEN': 1})
+        solver.observers = {side: [0] * 5 for side in ('left', 'right', 'top', 'bottom')}
+        assignment = {var: None for var in solver.board.keys}
+        line = solver.board.sight_lines['left'][0]
+        self.assertEqual(solver.visible_bounds(assignment, line), (1, 5))
+        # 2 _ _ 5 _: 2 and 5 are seen, the empty cells in between may add 3 and 4
+        assignment['00'] = '2'
+        assignment['03'] = '5'
+        self.assertEqual(solver.visible_bounds(assignment, line), (2, 4))
+        self.assertEqual(solver.visible_bounds(assignment, solver.board.sight_lines['right'][0]), (1, 2))
+        # A clue of 5 from the left is out of reach long before the row is full
+        solver.observers['left'][0] = 5
+        self.assertTrue(solver.values_are_ordered_at(assignment, solver.board.index['03']))
+        solver.observers['left'][0] = 3
+        self.assertFalse(solver.values_are_ordered(assignment))
+        for var, value in zip(['01', '02', '04'], '341'):
+            assignment[var] = value
+        self.assertEqual(solver.visible_bounds(assignment, line), (4, 4))
+        self.assertTrue(solver.values_are_ordered(assignment))
+
+    def test_solve_skyscrapers_without_propagation(self):
+        clues = {'10': '3', '16': '2', '01': '3', '61': '2', '20': '2', '26': '3', '02': '3', '62': '1',
+                 '30': '3', '36': '1', '03': '2', '63': '3', '40': '1', '46': '2', '04': '1', '64': '2',
+                 '50': '2', '56': '3', '05': '3', '65': '3'}
+        solver = Solver({'game': 'skyscrapers', 'GRID_LEN': 5, 'SQUARE_LEN': 1, 'engine': 'backtracking',
+                         'propagation': 'none'})
+        self.assertEqual(solver.solveGame({'variables_found': clues}), 'SOLVED')
+        self.assertEqual(''.join(solver.result.values()), '3245141532243155312415243')
+
 if __name__ == '__main__':
     unittest.main()
\ No newline at end of file
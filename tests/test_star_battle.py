@@ -0,0 +1,85 @@
+import unittest
+from Board import Board
+from Solver import Solver
+from StarBattle import StarBattle
+from Geometry import cell_key
+
+TWO_STARS = ['BBBBGGGGEE', 'BBBGGGGGEE', 'DBBGGIGEEE', 'DDBBIIIIEE', 'DDJIIIIIEC',
+             'DDJJHHHAAC', 'FFJJHHAAAC', 'FFFJHHHAAC', 'FFFJHHAACC', 'FFFHHHHACC']
+THREE_STARS = ['BBBBDDDDDJFFFF', 'BBBBDDDJJJJFFF', 'BBBKKDJJJJJFFF', 'BBKKKDDJJJHFHH', 'BKKKKDDJJNHHHH',
+               'KKKKKDMNNNLLHH', 'GGGKMMMNNLLLHH', 'GGGGMMMMNLLLLH', 'GGGGIMMNNLLLLH', 'GGGIIIMNNLLLCC',
+               'GGEEIIANNNNNCC', 'EGEEIAAAAACCCC', 'EEEEIIAAAACCCC', 'EEEEIIIIAAAACC']
+
+
+def grid_areas(grid):
+    # One letter per area
+    n = len(grid)
+    areas = {}
+    for i, row in enumerate(grid):
+        for j, letter in enumerate(row):
+            areas.setdefault(letter, []).append(cell_key(i, j, n))
+    return [areas[letter] for letter in sorted(areas)]
+
+
+class TestStarBattle(unittest.TestCase):
+
+    def assertValidStars(self, solver, num_stars):
+        board = solver.board
+        values = [int(solver.result[key]) for key in board.keys]
+        for unit in board.rows + board.cols + board.areas:
+            self.assertEqual(sum([values[idx] for idx in unit]), num_stars)
+        for idx in range(board.size):
+            if values[idx]:
+                self.assertFalse(any([values[d] for d in board.neighbours[idx]]))
+
+    def test_two_and_three_stars(self):
+        for grid, num_stars in [(TWO_STARS, 2), (THREE_STARS, 3)]:
+            solver = Solver({'game': 'stars', 'GRID_LEN': len(grid), 'NUM_STARS': num_stars})
+            self.assertEqual(solver.solveGame({'variables_found': grid_areas(grid)}), 'SOLVED')
+            self.assertValidStars(solver, num_stars)
+            self.assertLess(solver.iterations, 100)
+
+    def test_same_result_as_backtracking(self):
+        areas = [['60', '70', '71', '72'],
+                 ['22', '23', '24', '31', '32', '33', '34', '41', '42', '43', '44', '52', '53', '54', '55'],
+                 ['63', '73', '74', '75', '76', '77'],
+                 ['40', '50', '51', '61', '62'],
+                 ['00', '01', '02', '03', '04', '05', '06', '07', '10', '11', '12', '13', '14', '15', '20', '21',
+                  '30'],
+                 ['16', '17', '25', '26'],
+                 ['27', '35', '36', '37', '45', '46', '47', '57'],
+                 ['56', '64', '65', '66', '67']]
+        counting = Solver({'game': 'stars', 'GRID_LEN': 8, 'NUM_STARS': 1})
+        backtracking = Solver({'game': 'stars', 'GRID_LEN': 8, 'NUM_STARS': 1, 'engine': 'backtracking'})
+        self.assertEqual(counting.solveGame({'variables_found': areas}), 'SOLVED')
+        self.assertEqual(backtracking.solveGame({'variables_found': areas}), 'SOLVED')
+        self.assertEqual(counting.result, backtracking.result)
+
+    def test_no_solution(self):
+        # Three non touching stars can't fit in a 3x3 grid
+        solver = Solver({'game': 'stars', 'GRID_LEN': 3, 'NUM_STARS': 1})
+        self.assertEqual(solver.solveGame({'variables_found': [['00', '01', '02'], ['10', '11', '12'],
+                                                               ['20', '21', '22']]}), 'FAILURE')
+
+    def test_line_reasoning(self):
+        engine = StarBattle(Board('stars', 5), 3)
+        row = list(range(5))
+        # Three stars in five cells: one way only, the row below is empty
+        forced, unused, touched = engine.placements(row, 3)
+        self.assertEqual(forced, [0, 2, 4])
+        self.assertEqual(unused, [1, 3])
+        self.assertEqual(touched, [1, 3, 5, 6, 7, 8, 9])
+        self.assertEqual(len(engine.cover(row)), 3)
+        self.assertIsNone(engine.placements([0, 1, 5, 6], 2))
+
+    def test_pigeonhole(self):
+        # Areas A and B lie in the first two rows, so the rest of those rows (area C) holds no star
+        board = Board('stars', 4)
+        board.set_areas(grid_areas(['AABC', 'AABC', 'CCCC', 'CCCC']))
+        engine = StarBattle(board, 1)
+        self.assertTrue(engine.pigeonhole())
+        self.assertEqual([engine.values[idx] for idx in (3, 7)], [0, 0])
+
+
+if __name__ == '__main__':
+    unittest.main()